@@ -0,0 +1,427 @@
+# analytics_snapshot.py
+# Columnar, memory-mapped snapshot of Patients, RiskScores and Vitals for
+# population analytics, so heavy scans stay off the SQLite file that serves
+# clinical writes.
+#
+# Each column is one .npy file opened with mmap_mode="r"; text categoricals are
+# dictionary-encoded as int32 codes (-1 = NULL). A build writes a new
+# directory and then swaps the CURRENT pointer, so readers (in any process)
+# never see a half-written snapshot. A loaded Snapshot maps all its columns
+# up front, so it stays readable after a later build removes its directory.
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+DB_PATH = "healthcare.db"
+SNAPSHOT_DIR = "analytics_snapshot"
+POINTER = "CURRENT"
+# Bumped when a build derives columns differently; older snapshots are rebuilt
+SNAPSHOT_FORMAT = 2
+# Suffix of a directory still being written; renamed away once complete
+BUILDING = ".building"
+# Unfinished builds older than this were abandoned (e.g. the worker died)
+STALE_BUILD_SECONDS = 3600
+
+# Table -> column -> (kind, SQL expression or None for the column itself)
+SNAPSHOT_TABLES = {
+    "Patients": {
+        "patient_id": ("int", None),
+        "gender": ("category", None),
+        "check_in_status": ("category", None),
+        "date_of_birth": ("date", None),
+    },
+    "RiskScores": {
+        "risk_id": ("int", None),
+        "patient_id": ("int", None),
+        "score_date": ("datetime", None),
+        "heart_disease_risk": ("float", None),
+        "diabetes_risk": ("float", None),
+    },
+    "Vitals": {
+        "vital_id": ("int", None),
+        "patient_id": ("int", None),
+        "record_date": ("datetime", None),
+        "systolic": ("float", "CAST(substr(blood_pressure, 1, instr(blood_pressure, '/') - 1) AS INTEGER)"),
+        "diastolic": ("float", "CAST(substr(blood_pressure, instr(blood_pressure, '/') + 1) AS INTEGER)"),
+        "heart_rate": ("float", None),
+        "glucose_level": ("float", None),
+        "bmi": ("float", None),
+        "hemoglobin": ("float", None),
+        "cholesterol": ("float", None),
+    },
+}
+
+AGE_GROUPS = ["0-18", "19-35", "36-55", "55+"]
+RISK_BANDS = ["Low", "Moderate", "High"]
+AGGREGATES = ("count", "sum", "mean", "min", "max")
+FILTER_OPS = {"=": np.equal, "!=": np.not_equal, "<": np.less, "<=": np.less_equal,
+              ">": np.greater, ">=": np.greater_equal}
+
+
+# ===== Build =====
+def _encode(kind, series):
+    import pandas as pd
+
+    if kind == "int":
+        return pd.to_numeric(series).fillna(-1).to_numpy(np.int64), None
+    if kind == "float":
+        return pd.to_numeric(series, errors="coerce").to_numpy(np.float64), None
+    if kind == "date":
+        return pd.to_datetime(series, errors="coerce").to_numpy("datetime64[D]"), None
+    if kind == "datetime":
+        return pd.to_datetime(series, errors="coerce", format="mixed").to_numpy("datetime64[s]"), None
+    codes, dictionary = pd.factorize(series, sort=True)
+    return codes.astype(np.int32), [str(v) for v in dictionary]
+
+
+def build_snapshot(db_path=DB_PATH, snapshot_dir=SNAPSHOT_DIR, version=0, generation=0):
+    """Write a new snapshot directory and point CURRENT at it."""
+    import pandas as pd
+
+    name = f"v{version}-{time.time_ns()}"
+    target = os.path.join(snapshot_dir, name + BUILDING)
+    os.makedirs(target)
+    meta = {"version": version, "generation": generation, "format": SNAPSHOT_FORMAT,
+            "built_at": time.time(), "tables": {}}
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # One read transaction so all tables come from the same instant
+        conn.execute("BEGIN")
+        for table, columns in SNAPSHOT_TABLES.items():
+            select = ", ".join(f"{expr or col} AS {col}" for col, (_, expr) in columns.items())
+            df = pd.read_sql_query(f"SELECT {select} FROM {table}", conn)
+            table_meta = {"rows": len(df), "columns": {}}
+            for col, (kind, _) in columns.items():
+                values, dictionary = _encode(kind, df[col])
+                np.save(os.path.join(target, f"{table}.{col}.npy"), values)
+                table_meta["columns"][col] = {"kind": kind, "dictionary": dictionary}
+            meta["tables"][table] = table_meta
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    # Latest score per patient by date, then risk_id, as LATEST_RISK_SQL picks
+    # it, for "current risk" breakdowns. NaT is the smallest int64, so a
+    # missing date sorts first like NULL does in SQL.
+    risk_ids = np.load(os.path.join(target, "RiskScores.risk_id.npy"))
+    patient_ids = np.load(os.path.join(target, "RiskScores.patient_id.npy"))
+    score_dates = np.load(os.path.join(target, "RiskScores.score_date.npy")).astype(np.int64)
+    is_latest = np.zeros(len(risk_ids), dtype=bool)
+    if len(risk_ids):
+        order = np.lexsort((risk_ids, score_dates, patient_ids))
+        last = np.append(patient_ids[order][1:] != patient_ids[order][:-1], True)
+        is_latest[order[last]] = True
+    np.save(os.path.join(target, "RiskScores.is_latest.npy"), is_latest)
+    meta["tables"]["RiskScores"]["columns"]["is_latest"] = {"kind": "bool", "dictionary": None}
+
+    with open(os.path.join(target, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    os.rename(target, os.path.join(snapshot_dir, name))
+    pointer = os.path.join(snapshot_dir, POINTER)
+    try:
+        with open(pointer) as f:
+            replaced = f.read().strip()
+    except OSError:
+        replaced = None
+    pointer_tmp = os.path.join(snapshot_dir, f"{POINTER}.{name}.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(name)
+    os.replace(pointer_tmp, pointer)
+    if replaced:
+        remove_old_snapshots(snapshot_dir, replaced, name)
+    return name
+
+
+def _built_ns(name):
+    # Build time encoded in a snapshot directory name, v<version>-<time_ns>
+    try:
+        return int(name.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def remove_old_snapshots(snapshot_dir, replaced, current=None):
+    """Delete snapshots built before ``replaced`` and ``current``, and abandoned builds.
+
+    ``replaced`` itself is kept until the next build, for readers that read
+    CURRENT just before it moved. Newer directories (another worker's build)
+    are left alone, as are builds in progress. ``current``, the build that
+    just took CURRENT, may have started before ``replaced`` when two workers
+    build at once; it is never deleted.
+    """
+    cutoffs = [ns for ns in (_built_ns(replaced), current and _built_ns(current)) if ns is not None]
+    cutoff = min(cutoffs) if cutoffs else None
+    now = time.time()
+    for entry in os.listdir(snapshot_dir):
+        path = os.path.join(snapshot_dir, entry)
+        if not os.path.isdir(path):
+            continue
+        if entry.endswith(BUILDING):
+            try:
+                abandoned = now - os.path.getmtime(path) > STALE_BUILD_SECONDS
+            except OSError:
+                continue
+            if abandoned:
+                shutil.rmtree(path, ignore_errors=True)
+        elif cutoff is not None and (_built_ns(entry) or cutoff) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# ===== Query =====
+class SnapshotTable:
+    def __init__(self, snapshot, name, meta, path):
+        self.snapshot = snapshot
+        self.name = name
+        self.rows = meta["rows"]
+        self.kinds = {col: info["kind"] for col, info in meta["columns"].items()}
+        self.dictionaries = {col: info["dictionary"] for col, info in meta["columns"].items()}
+        self._path = path
+        self._columns = {}
+
+    def open(self):
+        """Map every column now rather than on first use."""
+        for col in self.kinds:
+            self.column(col)
+
+    def column(self, col):
+        if col not in self.kinds:
+            raise ValueError(f"Unknown column '{self.name}.{col}'")
+        if col not in self._columns:
+            self._columns[col] = np.load(os.path.join(self._path, f"{self.name}.{col}.npy"), mmap_mode="r")
+        return self._columns[col]
+
+    def resolve(self, ref):
+        """Return (values, labels) for a column reference.
+
+        ``ref`` is a column, ``patient.<column>`` (looked up through
+        patient_id) or one of month/year/age/age_group/risk_band(<column>).
+        ``labels`` decodes integer codes, or is None for plain values.
+        """
+        if ref.startswith("patient."):
+            values, labels = self.snapshot.table("Patients").resolve(ref[len("patient."):])
+            rows, found = self.snapshot.patient_rows(self.column("patient_id"))
+            values = np.asarray(values)[rows]
+            values[~found] = _missing(values.dtype)
+            return values, labels
+        if ref.endswith(")") and "(" in ref:
+            func, col = ref[:-1].split("(", 1)
+            return self._derive(func, *self.resolve(col))
+        labels = self.dictionaries.get(ref) if ref in self.kinds else None
+        return self.column(ref), labels
+
+    def _derive(self, func, values, labels):
+        if func == "month":
+            return values.astype("datetime64[M]"), None
+        if func == "year":
+            return values.astype("datetime64[Y]"), None
+        if func == "age":
+            days = (np.datetime64("today", "D") - values.astype("datetime64[D]")).astype(np.float64)
+            days[np.isnat(values)] = np.nan
+            return np.floor(days / 365.25), None
+        if func == "age_group":
+            ages, _ = self._derive("age", values, labels)
+            # Same bands as the SQL CASE: anything else (incl. unknown) is 55+
+            codes = np.full(len(ages), 3, dtype=np.int32)
+            for code, (lo, hi) in enumerate([(0, 18), (19, 35), (36, 55)]):
+                codes[(ages >= lo) & (ages <= hi)] = code
+            return codes, AGE_GROUPS
+        if func == "risk_band":
+            return (values > 0.4).astype(np.int32) + (values > 0.7), RISK_BANDS
+        raise ValueError(f"Unknown function '{func}'")
+
+    def mask(self, filters):
+        keep = np.ones(self.rows, dtype=bool)
+        for ref, op, value in filters:
+            values, labels = self.resolve(ref)
+            if labels is not None:
+                # Compare categorical codes; values outside the dictionary match nothing
+                lookup = {label: code for code, label in enumerate(labels)}
+                value = [lookup.get(v, -2) for v in value] if op == "in" else lookup.get(value, -2)
+            elif np.issubdtype(values.dtype, np.datetime64):
+                value = [np.datetime64(v) for v in value] if op == "in" else np.datetime64(value)
+            if op == "in":
+                keep &= np.isin(values, value)
+            elif op in FILTER_OPS:
+                keep &= FILTER_OPS[op](values, value)
+            else:
+                raise ValueError(f"Unknown filter operator '{op}'")
+        return keep
+
+    def query(self, filters=(), group_by=(), aggregates=None):
+        """Filter, group and aggregate, returning a list of row dicts.
+
+        filters: [(ref, op, value)]; group_by: [ref]; aggregates:
+        {name: (func, ref)} with func in AGGREGATES (ref None counts rows).
+        """
+        aggregates = aggregates or {"count": ("count", None)}
+        keep = self.mask(filters)
+
+        keys, key_labels, inverses, sizes = [], [], [], []
+        for ref in group_by:
+            values, labels = self.resolve(ref)
+            uniques, inverse = np.unique(np.asarray(values)[keep], return_inverse=True)
+            keys.append(uniques)
+            key_labels.append(labels)
+            inverses.append(inverse.ravel())
+            sizes.append(max(len(uniques), 1))
+        if group_by:
+            combined = np.ravel_multi_index(inverses, sizes) if inverses[0].size else np.array([], dtype=np.int64)
+            groups, group_index = np.unique(combined, return_inverse=True)
+            group_index = group_index.ravel()
+        else:
+            groups, group_index = np.zeros(1, dtype=np.int64), np.zeros(int(keep.sum()), dtype=np.int64)
+
+        results = {name: self._aggregate(func, ref, keep, group_index, len(groups))
+                   for name, (func, ref) in aggregates.items()}
+
+        rows = []
+        key_positions = np.unravel_index(groups, sizes) if group_by else []
+        for g in range(len(groups)):
+            row = {}
+            for ref, uniques, labels, positions in zip(group_by, keys, key_labels, key_positions):
+                row[ref] = _to_python(uniques[positions[g]], labels)
+            for name, values in results.items():
+                row[name] = _to_python(values[g], None)
+            rows.append(row)
+        return rows
+
+    def histogram(self, ref, bins, min_value=None, max_value=None):
+        """Return (min, max, counts) with the same binning as /stats/histogram."""
+        values = np.asarray(self.resolve(ref)[0], dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values) and (min_value is None or max_value is None):
+            return None, None, []
+        lo = float(values.min()) if min_value is None else min_value
+        hi = float(values.max()) if max_value is None else max_value
+        values = values[(values >= lo) & (values <= hi)]
+        width = (hi - lo) / bins or 1
+        # The top edge is inclusive, like numpy.histogram
+        index = np.minimum(((values - lo) / width).astype(np.int64), bins - 1)
+        return lo, hi, np.bincount(index, minlength=bins).tolist()
+
+    def _aggregate(self, func, ref, keep, group_index, n_groups):
+        if func not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{func}'")
+        if ref is None:
+            if func != "count":
+                raise ValueError(f"Aggregate '{func}' needs a column")
+            return np.bincount(group_index, minlength=n_groups)
+        values = np.asarray(self.resolve(ref)[0])[keep].astype(np.float64)
+        valid = ~np.isnan(values)
+        counts = np.bincount(group_index[valid], minlength=n_groups)
+        if func == "count":
+            return counts
+        sums = np.bincount(group_index[valid], weights=values[valid], minlength=n_groups)
+        if func == "sum":
+            return sums
+        if func == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        out = np.full(n_groups, np.inf if func == "min" else -np.inf)
+        (np.minimum if func == "min" else np.maximum).at(out, group_index[valid], values[valid])
+        return np.where(counts > 0, out, np.nan)
+
+
+def _missing(dtype):
+    if np.issubdtype(dtype, np.datetime64):
+        return np.datetime64("NaT")
+    return np.nan if np.issubdtype(dtype, np.floating) else -1
+
+
+def _to_python(value, labels):
+    if labels is not None:
+        return labels[int(value)] if 0 <= int(value) < len(labels) else None
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else str(value)
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.path = path
+        self.version = meta["version"]
+        self.generation = meta.get("generation", 0)
+        self.format = meta.get("format", 1)
+        self.built_at = meta["built_at"]
+        self.tables = {name: SnapshotTable(self, name, table_meta, path)
+                       for name, table_meta in meta["tables"].items()}
+        # Mapped files stay readable after their directory is removed (POSIX),
+        # so a reader holding this snapshot never hits a missing column
+        for table in self.tables.values():
+            table.open()
+        self._patient_order = None
+
+    def table(self, name):
+        if name not in self.tables:
+            raise ValueError(f"Table '{name}' is not in the analytics snapshot")
+        return self.tables[name]
+
+    def patient_rows(self, patient_ids):
+        """Row positions in Patients for each id, and whether it was found."""
+        ids = self.table("Patients").column("patient_id")
+        if self._patient_order is None:
+            self._patient_order = np.argsort(ids)
+        if not len(ids):
+            return np.zeros(len(patient_ids), dtype=np.int64), np.zeros(len(patient_ids), dtype=bool)
+        pos = np.searchsorted(ids, patient_ids, sorter=self._patient_order)
+        rows = self._patient_order[np.clip(pos, 0, len(ids) - 1)]
+        return rows, ids[rows] == patient_ids
+
+
+class SnapshotStore:
+    """Loads the current snapshot for readers and rebuilds it for the writer."""
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR, db_path=DB_PATH):
+        self.snapshot_dir = snapshot_dir
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._name = None
+        self._snapshot = None
+
+    def current(self, max_age=None):
+        """Return the loaded snapshot, or None if missing or not checked recently."""
+        pointer = os.path.join(self.snapshot_dir, POINTER)
+        try:
+            checked_at = os.path.getmtime(pointer)
+            with open(pointer) as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        if max_age is not None and time.time() - checked_at > max_age:
+            return None
+        with self._lock:
+            if name != self._name:
+                try:
+                    self._snapshot = Snapshot(os.path.join(self.snapshot_dir, name))
+                except OSError:
+                    return None
+                self._name = name
+            return self._snapshot
+
+    def refresh(self, version, generation=0):
+        """Rebuild if the data moved past the snapshot; else mark it as still current.
+
+        ``version`` is the newest change log entry of the copied tables and
+        ``generation`` the archive generation, which moves when retention
+        deletes rows without logging them.
+        """
+        snapshot = self.current()
+        if (snapshot is not None and snapshot.version == version and snapshot.generation == generation
+                and snapshot.format == SNAPSHOT_FORMAT):
+            os.utime(os.path.join(self.snapshot_dir, POINTER))
+            return False
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        build_snapshot(self.db_path, self.snapshot_dir, version, generation)
+        return True
@@ -0,0 +1,163 @@
+# api_client.py
+# Shared HTTP client for the dashboards: pooled keep-alive sessions, per-call
+# timeouts, bounded retries with backoff, a small TTL cache and in-flight
+# de-duplication of identical GETs.
+
+import logging
+import os
+import threading
+import time
+
+# requests is imported on first use (about 60ms), so that importing this
+# module keeps app.py's login page fast
+
+logger = logging.getLogger(__name__)
+
+API_URL = os.environ.get("HEALTHCARE_API_URL", "http://localhost:8000")
+
+# (connect, read) seconds - a hung backend must not pin a Dash worker
+DEFAULT_TIMEOUT = (1.0, 5.0)
+DEFAULT_TTL = 5.0
+MAX_CACHE_ENTRIES = 256
+
+
+class ApiError(Exception):
+    """Raised when the backend cannot be reached or returns a bad response."""
+
+
+# ===== Session Pool =====
+_local = threading.local()
+
+
+def _build_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=1,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    # requests.Session is not guaranteed thread-safe, so each Dash worker
+    # thread keeps its own keep-alive session.
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = _build_session()
+    return session
+
+
+# ===== TTL Cache & In-flight De-duplication =====
+_cache = {}
+_inflight = {}
+_lock = threading.Lock()
+
+
+class _Pending:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _cache_key(path, params):
+    return path, tuple(sorted((params or {}).items()))
+
+
+def _store(key, value, ttl):
+    if len(_cache) >= MAX_CACHE_ENTRIES:
+        now = time.monotonic()
+        for k in [k for k, (expires, _) in _cache.items() if expires <= now]:
+            del _cache[k]
+        if len(_cache) >= MAX_CACHE_ENTRIES:
+            del _cache[next(iter(_cache))]
+    _cache[key] = (time.monotonic() + ttl, value)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+# ===== Requests =====
+def _fetch(path, params, timeout):
+    import requests
+
+    url = f"{API_URL}{path}"
+    try:
+        response = get_session().get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError) as e:
+        logger.warning("GET %s failed: %s", url, e)
+        raise ApiError(f"GET {path} failed: {e}") from e
+
+
+def get_json(path, params=None, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT):
+    """GET ``path`` from the backend and return the decoded JSON.
+
+    Identical requests within ``ttl`` seconds are served from the cache, and
+    concurrent identical requests share a single round-trip. Pass ``ttl=0``
+    to bypass the cache.
+    """
+    if not ttl:
+        return _fetch(path, params, timeout)
+
+    key = _cache_key(path, params)
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        pending = _inflight.get(key)
+        owner = pending is None
+        if owner:
+            pending = _inflight[key] = _Pending()
+
+    if not owner:
+        pending.event.wait(timeout=sum(timeout) * 3)
+        if pending.error is not None:
+            raise pending.error
+        if not pending.event.is_set():
+            raise ApiError(f"GET {path} timed out waiting for in-flight request")
+        return pending.result
+
+    try:
+        pending.result = _fetch(path, params, timeout)
+        with _lock:
+            _store(key, pending.result, ttl)
+        return pending.result
+    except ApiError as e:
+        pending.error = e
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        pending.event.set()
+
+
+def post_json(path, payload, timeout=DEFAULT_TIMEOUT):
+    # Writes are never retried or cached; a successful write drops cached reads.
+    import requests
+
+    url = f"{API_URL}{path}"
+    try:
+        response = get_session().post(url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        result = response.json()
+    except (requests.RequestException, ValueError) as e:
+        logger.warning("POST %s failed: %s", url, e)
+        raise ApiError(f"POST {path} failed: {e}") from e
+    clear_cache()
+    return result
@@ -1,13 +1,32 @@
 # app.py
 
+import sys
+
+# Dash imports IPython (about 0.3s) for its notebook mode whenever it is
+# installed. Outside a notebook IPython is not loaded yet, so hide it while
+# dash is imported: dash falls back to plain server mode, and IPython stays
+# importable afterwards.
+if "IPython" not in sys.modules:
+    sys.modules["IPython"] = None
+    try:
+        import dash
+    finally:
+        del sys.modules["IPython"]
+
 import dash
 from dash import dcc, html, Input, Output, State
 import dash_bootstrap_components as dbc
 import flask
 
-# Import dashboards
+# Import dashboards and pages. Every module defers pandas, plotly and the risk
+# models to first use, so the login page is served without loading them.
 from dashboard_doctor import doctor_dashboard_layout, register_doctor_callbacks
 from dashboard_frontdesk import get_frontdesk_dashboard_layout, register_frontdesk_callbacks
+from nurse_portal import get_nurse_portal_layout, register_nurse_callbacks
+from patient_portal import get_patient_portal_layout, register_patient_portal_callbacks
+from patient_record import get_patient_record_layout, register_patient_record_callbacks
+from reports import get_reports_layout, register_reports_callbacks
+from risk_trend import get_risk_trend_layout, register_risk_trend_callbacks
 
 # Initialize Dash app
 app = dash.Dash(__name__, suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.BOOTSTRAP])
@@ -36,23 +55,33 @@ login_layout = dbc.Container([
 ], fluid=True)
 
 # Placeholder Layouts (for roles not yet implemented)
-patient_dashboard_layout = html.Div([
-    html.H1("🧑‍⚕️ Patient Dashboard"),
-    html.P("Coming Soon...")
-], style={"textAlign": "center", "marginTop": "100px"})
-
-nurse_dashboard_layout = html.Div([
-    html.H1("💉 Nurse Dashboard"),
-    html.P("Coming Soon...")
-], style={"textAlign": "center", "marginTop": "100px"})
-
 admin_dashboard_layout = html.Div([
     html.H1("🛡️ Admin Dashboard"),
-    html.P("Coming Soon...")
+    html.P("Coming Soon..."),
+    dbc.Nav([
+        dbc.NavLink("🧑‍⚕️ Patient Records", href="/patient_record"),
+        dbc.NavLink("❤️ Risk Assessment", href="/risk_trend"),
+        dbc.NavLink("📈 Reports", href="/reports"),
+    ], className="justify-content-center")
 ], style={"textAlign": "center", "marginTop": "100px"})
 
-# Import frontdesk dashboard layout
-frontdesk_dashboard_layout = get_frontdesk_dashboard_layout()
+# Pages: pathname -> (roles allowed, layout factory). Layouts are built on
+# navigation; every page's callbacks are registered once below.
+ALL_STAFF = {"doctor", "nurse", "frontdesk", "admin"}
+PAGES = {
+    "/doctor_dashboard": ({"doctor"}, lambda: doctor_dashboard_layout),
+    "/patient_dashboard": ({"patient"}, get_patient_portal_layout),
+    "/nurse_dashboard": ({"nurse"}, get_nurse_portal_layout),
+    "/admin_dashboard": ({"admin"}, lambda: admin_dashboard_layout),
+    "/frontdesk_dashboard": ({"frontdesk"}, get_frontdesk_dashboard_layout),
+    # Front desk sub-pages, routed inside the front desk layout
+    "/visits": ({"frontdesk"}, get_frontdesk_dashboard_layout),
+    "/medications": ({"frontdesk"}, get_frontdesk_dashboard_layout),
+    "/settings": ({"frontdesk"}, get_frontdesk_dashboard_layout),
+    "/patient_record": (ALL_STAFF, get_patient_record_layout),
+    "/risk_trend": ({"doctor", "nurse", "admin"}, get_risk_trend_layout),
+    "/reports": (ALL_STAFF, get_reports_layout),
+}
 
 # App Layout
 app.layout = html.Div([
@@ -73,18 +102,9 @@ def display_page(pathname, current_user):
     if not current_user:
         return html.H1("❌ Unauthorized Access. Please login.", style={"textAlign": "center", "marginTop": "100px"})
 
-    role = current_user.get('role')
-
-    if pathname == '/doctor_dashboard' and role == 'doctor':
-        return doctor_dashboard_layout
-    elif pathname == '/patient_dashboard' and role == 'patient':
-        return patient_dashboard_layout
-    elif pathname == '/nurse_dashboard' and role == 'nurse':
-        return nurse_dashboard_layout
-    elif pathname == '/admin_dashboard' and role == 'admin':
-        return admin_dashboard_layout
-    elif pathname == '/frontdesk_dashboard' and role == 'frontdesk':
-        return frontdesk_dashboard_layout
+    roles, get_layout = PAGES.get(pathname, ((), None))
+    if current_user.get('role') in roles:
+        return get_layout()
     else:
         return html.H1("❌ Access Denied. You are not authorized to view this page.", style={"textAlign": "center", "marginTop": "100px"})
 
@@ -119,6 +139,11 @@ def login_user(n_clicks, email, password):
 # Register External Dashboard Callbacks
 register_doctor_callbacks(app)
 register_frontdesk_callbacks(app)
+register_nurse_callbacks(app)
+register_patient_portal_callbacks(app)
+register_patient_record_callbacks(app)
+register_reports_callbacks(app)
+register_risk_trend_callbacks(app)
 
 # Run Server
 if __name__ == '__main__':
@@ -0,0 +1,34 @@
+// assets/live_updates.js
+// Bridges the backend /events stream (Server-Sent Events) into dcc.Store
+// components, so callbacks refresh when data changes instead of polling.
+// See live_updates.py for the Python side.
+(function () {
+    const sources = {};
+
+    function connect(el) {
+        const url = el.dataset.url;
+        const storeId = el.dataset.store;
+        if (!url || !storeId || sources[storeId]) { return; }
+        const source = new EventSource(url);
+        source.addEventListener("change", function (e) {
+            if (window.dash_clientside && window.dash_clientside.set_props) {
+                window.dash_clientside.set_props(storeId, {data: JSON.parse(e.data)});
+            }
+        });
+        sources[storeId] = source;
+    }
+
+    function scan() {
+        document.querySelectorAll(".live-feed").forEach(connect);
+        // Close feeds whose page was navigated away from
+        Object.keys(sources).forEach(function (storeId) {
+            if (!document.querySelector('.live-feed[data-store="' + storeId + '"]')) {
+                sources[storeId].close();
+                delete sources[storeId];
+            }
+        });
+    }
+
+    new MutationObserver(scan).observe(document.documentElement, {childList: true, subtree: true});
+    scan();
+})();
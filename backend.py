@@ -1,12 +1,166 @@
 # backend.py
 
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import json
+import logging
+import os
 import sqlite3
 
+import clinical_alerts
+import cohort_export
+import database_setup
+import downsample
+import prediction_cache
+import retention
+import vitals_stream
+import risk_stratification
+from analytics_snapshot import RISK_BANDS, SNAPSHOT_TABLES, SnapshotStore
+from change_feed import ChangeFeed
+from write_behind import ACK_MODES, WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+# Change events pushed to dashboards over /events
+change_feed = ChangeFeed()
+CHANGE_POLL_SECONDS = 2.0
+CHANGELOG_COMPACT_SECONDS = 3600
+
+# Columnar copy of Patients/RiskScores/Vitals that population analytics read
+snapshot_store = SnapshotStore()
+SNAPSHOT_REFRESH_SECONDS = 30
+# Readers fall back to SQL if the refresher has not confirmed it for this long
+SNAPSHOT_MAX_AGE = 120
+
+# Alerts catch up on new rows in the background; readers see the table as it
+# stands, at most about this many seconds behind
+ALERT_REFRESH_SECONDS = 10
+MAX_ALERTS = 1000
+
+# Rolling per-patient vitals statistics, saved with each WAL checkpoint
+rolling_vitals = vitals_stream.RollingVitals()
+INGEST_BATCH_ROWS = 1000
+MAX_INGEST_ERRORS = 100
+MAX_ROLLING_PATIENTS = 500
+
+# Optional write-behind with group commit for /save_risk and /save_lab_report
+WRITE_BEHIND = os.environ.get("HEALTHCARE_WRITE_BEHIND", "off").lower() in ("1", "on", "true")
+write_queue = WriteBehindQueue(on_commit=change_feed.notify) if WRITE_BEHIND else None
+
+# Archival/ANALYZE/vacuum run daily; the WAL is checkpointed more often
+MAINTENANCE_SECONDS = 24 * 3600
+CHECKPOINT_SECONDS = 300
+
 # ========== Initialize App ==========
-app = FastAPI()
+def init_db():
+    # Bring older databases up to the current indexes/schema
+    database_setup.migrate()
+
+@asynccontextmanager
+async def lifespan(app):
+    init_db()
+    change_feed.bind(asyncio.get_running_loop())
+    if write_queue is not None:
+        write_queue.start()
+    tasks = [
+        asyncio.create_task(change_feed.watch(get_change_head, read_changes, CHANGE_POLL_SECONDS)),
+        asyncio.create_task(compact_change_log_periodically()),
+        asyncio.create_task(refresh_snapshot_periodically()),
+        asyncio.create_task(refresh_alerts_periodically()),
+        asyncio.create_task(roll_age_bands_daily()),
+        asyncio.create_task(maintain_database_periodically()),
+        asyncio.create_task(asyncio.to_thread(load_rolling_vitals)),
+    ]
+    yield
+    if write_queue is not None:
+        # Commit everything already accepted before going down
+        await write_queue.close()
+    for task in tasks:
+        task.cancel()
+    save_rolling_vitals()
+
+async def compact_change_log_periodically():
+    while True:
+        await asyncio.to_thread(database_setup.compact_change_log)
+        await asyncio.sleep(CHANGELOG_COMPACT_SECONDS)
+
+async def refresh_snapshot_periodically():
+    # Rebuilt only when a table the snapshot copies has changed since the last
+    # build; writes to other tables (labs, appointments) leave it alone
+    while True:
+        try:
+            if await asyncio.to_thread(lambda: snapshot_store.refresh(*get_snapshot_version())):
+                # Build the per-patient risk frame now rather than on the first request
+                await asyncio.to_thread(lambda: risk_stratification.frame_for(snapshot_store.current()))
+        except Exception as e:
+            logger.warning("analytics snapshot refresh failed: %s", e)
+        await asyncio.sleep(SNAPSHOT_REFRESH_SECONDS)
+
+async def refresh_alerts_periodically():
+    while True:
+        try:
+            await asyncio.to_thread(clinical_alerts.refresh)
+        except sqlite3.Error as e:
+            logger.warning("alert refresh failed: %s", e)
+        await asyncio.sleep(ALERT_REFRESH_SECONDS)
+
+async def maintain_database_periodically():
+    last_maintenance = 0.0
+    loop = asyncio.get_running_loop()
+    while True:
+        # Sleep first so startup is never held up behind a VACUUM
+        await asyncio.sleep(CHECKPOINT_SECONDS)
+        try:
+            if loop.time() - last_maintenance >= MAINTENANCE_SECONDS:
+                moved = await asyncio.to_thread(retention.run_maintenance)
+                last_maintenance = loop.time()
+                logger.info("retention archived %s", moved)
+            else:
+                await asyncio.to_thread(retention.checkpoint)
+        except sqlite3.Error as e:
+            logger.warning("database maintenance failed: %s", e)
+        await asyncio.to_thread(save_rolling_vitals)
+
+def load_rolling_vitals():
+    # Resume from the last checkpoint, then replay the rows written since
+    try:
+        rolling_vitals.load()
+        rolling_vitals.sync()
+    except sqlite3.Error as e:
+        logger.warning("rolling vitals load failed: %s", e)
+
+def save_rolling_vitals():
+    try:
+        rolling_vitals.save()
+    except OSError as e:
+        logger.warning("rolling vitals checkpoint failed: %s", e)
+
+async def roll_age_bands_daily():
+    # Just after each UTC midnight, so the first read of the day is not the one paying
+    while True:
+        now = datetime.now(timezone.utc)
+        await asyncio.sleep((24 * 3600 - (now.hour * 3600 + now.minute * 60 + now.second)) + 5)
+        try:
+            await asyncio.to_thread(roll_age_bands)
+        except sqlite3.Error as e:
+            logger.warning("age band roll-forward failed: %s", e)
+
+def analytics_snapshot():
+    return snapshot_store.current(max_age=SNAPSHOT_MAX_AGE)
+
+def get_snapshot_version():
+    # (newest ChangeLog entry of the tables the snapshot copies, archive
+    # generation); archival deletes are not logged but still move the second
+    with read_transaction() as conn:
+        generation = query_db("SELECT archive_generation FROM ChangeLogState", conn=conn)[0]["archive_generation"]
+        return max(table_versions(SNAPSHOT_TABLES, conn).values()), generation
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -18,21 +172,66 @@ app.add_middleware(
 )
 
 # ========== Database Helpers ==========
-def query_db(query, args=()):
-    conn = sqlite3.connect('healthcare.db')
-    conn.row_factory = sqlite3.Row
+def query_db(query, args=(), conn=None):
+    # Pass conn to run inside an existing read_transaction()
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('healthcare.db')
+        conn.row_factory = sqlite3.Row
     cur = conn.cursor()
     cur.execute(query, args)
     results = cur.fetchall()
-    conn.close()
+    if own_conn:
+        conn.close()
     return [dict(row) for row in results]
 
+@contextmanager
+def read_transaction():
+    # Several queries against one consistent snapshot of the database
+    conn = sqlite3.connect('healthcare.db', isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.execute("COMMIT")
+        conn.close()
+
 def execute_db(query, args=()):
     conn = sqlite3.connect('healthcare.db')
     cur = conn.cursor()
     cur.execute(query, args)
     conn.commit()
+    rowcount = cur.rowcount
     conn.close()
+    return rowcount
+
+# Whole-row SELECT lists without the generated *_day columns
+select_columns = database_setup.column_list
+
+# Today as a day number, comparable with the *_day columns
+TODAY_SQL = database_setup.day_number_sql("'now'")
+
+def roll_age_bands():
+    conn = sqlite3.connect('healthcare.db', isolation_level=None)
+    try:
+        # IMMEDIATE so no patient insert files itself against stale band ranges
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            database_setup.roll_age_bands(conn.cursor())
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def ensure_age_bands_current():
+    stale = query_db(
+        f"SELECT 1 FROM AgeBandState WHERE as_of_day < {TODAY_SQL}"
+    )
+    if stale:
+        roll_age_bands()
 
 # ========== Root Test ==========
 @app.get("/")
@@ -43,40 +242,72 @@ def root():
 
 @app.get("/active_patients")
 def get_active_patients():
-    return query_db("SELECT * FROM Patients WHERE check_in_status = 'Checked-in'")
+    return query_db(f"SELECT {select_columns('Patients')} FROM Patients WHERE check_in_status = 'Checked-in'")
+
+# Date windows compare integer day columns (see database_setup.DAY_COLUMNS)
+# against constants, so they are index range scans. benchmarks/check_query_plans.py
+# verifies the plans.
+APPOINTMENTS_TODAY_SQL = f"""
+    SELECT {select_columns('Appointments', 'a')}, p.first_name, p.last_name
+    FROM Appointments a
+    JOIN Patients p ON a.patient_id = p.patient_id
+    WHERE a.appointment_day = {TODAY_SQL}
+"""
 
 @app.get("/appointments_today")
 def get_appointments_today():
-    return query_db("""
-        SELECT a.*, p.first_name, p.last_name
-        FROM Appointments a
-        JOIN Patients p ON a.patient_id = p.patient_id
-        WHERE DATE(appointment_date) = DATE('now')
-    """)
+    return query_db(APPOINTMENTS_TODAY_SQL)
 
 @app.get("/age_demographics")
 def get_age_demographics():
-    return query_db("""
-        SELECT 
-            CASE 
-                WHEN age BETWEEN 0 AND 18 THEN '0-18'
-                WHEN age BETWEEN 19 AND 35 THEN '19-35'
-                WHEN age BETWEEN 36 AND 55 THEN '36-55'
-                ELSE '55+'
-            END AS age_group,
-            COUNT(*) as count
-        FROM (
-            SELECT 
-                CAST((julianday('now') - julianday(date_of_birth)) / 365.25 AS INT) AS age
-            FROM Patients
-        )
-        GROUP BY age_group
-    """)
+    # Constant time: per-band counters kept by triggers on Patients and rolled
+    # forward to today the first time they are read each day
+    ensure_age_bands_current()
+    return query_db("SELECT age_group, count FROM AgeBandCounts WHERE count > 0 ORDER BY age_group")
 
 @app.get("/patient_list")
 def get_patient_list():
     return query_db("SELECT patient_id, first_name, last_name FROM Patients")
 
+MAX_SEARCH_RESULTS = 50
+
+@app.get("/patients/search")
+def search_patients(q: str = "", limit: int = 20, active_only: bool = False, gender: Optional[str] = None):
+    # Type-ahead name search: every word of q must prefix-match the first or
+    # last name. Served from the PatientSearch FTS5 index when available.
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    terms = [t for t in q.replace('"', " ").split() if t]
+    where, args = [], []
+    if active_only:
+        where.append("p.check_in_status = 'Checked-in'")
+    if gender:
+        where.append("p.gender = ?")
+        args.append(gender)
+
+    has_index = query_db("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'PatientSearch'")
+    if terms and has_index:
+        match = " ".join(f'"{t}"*' for t in terms)
+        sql = f"""
+            SELECT p.patient_id, p.first_name, p.last_name, p.gender
+            FROM PatientSearch s
+            JOIN Patients p ON p.patient_id = s.rowid
+            WHERE PatientSearch MATCH ? {''.join(' AND ' + w for w in where)}
+            ORDER BY s.rank
+            LIMIT ?
+        """
+        return query_db(sql, [match] + args + [limit])
+
+    for t in terms:
+        where.append("(p.first_name LIKE ? OR p.last_name LIKE ?)")
+        args += [f"{t}%", f"{t}%"]
+    return query_db(f"""
+        SELECT p.patient_id, p.first_name, p.last_name, p.gender
+        FROM Patients p
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY p.patient_id
+        LIMIT ?
+    """, args + [limit])
+
 @app.get("/patient_details/{patient_id}")
 def get_patient_details(patient_id: int):
     return query_db("""
@@ -93,62 +324,524 @@ def get_patient_details(patient_id: int):
 
 @app.get("/risk_scores")
 def get_risk_scores():
-    return query_db("""
-        SELECT rs.*, p.first_name, p.last_name, p.gender, p.date_of_birth
+    return query_db(f"""
+        SELECT {select_columns('RiskScores', 'rs')}, p.first_name, p.last_name, p.gender, p.date_of_birth
         FROM RiskScores rs
         JOIN Patients p ON rs.patient_id = p.patient_id
     """)
 
+RISK_CANDIDATE_TABLES = ("Patients", "RiskScores")
+
+@app.get("/risk_candidates")
+def get_risk_candidates():
+    # Latest score per patient in column-oriented form, for dashboards that
+    # filter in the browser. Carries the /table_versions it was read at, which
+    # move on updates and deletes as well as inserts.
+    with read_transaction() as conn:
+        version = table_versions(RISK_CANDIDATE_TABLES, conn)
+        rows = query_db(f"""
+            SELECT r.patient_id, p.first_name || ' ' || p.last_name AS patient_name,
+                   r.heart_disease_risk, r.diabetes_risk, p.gender, r.score_date
+            FROM ({LATEST_RISK_SQL}) r
+            JOIN Patients p ON r.patient_id = p.patient_id
+        """, conn=conn)
+    columns = ["patient_id", "patient_name", "heart_disease_risk", "diabetes_risk", "gender", "score_date"]
+    return {
+        "version": version,
+        "columns": {name: [row[name] for row in rows] for name in columns},
+    }
+
+@app.get("/patient_history/{patient_id}")
+def get_patient_history(patient_id: int, start: Optional[str] = None, end: Optional[str] = None,
+                        max_points: Optional[int] = None, width: Optional[int] = None):
+    # Each score is paired with the Vitals row of the same visit, or the
+    # latest one recorded before it. Both lookups use the (patient_id, date)
+    # indexes, so cost is proportional to this patient's rows only.
+    # width (plot pixels) and/or max_points downsample the scores first (see
+    # downsample.py), so only the rows kept pay for the Vitals lookup.
+    where, args = ["rs.patient_id = ?"], [patient_id]
+    if start:
+        where.append("rs.score_date >= ?")
+        args.append(start)
+    if end:
+        # A bare date includes the whole day
+        where.append("rs.score_date <= ?" if len(end) > 10 else "rs.score_date < DATE(?, '+1 day')")
+        args.append(end)
+    buckets = downsample.bucket_count(len(downsample.RISK_SERIES), width, max_points)
+    with read_transaction() as conn:
+        scores = conn.execute(f"""
+            SELECT rs.risk_id, (julianday(rs.score_date) - 2440587.5) * 86400.0,
+                   rs.heart_disease_risk, rs.diabetes_risk
+            FROM RiskScores rs
+            WHERE {' AND '.join(where)}
+            ORDER BY rs.score_date
+        """, args).fetchall() if buckets else []
+        if scores:
+            risk_ids, times, heart, diabetes = zip(*scores)
+            window_end = downsample.timestamp(end) + (86400 if len(end) <= 10 else 0) if end else None
+            keep = downsample.downsample_indices(times, [heart, diabetes], buckets,
+                                                 start=downsample.timestamp(start) if start else None, end=window_end)
+            if len(keep) < len(scores):
+                where = ["rs.risk_id IN (SELECT value FROM json_each(?))"]
+                args = [json.dumps([risk_ids[i] for i in keep])]
+        return query_db(f"""
+            SELECT rs.risk_id, rs.score_date, rs.heart_disease_risk, rs.diabetes_risk,
+                   v.record_date, v.blood_pressure, v.heart_rate, v.glucose_level,
+                   v.bmi, v.hemoglobin, v.cholesterol
+            FROM RiskScores rs
+            LEFT JOIN Vitals v ON v.vital_id = (
+                SELECT vital_id FROM Vitals
+                WHERE patient_id = rs.patient_id AND record_date <= rs.score_date
+                ORDER BY record_date DESC
+                LIMIT 1
+            )
+            WHERE {' AND '.join(where)}
+            ORDER BY rs.score_date
+        """, args, conn)
+
 @app.get("/monthly_risk_trends")
 def get_monthly_risk_trends():
-    return query_db("""
-        SELECT 
-            strftime('%Y-%m', score_date) as month,
-            AVG(heart_disease_risk) as avg_heart_risk,
-            AVG(diabetes_risk) as avg_diabetes_risk
+    # Live rows merged with the rollups of months archived by retention.py
+    snapshot = analytics_snapshot()
+    if snapshot is not None:
+        live = snapshot.table("RiskScores").query(
+            group_by=["month(score_date)"],
+            aggregates={"heart_sum": ("sum", "heart_disease_risk"), "heart_n": ("count", "heart_disease_risk"),
+                        "diabetes_sum": ("sum", "diabetes_risk"), "diabetes_n": ("count", "diabetes_risk")},
+        )
+        live = [{"month": r.pop("month(score_date)"), **r} for r in live]
+    else:
+        live = query_db("""
+            SELECT
+                strftime('%Y-%m', score_date) AS month,
+                SUM(heart_disease_risk) AS heart_sum, COUNT(heart_disease_risk) AS heart_n,
+                SUM(diabetes_risk) AS diabetes_sum, COUNT(diabetes_risk) AS diabetes_n
+            FROM RiskScores
+            GROUP BY month
+        """)
+    archived = query_db("SELECT month, heart_sum, heart_n, diabetes_sum, diabetes_n FROM MonthlyRiskRollup")
+
+    totals = {}
+    for row in archived + live:
+        t = totals.setdefault(row["month"], [0.0, 0, 0.0, 0])
+        t[0] += row["heart_sum"] or 0
+        t[1] += row["heart_n"]
+        t[2] += row["diabetes_sum"] or 0
+        t[3] += row["diabetes_n"]
+    # Same order as SQL's ORDER BY month (NULL first)
+    return [
+        {"month": month, "avg_heart_risk": hs / hn if hn else None, "avg_diabetes_risk": ds / dn if dn else None}
+        for month, (hs, hn, ds, dn) in sorted(totals.items(), key=lambda kv: (kv[0] is not None, kv[0] or ""))
+    ]
+
+# A patient's monthly averages: live rows merged with the rollups of months
+# archived by retention.py (?1 is the patient id)
+PATIENT_RISK_TREND_SQL = """
+    SELECT
+        month,
+        SUM(heart_sum) / SUM(heart_n) AS avg_heart_risk,
+        SUM(diabetes_sum) / SUM(diabetes_n) AS avg_diabetes_risk
+    FROM (
+        SELECT strftime('%Y-%m', score_date) AS month,
+               SUM(heart_disease_risk) AS heart_sum, COUNT(heart_disease_risk) AS heart_n,
+               SUM(diabetes_risk) AS diabetes_sum, COUNT(diabetes_risk) AS diabetes_n
         FROM RiskScores
+        WHERE patient_id = ?1
         GROUP BY month
-        ORDER BY month
-    """)
+        UNION ALL
+        SELECT month, heart_sum, heart_n, diabetes_sum, diabetes_n
+        FROM PatientMonthlyRiskRollup
+        WHERE patient_id = ?1
+    )
+    GROUP BY month
+    ORDER BY month
+"""
 
 @app.get("/patient_risk_trend/{patient_id}")
 def get_patient_risk_trend(patient_id: int):
-    return query_db("""
-        SELECT 
-            strftime('%Y-%m', score_date) as month,
-            AVG(heart_disease_risk) as avg_heart_risk,
-            AVG(diabetes_risk) as avg_diabetes_risk
+    return query_db(PATIENT_RISK_TREND_SQL, (patient_id,))
+
+# ========== Patient Timeline API ==========
+# Everything one patient view needs, read in a single transaction so the
+# panels agree with each other and the portal pays one round-trip.
+
+TIMELINE_SECTIONS = {
+    "demographics": ("""
+        SELECT p.patient_id, p.first_name, p.last_name, p.gender, p.date_of_birth, p.check_in_status,
+               (SELECT MAX(record_date) FROM Vitals WHERE patient_id = p.patient_id) AS last_visit
+        FROM Patients p
+        WHERE p.patient_id = ?
+    """, False),
+    "latest_risk": ("""
+        SELECT risk_id, score_date, heart_disease_risk, diabetes_risk
         FROM RiskScores
         WHERE patient_id = ?
-        GROUP BY month
-        ORDER BY month
-    """, (patient_id,))
+        ORDER BY score_date DESC
+        LIMIT 1
+    """, False),
+    "risk_history": ("""
+        SELECT risk_id, score_date, heart_disease_risk, diabetes_risk
+        FROM RiskScores
+        WHERE patient_id = ?
+        ORDER BY score_date
+    """, True),
+    "trend": (PATIENT_RISK_TREND_SQL, True),
+    "vitals": (f"""
+        SELECT {select_columns('Vitals')} FROM Vitals
+        WHERE patient_id = ?
+        ORDER BY record_date DESC
+    """, True),
+    "labs": (f"""
+        SELECT {select_columns('LabReports')} FROM LabReports
+        WHERE patient_id = ?
+        ORDER BY report_date DESC
+    """, True),
+    "appointments": (f"""
+        SELECT {select_columns('Appointments')} FROM Appointments
+        WHERE patient_id = ?
+        ORDER BY appointment_date DESC
+    """, True),
+    "alerts": ("""
+        SELECT rule, severity, message, source_table, value, observed_at
+        FROM Alerts
+        WHERE patient_id = ? AND active = 1
+        ORDER BY severity, rule
+    """, True),
+}
+
+# History sections that limit/offset page through, newest first
+TIMELINE_PAGED = ("vitals", "labs", "appointments")
+# Sections computed rather than read; only returned when asked for by name
+TIMELINE_COMPUTED = ("prediction",)
+
+@app.get("/patient_timeline/{patient_id}")
+def get_patient_timeline(patient_id: int, fields: Optional[str] = None, limit: Optional[int] = None,
+                         offset: int = 0):
+    # fields is a comma-separated subset of TIMELINE_SECTIONS and
+    # TIMELINE_COMPUTED; default is all of TIMELINE_SECTIONS. Without limit
+    # the TIMELINE_PAGED sections are returned in full. "prediction" is the
+    # /predict_risk estimate, or null when the patient has none.
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(TIMELINE_SECTIONS)
+    unknown = [f for f in selected if f not in TIMELINE_SECTIONS and f not in TIMELINE_COMPUTED]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown timeline fields: {', '.join(unknown)}")
+    page = "" if limit is None else " LIMIT ? OFFSET ?"
+    page_args = () if limit is None else (max(1, limit), max(0, offset))
+
+    timeline = {"patient_id": patient_id}
+    with read_transaction() as conn:
+        if not query_db("SELECT 1 FROM Patients WHERE patient_id = ?", (patient_id,), conn):
+            raise HTTPException(status_code=404, detail="Patient ID does not exist")
+        for field in selected:
+            if field == "prediction":
+                try:
+                    timeline[field] = patient_prediction(patient_id, conn)
+                except HTTPException:
+                    timeline[field] = None
+                continue
+            sql, many = TIMELINE_SECTIONS[field]
+            if field in TIMELINE_PAGED:
+                rows = query_db(sql + page, (patient_id,) + page_args, conn)
+            else:
+                rows = query_db(sql, (patient_id,), conn)
+            timeline[field] = rows if many else (rows[0] if rows else None)
+    return timeline
+
+# ========== Alerts API ==========
+
+@app.get("/alerts")
+def get_alerts(patient_id: Optional[int] = None, rule: Optional[str] = None, severity: Optional[str] = None,
+               active_only: bool = True, limit: int = 200):
+    # Precomputed threshold alerts (clinical_alerts.ALERT_RULES), newest first.
+    # active_only keeps each patient's current flags: those on their latest
+    # vitals and risk score. Without patient_id, every flagged patient.
+    if rule is not None and rule not in clinical_alerts.ALERT_RULES:
+        raise HTTPException(status_code=400, detail=f"Unknown alert rule '{rule}'")
+    if severity is not None and severity not in clinical_alerts.SEVERITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown severity '{severity}'")
+    limit = max(1, min(limit, MAX_ALERTS))
+
+    where, args = [], []
+    if active_only:
+        where.append("a.active = 1")
+    for column, value in (("a.patient_id", patient_id), ("a.rule", rule), ("a.severity", severity)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            args.append(value)
+    return query_db(f"""
+        SELECT a.alert_id, a.patient_id, p.first_name, p.last_name, a.rule, a.severity, a.message,
+               a.source_table, a.source_id, a.value, a.observed_at, a.active
+        FROM Alerts a
+        JOIN Patients p ON p.patient_id = a.patient_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY a.observed_at DESC, a.alert_id DESC
+        LIMIT ?
+    """, args + [limit])
+
+@app.get("/alerts/summary")
+def get_alert_summary():
+    # Patients currently flagged by each rule
+    counts = {row["rule"]: row["patients"] for row in query_db(
+        "SELECT rule, COUNT(DISTINCT patient_id) AS patients FROM Alerts WHERE active = 1 GROUP BY rule")}
+    return [{"rule": name, "severity": severity, "message": message, "patients": counts.get(name, 0)}
+            for name, (_, _, _, _, severity, message) in clinical_alerts.ALERT_RULES.items()]
 
 # ========== Lab Reports APIs ==========
 
+RECENT_LAB_REPORTS_SQL = f"""
+    SELECT {select_columns('LabReports', 'lr')}, p.first_name, p.last_name
+    FROM LabReports lr
+    JOIN Patients p ON lr.patient_id = p.patient_id
+    WHERE lr.report_day >= {TODAY_SQL} - 7
+    ORDER BY lr.report_day DESC, lr.report_date DESC
+    LIMIT 50
+"""
+
 @app.get("/recent_lab_reports")
 def get_recent_lab_reports():
-    return query_db("""
-        SELECT lr.*, p.first_name, p.last_name
-        FROM LabReports lr
-        JOIN Patients p ON lr.patient_id = p.patient_id
-        WHERE DATE(report_date) >= DATE('now', '-7 days')
-        ORDER BY report_date DESC
-        LIMIT 50
-    """)
+    return query_db(RECENT_LAB_REPORTS_SQL)
 
 @app.get("/lab_reports_by_patient/{patient_id}")
 def get_lab_reports_by_patient(patient_id: int):
-    return query_db("""
-        SELECT * FROM LabReports
+    return query_db(f"""
+        SELECT {select_columns('LabReports')} FROM LabReports
         WHERE patient_id = ?
         ORDER BY report_date DESC
     """, (patient_id,))
 
+# ========== Aggregation APIs ==========
+# Chart-ready aggregates computed in SQL so payload size is independent of
+# population size. Each histogram field maps to (table, SQL expression).
+
+AGE_SQL = "CAST((julianday('now') - julianday(date_of_birth)) / 365.25 AS INT)"
+
+HISTOGRAM_FIELDS = {
+    "heart_disease_risk": ("RiskScores", "heart_disease_risk"),
+    "diabetes_risk": ("RiskScores", "diabetes_risk"),
+    "age": ("Patients", AGE_SQL),
+    "systolic": ("Vitals", "CAST(substr(blood_pressure, 1, instr(blood_pressure, '/') - 1) AS INTEGER)"),
+    "diastolic": ("Vitals", "CAST(substr(blood_pressure, instr(blood_pressure, '/') + 1) AS INTEGER)"),
+    "heart_rate": ("Vitals", "heart_rate"),
+    "glucose_level": ("Vitals", "glucose_level"),
+    "bmi": ("Vitals", "bmi"),
+    "hemoglobin": ("Vitals", "hemoglobin"),
+    "cholesterol": ("Vitals", "cholesterol"),
+}
+
+COUNT_FIELDS = {
+    "gender": ("Patients", "gender"),
+    "check_in_status": ("Patients", "check_in_status"),
+    "age_group": ("Patients", f"""CASE
+        WHEN {AGE_SQL} BETWEEN 0 AND 18 THEN '0-18'
+        WHEN {AGE_SQL} BETWEEN 19 AND 35 THEN '19-35'
+        WHEN {AGE_SQL} BETWEEN 36 AND 55 THEN '36-55'
+        ELSE '55+' END"""),
+    "report_type": ("LabReports", "report_type"),
+    "lab_result": ("LabReports", "result"),
+    "appointment_status": ("Appointments", "status"),
+}
+
+# Analytics snapshot refs for stats fields whose name is not a snapshot column
+SNAPSHOT_REFS = {"age": "age(date_of_birth)", "age_group": "age_group(date_of_birth)"}
+
+RISK_COLUMNS = ("heart_disease_risk", "diabetes_risk")
+MAX_BINS = 200
+MAX_MOVERS = 500
+
+def risk_band_sql(column):
+    # Same thresholds as the dashboards: > 0.7 High, > 0.4 Moderate
+    return f"CASE WHEN {column} > 0.7 THEN 'High' WHEN {column} > 0.4 THEN 'Moderate' ELSE 'Low' END"
+
+def risk_band_rank_sql(band):
+    # Orders bands by severity (RISK_BANDS order) rather than alphabetically
+    return "CASE " + band + "".join(f" WHEN '{b}' THEN {i}" for i, b in enumerate(RISK_BANDS)) + " END"
+
+def count_sort_key(value, banded=False):
+    # Row order of the snapshot path, matching the SQL ORDER BY: NULL first,
+    # risk bands by severity, anything else by value
+    if value is None:
+        return (0, 0, "")
+    return (1, RISK_BANDS.index(value), "") if banded else (1, 0, value)
+
+# Each patient's latest score by date (newest risk_id on ties), as the
+# timeline and /patient_history pick it; rows are not inserted in date order
+LATEST_RISK_SQL = f"""
+    SELECT {select_columns('RiskScores', 'rs')} FROM RiskScores rs
+    WHERE rs.risk_id = (
+        SELECT risk_id FROM RiskScores WHERE patient_id = rs.patient_id
+        ORDER BY score_date DESC, risk_id DESC LIMIT 1
+    )
+"""
+
+@app.get("/stats/histogram/{field}")
+def get_histogram(field: str, bins: int = 20, min_value: Optional[float] = None, max_value: Optional[float] = None):
+    if field not in HISTOGRAM_FIELDS:
+        raise HTTPException(status_code=404, detail=f"Unknown histogram field '{field}'")
+    if not 1 <= bins <= MAX_BINS:
+        raise HTTPException(status_code=400, detail=f"bins must be between 1 and {MAX_BINS}")
+    table, expr = HISTOGRAM_FIELDS[field]
+
+    snapshot = analytics_snapshot()
+    if snapshot is not None and table in snapshot.tables:
+        lo, hi, counts = snapshot.table(table).histogram(SNAPSHOT_REFS.get(field, field), bins, min_value, max_value)
+        return {"field": field, "min": lo, "max": hi, "bins": bins, "counts": counts}
+
+    if min_value is None or max_value is None:
+        bounds = query_db(f"SELECT MIN({expr}) AS lo, MAX({expr}) AS hi FROM {table}")[0]
+        min_value = bounds["lo"] if min_value is None else min_value
+        max_value = bounds["hi"] if max_value is None else max_value
+    if min_value is None or max_value is None:
+        return {"field": field, "min": None, "max": None, "bins": bins, "counts": []}
+    width = (max_value - min_value) / bins or 1
+
+    # The top edge is inclusive, like numpy.histogram
+    rows = query_db(f"""
+        SELECT MIN(CAST(({expr} - ?) / ? AS INTEGER), ?) AS bin, COUNT(*) AS count
+        FROM {table}
+        WHERE {expr} BETWEEN ? AND ?
+        GROUP BY bin
+    """, (min_value, width, bins - 1, min_value, max_value))
+    counts = [0] * bins
+    for row in rows:
+        counts[row["bin"]] = row["count"]
+    return {"field": field, "min": min_value, "max": max_value, "bins": bins, "counts": counts}
+
+@app.get("/stats/counts/{field}")
+def get_counts(field: str):
+    snapshot = analytics_snapshot()
+    if snapshot is not None and (field in RISK_COLUMNS or COUNT_FIELDS.get(field, ("",))[0] in snapshot.tables):
+        if field in RISK_COLUMNS:
+            ref = f"risk_band({field})"
+            rows = snapshot.table("RiskScores").query(filters=[("is_latest", "=", True)], group_by=[ref])
+        else:
+            ref = SNAPSHOT_REFS.get(field, field)
+            rows = snapshot.table(COUNT_FIELDS[field][0]).query(group_by=[ref])
+        rows = sorted(rows, key=lambda r: count_sort_key(r[ref], field in RISK_COLUMNS))
+        return [{"value": r[ref], "count": r["count"]} for r in rows]
+    if field in RISK_COLUMNS:
+        # Risk bands of each patient's latest score
+        return query_db(f"""
+            SELECT {risk_band_sql(field)} AS value, COUNT(*) AS count
+            FROM ({LATEST_RISK_SQL})
+            GROUP BY value
+            ORDER BY {risk_band_rank_sql('value')}
+        """)
+    if field not in COUNT_FIELDS:
+        raise HTTPException(status_code=404, detail=f"Unknown count field '{field}'")
+    table, expr = COUNT_FIELDS[field]
+    return query_db(f"SELECT {expr} AS value, COUNT(*) AS count FROM {table} GROUP BY value ORDER BY value")
+
+@app.get("/stats/crosstab/gender_risk_band")
+def get_gender_risk_crosstab(risk: str = "heart_disease_risk"):
+    if risk not in RISK_COLUMNS:
+        raise HTTPException(status_code=404, detail=f"Unknown risk column '{risk}'")
+    snapshot = analytics_snapshot()
+    if snapshot is not None:
+        band = f"risk_band({risk})"
+        rows = snapshot.table("RiskScores").query(
+            filters=[("is_latest", "=", True), ("patient.patient_id", "!=", -1)],
+            group_by=["patient.gender", band],
+        )
+        rows = sorted(rows, key=lambda r: (count_sort_key(r["patient.gender"]), count_sort_key(r[band], True)))
+        return [{"gender": r["patient.gender"], "risk_band": r[band], "count": r["count"]} for r in rows]
+    return query_db(f"""
+        SELECT p.gender, {risk_band_sql('r.' + risk)} AS risk_band, COUNT(*) AS count
+        FROM ({LATEST_RISK_SQL}) r
+        JOIN Patients p ON r.patient_id = p.patient_id
+        GROUP BY p.gender, risk_band
+        ORDER BY p.gender, {risk_band_rank_sql('risk_band')}
+    """)
+
+@app.get("/analytics/query")
+def query_analytics(table: str, group_by: Optional[str] = None, filters: Optional[str] = None,
+                    aggregates: Optional[str] = None):
+    # Ad-hoc group-by/filter/aggregate over the columnar snapshot, e.g.
+    # table=Vitals&group_by=patient.gender&aggregates={"bmi":["mean","bmi"]}
+    # filters is a JSON list of [ref, op, value]; see analytics_snapshot.py.
+    snapshot = analytics_snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Analytics snapshot is not available yet")
+    try:
+        rows = snapshot.table(table).query(
+            filters=[tuple(f) for f in json.loads(filters)] if filters else (),
+            group_by=group_by.split(",") if group_by else (),
+            aggregates={name: tuple(spec) for name, spec in json.loads(aggregates).items()} if aggregates else None,
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"version": snapshot.version, "built_at": snapshot.built_at, "rows": rows}
+
+def risk_frame():
+    snapshot = analytics_snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Analytics snapshot is not available yet")
+    return risk_stratification.frame_for(snapshot)
+
+def risk_cohort(frame, age_group, gender, vitals):
+    # age_group/gender are comma lists; vitals is JSON {"bmi": [low, high]}
+    # with null for an open end. Returns None (the population) without filters.
+    if not (age_group or gender or vitals):
+        return None
+    ranges = {col: tuple(bounds) for col, bounds in json.loads(vitals).items()} if vitals else None
+    return frame.cohort(age_groups=age_group.split(",") if age_group else None,
+                        genders=gender.split(",") if gender else None, vitals=ranges)
+
+@app.get("/analytics/risk_strata")
+def get_risk_strata(risk: str = "heart_disease_risk", by: Optional[str] = None, age_group: Optional[str] = None,
+                    gender: Optional[str] = None, vitals: Optional[str] = None):
+    # Latest-score risk bands of a cohort, optionally per gender/age_group,
+    # with how many patients rose or fell since their previous score
+    frame = risk_frame()
+    try:
+        cohort = risk_cohort(frame, age_group, gender, vitals)
+        rows = frame.stratify(risk, cohort, by)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    size = len(frame.patient_id) if cohort is None else int(cohort.sum())
+    return {"version": frame.version, "cohort_size": size, "rows": rows}
+
+@app.get("/analytics/risk_rank/{patient_id}")
+def get_risk_rank(patient_id: int, risk: str = "heart_disease_risk", age_group: Optional[str] = None,
+                  gender: Optional[str] = None, vitals: Optional[str] = None):
+    # A patient's percentile among the population and, given filters, a cohort
+    frame = risk_frame()
+    try:
+        result = frame.patient(patient_id, risk, risk_cohort(frame, age_group, gender, vitals))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Patient not found in the analytics snapshot")
+    return {"version": frame.version, **result}
+
+@app.get("/analytics/risk_movers")
+def get_risk_movers(risk: str = "heart_disease_risk", direction: str = "rising", limit: int = 20,
+                    age_group: Optional[str] = None, gender: Optional[str] = None, vitals: Optional[str] = None):
+    # Patients whose last two scores moved the most
+    limit = max(1, min(limit, MAX_MOVERS))
+    frame = risk_frame()
+    try:
+        rows = frame.movers(risk, risk_cohort(frame, age_group, gender, vitals), limit, direction)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"version": frame.version, "rows": rows}
+
 # ========== Save (POST) APIs ==========
 
+async def write_db(query, args, ack="committed"):
+    # Commit now, or through the write-behind queue when enabled. Returns the
+    # acknowledgement given: "accepted" means queued but not yet committed.
+    if write_queue is None:
+        execute_db(query, args)
+        change_feed.notify()
+        return "committed"
+    await write_queue.submit(query, args, ack)
+    return ack
+
 @app.post("/save_lab_report")
-async def save_lab_report(request: Request):
+async def save_lab_report(request: Request, ack: str = "committed"):
+    # ack=accepted returns once the write is queued (write-behind mode only)
+    if ack not in ACK_MODES:
+        return {"status": "error", "message": f"ack must be one of {', '.join(ACK_MODES)}"}
     try:
         data = await request.json()
         required_keys = ['patient_id', 'report_type', 'report_date', 'result']
@@ -161,17 +854,21 @@ async def save_lab_report(request: Request):
             return {"status": "error", "message": "Patient ID does not exist"}
 
         # Insert
-        execute_db("""
+        ack = await write_db("""
             INSERT INTO LabReports (patient_id, report_type, report_date, result)
             VALUES (?, ?, ?, ?)
-        """, (data['patient_id'], data['report_type'], data['report_date'], data['result']))
+        """, (data['patient_id'], data['report_type'], data['report_date'], data['result']), ack)
 
-        return {"status": "success", "message": "Lab report saved successfully"}
+        return {"status": "success", "message": f"Lab report {'saved' if ack == 'committed' else 'accepted'} successfully",
+                "ack": ack}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @app.post("/save_risk")
-async def save_risk(request: Request):
+async def save_risk(request: Request, ack: str = "committed"):
+    # ack=accepted returns once the write is queued (write-behind mode only)
+    if ack not in ACK_MODES:
+        return {"status": "error", "message": f"ack must be one of {', '.join(ACK_MODES)}"}
     try:
         data = await request.json()
         required_keys = ['patient_id', 'heart_disease_risk', 'diabetes_risk']
@@ -184,21 +881,341 @@ async def save_risk(request: Request):
             return {"status": "error", "message": "Patient ID does not exist"}
 
         # Insert
-        execute_db("""
+        ack = await write_db("""
             INSERT INTO RiskScores (patient_id, score_date, heart_disease_risk, diabetes_risk)
             VALUES (?, ?, ?, ?)
-        """, (data['patient_id'], datetime.now().isoformat(), data['heart_disease_risk'], data['diabetes_risk']))
+        """, (data['patient_id'], datetime.now().isoformat(), data['heart_disease_risk'], data['diabetes_risk']), ack)
+
+        return {"status": "success", "message": f"Risk score {'saved' if ack == 'committed' else 'accepted'} successfully",
+                "ack": ack}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.post("/save_appointment")
+async def save_appointment(request: Request):
+    try:
+        data = await request.json()
+        required_keys = ['patient_id', 'appointment_date', 'doctor_name']
+        if not all(key in data for key in required_keys):
+            return {"status": "error", "message": "Missing required fields"}
+
+        # Validate patient exists
+        patient_check = query_db("SELECT 1 FROM Patients WHERE patient_id = ?", (data['patient_id'],))
+        if not patient_check:
+            return {"status": "error", "message": "Patient ID does not exist"}
+
+        # Insert
+        execute_db("""
+            INSERT INTO Appointments (patient_id, appointment_date, doctor_name, status)
+            VALUES (?, ?, ?, ?)
+        """, (data['patient_id'], data['appointment_date'], data['doctor_name'], data.get('status', 'Scheduled')))
+        change_feed.notify()
 
-        return {"status": "success", "message": "Risk score saved successfully"}
+        return {"status": "success", "message": "Appointment saved successfully"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@app.post("/check_in")
+async def check_in(request: Request):
+    try:
+        data = await request.json()
+        if 'patient_id' not in data:
+            return {"status": "error", "message": "Missing required fields"}
+
+        # 'Checked-out' (or any other status) is accepted for check-outs
+        status = data.get('status', 'Checked-in')
+        updated = execute_db("UPDATE Patients SET check_in_status = ? WHERE patient_id = ?",
+                             (status, data['patient_id']))
+        if not updated:
+            return {"status": "error", "message": "Patient ID does not exist"}
+        change_feed.notify()
+
+        return {"status": "success", "message": f"Patient status set to {status}"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+# ========== Vitals Ingestion API ==========
+
+async def ndjson_readings(request):
+    # Parsed objects of an NDJSON body, read as it streams in; a line that is
+    # not JSON yields the error message instead
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield f"invalid JSON: {e}"
+    if buffer.strip():
+        try:
+            yield json.loads(buffer)
+        except ValueError as e:
+            yield f"invalid JSON: {e}"
+
+async def listed_readings(readings):
+    for reading in readings:
+        yield reading
+
+@app.post("/ingest_vitals")
+async def ingest_vitals(request: Request):
+    # Appends Vitals rows from an NDJSON stream (Content-Type
+    # application/x-ndjson, one reading per line) or a JSON list of readings.
+    # Rows are inserted in batches of INGEST_BATCH_ROWS as they arrive; bad
+    # readings are reported by position and skipped. See vitals_stream.reading_row.
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        readings = ndjson_readings(request)
+    else:
+        try:
+            body = await request.json()
+        except ValueError as e:
+            return {"status": "error", "message": f"invalid JSON: {e}"}
+        if isinstance(body, dict):
+            body = body.get("readings", [body])
+        if not isinstance(body, list):
+            return {"status": "error", "message": "Expected a reading, a list of readings or {\"readings\": [...]}"}
+        readings = listed_readings(body)
+
+    inserted, rejected, errors, batch, positions = 0, 0, [], [], []
+
+    def reject(index, message):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < MAX_INGEST_ERRORS:
+            errors.append({"index": index, "error": message})
+
+    async def flush():
+        nonlocal inserted
+        skipped = await asyncio.to_thread(vitals_stream.insert_readings, batch)
+        inserted += len(batch) - len(skipped)
+        for i in skipped:
+            reject(positions[i], "Patient ID does not exist")
+        batch.clear()
+        positions.clear()
+
+    index = 0
+    async for reading in readings:
+        try:
+            if isinstance(reading, str):
+                raise ValueError(reading)
+            batch.append(vitals_stream.reading_row(reading))
+            positions.append(index)
+        except ValueError as e:
+            reject(index, str(e))
+        index += 1
+        if len(batch) >= INGEST_BATCH_ROWS:
+            await flush()
+    if batch:
+        await flush()
+
+    if inserted:
+        await asyncio.to_thread(rolling_vitals.sync)
+        change_feed.notify()
+    return {
+        "status": "success" if inserted or not errors else "error",
+        "received": index,
+        "inserted": inserted,
+        "rejected": rejected,
+        "errors": sorted(errors, key=lambda e: e["index"]),
+    }
+
+@app.get("/vitals/rolling/{patient_id}")
+def get_rolling_vitals(patient_id: int):
+    # Count/EWMA/min/max/latest per vital plus the last few readings, from
+    # memory; no Vitals scan
+    rolling_vitals.sync()
+    state = rolling_vitals.patient(patient_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No vitals recorded for this patient")
+    return state
+
+@app.get("/vitals/rolling")
+def get_rolling_vitals_many(patient_ids: str):
+    # Same as /vitals/rolling/{id} for a comma-separated list; unknown ids are left out
+    try:
+        ids = [int(p) for p in patient_ids.split(",") if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="patient_ids must be comma-separated integers")
+    if len(ids) > MAX_ROLLING_PATIENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ROLLING_PATIENTS} patient_ids per request")
+    rolling_vitals.sync()
+    return [state for state in map(rolling_vitals.patient, ids) if state is not None]
+
+# ========== Model Predictions API ==========
+
+# Age (as in train_predictive_model.py) and the patient's latest vitals row
+PREDICTION_FEATURES_SQL = f"""
+    SELECT CAST((julianday('now') - julianday(p.date_of_birth)) / 365.25 AS INT) AS age,
+           {", ".join(f"{vitals_stream.VITAL_SQL[name]} AS {name}" for name in vitals_stream.VITALS)},
+           v.record_date
+    FROM Patients p
+    JOIN Vitals v ON v.vital_id = (
+        SELECT vital_id FROM Vitals WHERE patient_id = p.patient_id
+        ORDER BY record_date DESC, vital_id DESC LIMIT 1
+    )
+    WHERE p.patient_id = ?
+"""
+
+@app.get("/predict_risk/stats")
+def get_prediction_cache_stats():
+    # Hit ratio and size of the prediction cache for the loaded model version
+    return prediction_cache.cache.stats()
+
+@app.get("/predict_risk/{patient_id}")
+def predict_patient_risk(patient_id: int):
+    # Model estimate from the patient's latest vitals; repeated requests with
+    # unchanged vitals are answered by the prediction cache
+    return patient_prediction(patient_id)
+
+def patient_prediction(patient_id, conn=None):
+    # The models are regressors trained on 0-1 risk scores; their outputs are
+    # clipped to that range (prediction_cache) and labelled as estimates
+    rows = query_db(PREDICTION_FEATURES_SQL, (patient_id,), conn)
+    if not rows:
+        raise HTTPException(status_code=404, detail="No vitals recorded for this patient")
+    features = {name: rows[0][name] for name in prediction_cache.FEATURES}
+    if any(value is None for value in features.values()):
+        raise HTTPException(status_code=404, detail="Latest vitals are incomplete for a prediction")
+    try:
+        prediction, = prediction_cache.predict_risk([features])
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Risk models are not trained yet")
+    return {
+        "patient_id": patient_id,
+        "record_date": rows[0]["record_date"],
+        "model_version": prediction_cache.cache.version,
+        "estimate": "regression",
+        "features": features,
+        **prediction,
+    }
+
+# ========== Live Updates API ==========
+
+@app.get("/events")
+async def stream_events(request: Request):
+    # Server-Sent Events: one "change" event per committed write, plus
+    # keep-alive comments. See assets/live_updates.js for the client.
+    return StreamingResponse(
+        change_feed.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ========== Export API ==========
+
+@app.get("/export/cohort")
+def export_cohort(table: str = "Patients", format: str = "csv", patient_id: Optional[int] = None,
+                  gender: Optional[str] = None, risk_type: str = "both", min_risk: Optional[float] = None,
+                  start: Optional[str] = None, end: Optional[str] = None):
+    # One table for a cohort, streamed in chunks straight from a SQLite cursor
+    # (see cohort_export.py). format=parquet needs pyarrow.
+    if format not in ("csv", "parquet"):
+        raise HTTPException(status_code=400, detail="format must be csv or parquet")
+    if format == "parquet" and not cohort_export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed")
+    try:
+        sql, args, columns = cohort_export.export_query(table, patient_id, gender, risk_type, min_risk, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stream, media_type = ((cohort_export.stream_csv, "text/csv") if format == "csv"
+                          else (cohort_export.stream_parquet, "application/vnd.apache.parquet"))
+    name = f"patient_{patient_id}_{table.lower()}" if patient_id is not None else f"cohort_{table.lower()}"
+    return StreamingResponse(stream(sql, args, columns), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'})
+
 # ========== Database Check API ==========
 
 @app.get("/test_db")
 def test_db():
     return query_db("SELECT name FROM sqlite_master WHERE type='table'")
 
+@app.get("/data_version")
+def get_data_version():
+    # Highest id ever issued per table, read from sqlite_sequence in O(1).
+    # Dashboards compare it to decide whether cached data is stale.
+    return {row["name"]: row["seq"] for row in query_db("SELECT name, seq FROM sqlite_sequence")}
+
+# ========== Change Log API ==========
+
+CHANGE_TABLES = database_setup.CHANGE_TRACKED_TABLES
+MAX_CHANGES_PAGE = 5000
+
+def get_change_head(conn=None):
+    # Newest ChangeLog seq ever issued (survives compaction emptying the log)
+    rows = query_db("SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'", conn=conn)
+    return rows[0]["seq"] if rows else 0
+
+@app.get("/table_versions")
+def get_table_versions(tables: Optional[str] = None):
+    # Newest ChangeLog seq per table. Unlike /data_version it also moves on
+    # updates and deletes, so it can key caches of derived data (figures).
+    names = [t for t in tables.split(",") if t in CHANGE_TABLES] if tables else list(CHANGE_TABLES)
+    with read_transaction() as conn:
+        return table_versions(names, conn)
+
+def table_versions(names, conn):
+    return {t: query_db("SELECT MAX(seq) AS seq FROM ChangeLog WHERE table_name = ?", (t,), conn=conn)[0]["seq"] or 0
+            for t in names}
+
+def current_rows(conn, table, row_ids):
+    pk = CHANGE_TABLES[table]
+    ids = sorted(set(row_ids))
+    rows = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        sql = f"SELECT {select_columns(table)} FROM {table} WHERE {pk} IN ({placeholders})"
+        for row in query_db(sql, chunk, conn=conn):
+            rows[row[pk]] = row
+    return rows
+
+@app.get("/changes")
+def read_changes(since: int = 0, tables: Optional[str] = None, limit: int = 1000, include_rows: bool = False):
+    # Incremental sync: writes after cursor `since`, oldest first; resume from
+    # the returned `next`. New consumers load in full and start from `head`.
+    # A cursor older than the compaction horizon gets 410 and must reload.
+    limit = max(1, min(limit, MAX_CHANGES_PAGE))
+    selected = tables.split(",") if tables else list(CHANGE_TABLES)
+    unknown = [t for t in selected if t not in CHANGE_TABLES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(unknown)}")
+
+    with read_transaction() as conn:
+        head = get_change_head(conn)
+        compacted = query_db("SELECT compacted_through FROM ChangeLogState", conn=conn)[0]["compacted_through"]
+        if since < compacted:
+            raise HTTPException(
+                status_code=410,
+                detail=f"Changes up to {compacted} were compacted; reload and resume from {head}",
+            )
+        placeholders = ",".join("?" * len(selected))
+        changes = query_db(f"""
+            SELECT seq, table_name AS "table", row_id, patient_id, op, changed_at
+            FROM ChangeLog
+            WHERE seq > ? AND table_name IN ({placeholders})
+            ORDER BY seq
+            LIMIT ?
+        """, [since] + selected + [limit + 1], conn=conn)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        if include_rows:
+            # Current row state; None when the row has since been deleted
+            for table in {c["table"] for c in changes}:
+                rows = current_rows(conn, table, [c["row_id"] for c in changes if c["table"] == table])
+                for change in changes:
+                    if change["table"] == table:
+                        change["row"] = rows.get(change["row_id"]) if change["op"] != "D" else None
+
+    return {
+        "changes": changes,
+        "next": changes[-1]["seq"] if has_more else max(head, since),
+        "head": head,
+        "has_more": has_more,
+    }
+
 # ========== Run if executed directly ==========
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,85 @@
+# benchmarks/bench_consolidation.py
+# Resident memory and server/worker counts for the dashboards run as six
+# separate Dash servers (before) versus every page mounted in app.py (after).
+#
+# Each server is started in its own process, serves its layout and
+# dependencies, then loads what its pages pull in on first render (pandas,
+# plotly and, where the doctor dashboard is hosted, the risk models).
+#
+# Run from the project root:
+#   python -m benchmarks.bench_consolidation --workers 2
+
+import argparse
+import subprocess
+import sys
+
+# Standalone servers before consolidation: name -> (port, [(module, layout, register)])
+STANDALONE = {
+    "app": (8050, [("dashboard_doctor", "doctor_dashboard_layout", "register_doctor_callbacks"),
+                   ("dashboard_frontdesk", "get_frontdesk_dashboard_layout", "register_frontdesk_callbacks")]),
+    "patient_record": (8052, [("patient_record", "get_patient_record_layout", "register_patient_record_callbacks")]),
+    "risk_trend": (8054, [("risk_trend", "get_risk_trend_layout", "register_risk_trend_callbacks")]),
+    "reports": (8055, [("reports", "get_reports_layout", "register_reports_callbacks")]),
+    "patient_portal": (8056, [("patient_portal", "get_patient_portal_layout", "register_patient_portal_callbacks")]),
+    "nurse_portal": (8057, [("nurse_portal", "get_nurse_portal_layout", "register_nurse_callbacks")]),
+}
+
+STANDALONE_SCRIPT = """
+import importlib, dash
+from dash import html
+pages = {pages!r}
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
+layouts = []
+for module_name, layout, register in pages:
+    module = importlib.import_module(module_name)
+    layout = getattr(module, layout)
+    layouts.append(layout() if callable(layout) else layout)
+    getattr(module, register)(app)
+app.layout = html.Div(layouts)
+"""
+
+CONSOLIDATED_SCRIPT = """
+import app
+"""
+
+WARM_SCRIPT = """
+client = app.server.test_client()
+for path in ("/", "/_dash-layout", "/_dash-dependencies"):
+    assert client.get(path).status_code == 200, path
+import pandas, plotly.express, plotly.graph_objects
+if {load_models}:
+    import prediction_cache
+    prediction_cache.load_models()
+import resource
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024))
+"""
+
+
+def peak_rss_bytes(setup, load_models):
+    script = "import sys\n" + setup + WARM_SCRIPT.format(load_models=load_models)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory of separate Dash servers with one consolidated app")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes per server (e.g. gunicorn -w)")
+    args = parser.parse_args()
+
+    mb = 1024 * 1024
+    print(f"{'server':16} {'port':>5} {'workers':>8} {'RSS MB':>9}")
+    before = 0
+    for name, (port, pages) in STANDALONE.items():
+        rss = peak_rss_bytes(STANDALONE_SCRIPT.format(pages=pages), name == "app") * args.workers
+        before += rss
+        print(f"{name:16} {port:5} {args.workers:8} {rss / mb:9.1f}")
+    print(f"{'before total':16} {'':5} {len(STANDALONE) * args.workers:8} {before / mb:9.1f}")
+
+    after = peak_rss_bytes(CONSOLIDATED_SCRIPT, True) * args.workers
+    print(f"{'after (app.py)':16} {8050:5} {args.workers:8} {after / mb:9.1f}")
+    print(f"\nresident memory saved: {(before - after) / mb:.1f} MB ({1 - after / before:.0%}), "
+          f"servers {len(STANDALONE)} -> 1")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_data_access.py
+# Compare dashboard data-fetch latency in HTTP and in-process (local) mode.
+#
+# Run from the project root with the backend up for HTTP mode:
+#   python -m uvicorn backend:app --port 8000 &
+#   python -m benchmarks.bench_data_access --repeat 20
+
+import argparse
+import statistics
+import time
+
+from data_access import HttpDataSource, LocalDataSource
+
+# The reads each dashboard callback issues on a refresh
+CALLBACK_READS = {
+    "frontdesk.update_patient_count": ["/active_patients"],
+    "frontdesk.update_age_group_chart": ["/age_demographics"],
+    "frontdesk.update_trend_chart": ["/monthly_risk_trends"],
+    "doctor.display_patient_risk": ["/risk_scores", "/patient_details/1", "/patient_risk_trend/1"],
+    "patient_record.load_patient_table": ["/risk_scores"],
+}
+
+
+def time_callback(source, paths, repeat):
+    import pandas as pd
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            # ttl=0 so HTTP mode measures real round-trips, not the client cache
+            pd.DataFrame(source.records(path, ttl=0))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTTP and local data-access latency")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--skip-http", action="store_true", help="only time local mode")
+    args = parser.parse_args()
+
+    sources = [LocalDataSource()]
+    if not args.skip_http:
+        sources.insert(0, HttpDataSource())
+
+    print(f"{'callback':40} {'mode':6} {'median ms':>10} {'max ms':>10}")
+    for name, paths in CALLBACK_READS.items():
+        for source in sources:
+            median, worst = time_callback(source, paths, args.repeat)
+            print(f"{name:40} {source.mode:6} {median:10.1f} {worst:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/bench_prediction_cache.py
+# Scoring cost of dashboard re-renders with and without the prediction cache.
+#
+# Simulates --rounds refreshes of --patients patients' risk estimates, one
+# patient per request as the doctor dashboard asks for them. Between rounds
+# --changed of the patients get a new vitals reading; everyone else's
+# features repeat. Uses the trained models in the working directory.
+#
+# Run from the project root:
+#   python -m benchmarks.bench_prediction_cache --patients 500 --rounds 10
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from prediction_cache import FEATURES, PredictionCache, load_models
+
+RANGES = {"age": (18, 90), "systolic": (90, 180), "diastolic": (60, 110), "heart_rate": (50, 120),
+          "glucose_level": (70, 250), "bmi": (16, 45), "hemoglobin": (9, 18), "cholesterol": (120, 300)}
+
+
+def random_features(rng):
+    row = {name: int(rng.integers(low, high)) for name, (low, high) in RANGES.items()}
+    row["bmi"] = round(float(rng.uniform(*RANGES["bmi"])), 1)
+    row["hemoglobin"] = round(float(rng.uniform(*RANGES["hemoglobin"])), 1)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time repeated risk scoring with and without the prediction cache")
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--changed", type=float, default=0.05, help="fraction of patients with new vitals per round")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    patients = [random_features(rng) for _ in range(args.patients)]
+    rounds = []
+    for _ in range(args.rounds):
+        for i in rng.choice(args.patients, int(args.patients * args.changed), replace=False):
+            patients[i] = random_features(rng)
+        rounds.append(list(patients))
+    _, models = load_models()
+    cache = PredictionCache()
+
+    def uncached(row):
+        X = pd.DataFrame([[row[name] for name in FEATURES]], columns=FEATURES)
+        return [model.predict(X) for model in models]
+
+    results = {}
+    for name, score in (("model per request", uncached), ("prediction cache", lambda row: cache.predict([row]))):
+        start = time.perf_counter()
+        for rows in rounds:
+            for row in rows:
+                score(row)
+        results[name] = time.perf_counter() - start
+
+    requests = args.patients * args.rounds
+    print(f"{requests} requests ({args.patients} patients x {args.rounds} rounds, "
+          f"{args.changed:.0%} new vitals per round)\n")
+    print(f"{'scoring':20} {'total ms':>10} {'us/request':>11}")
+    for name, seconds in results.items():
+        print(f"{name:20} {seconds * 1000:10.1f} {seconds / requests * 1e6:11.1f}")
+    stats = cache.stats()
+    print(f"\nhit ratio {stats['hit_ratio']:.1%} ({stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['entries']} entries)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_risk_strata.py
+# Time RiskFrame stratification, percentile ranks and risk deltas on a
+# synthetic population (default 1M patients, 3 scores and 2 vitals rows each).
+#
+# The frame build runs once per analytics snapshot; the queries run per
+# request and should each answer within the target (default 1000 ms).
+#
+# Run from the project root:
+#   python -m benchmarks.bench_risk_strata --patients 1000000
+
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from analytics_snapshot import AGE_GROUPS
+from risk_stratification import RISK_COLUMNS, VITAL_COLUMNS, RiskFrame
+
+GENDERS = ["Female", "Male", "Other"]
+VITAL_RANGES = {"systolic": (90, 180), "diastolic": (60, 110), "heart_rate": (50, 120),
+                "glucose_level": (70, 250), "bmi": (16, 45), "hemoglobin": (9, 18), "cholesterol": (120, 300)}
+
+
+def synthetic_frame(n, scores_per_patient, vitals_per_patient, seed=0):
+    rng = np.random.default_rng(seed)
+    patient_id = rng.permutation(n).astype(np.int64) + 1
+    gender = rng.integers(0, len(GENDERS), n).astype(np.int32)
+    age_group = rng.integers(0, len(AGE_GROUPS), n).astype(np.int32)
+
+    m = n * scores_per_patient
+    risk_scores = {"patient_id": rng.integers(1, n + 1, m), "risk_id": rng.permutation(m).astype(np.int64) + 1,
+                   "score_date": np.datetime64("2024-01-01", "s") + rng.integers(0, 365 * 86400, m)}
+    for col in RISK_COLUMNS:
+        risk_scores[col] = rng.random(m).round(2)
+
+    m = n * vitals_per_patient
+    vitals = {"patient_id": rng.integers(1, n + 1, m), "vital_id": np.arange(1, m + 1),
+              "record_date": np.datetime64("2024-01-01", "s") + rng.integers(0, 365 * 86400, m)}
+    for col in VITAL_COLUMNS:
+        low, high = VITAL_RANGES[col]
+        vitals[col] = rng.uniform(low, high, m)
+
+    start = time.perf_counter()
+    frame = RiskFrame(patient_id, gender, GENDERS, age_group, risk_scores, vitals)
+    return frame, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time vectorized risk stratification at population scale")
+    parser.add_argument("--patients", type=int, default=1_000_000)
+    parser.add_argument("--scores", type=int, default=3, help="risk scores per patient")
+    parser.add_argument("--vitals", type=int, default=2, help="vitals rows per patient")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=1000)
+    args = parser.parse_args()
+
+    frame, build_ms = synthetic_frame(args.patients, args.scores, args.vitals)
+    print(f"frame build ({args.patients:,} patients): {build_ms:.0f} ms (once per snapshot)\n")
+
+    risk = "heart_disease_risk"
+    some_patient = int(frame.patient_id[len(frame.patient_id) // 2])
+
+    def cohort():
+        return frame.cohort(age_groups=["36-55", "55+"], genders=["Female"],
+                            vitals={"bmi": (30, None), "systolic": (None, 140)})
+
+    queries = {
+        "cohort mask": cohort,
+        "strata (population)": lambda: frame.stratify(risk),
+        "strata by age_group": lambda: frame.stratify(risk, by="age_group"),
+        "strata (cohort) by gender": lambda: frame.stratify(risk, cohort(), by="gender"),
+        "patient rank (population)": lambda: frame.patient(some_patient, risk),
+        "patient rank (cohort)": lambda: frame.patient(some_patient, risk, cohort()),
+        "percentile of every patient": lambda: frame.percentile_rank(risk, frame.latest[risk]),
+        "top 50 risers (cohort)": lambda: frame.movers(risk, cohort(), limit=50),
+    }
+
+    print(f"{'query':30} {'median ms':>10} {'max ms':>10}")
+    slow = []
+    for name, query in queries.items():
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            query()
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f"{name:30} {statistics.median(samples):10.1f} {max(samples):10.1f}")
+        if max(samples) > args.target_ms:
+            slow.append(name)
+
+    if slow:
+        print(f"\nover {args.target_ms:.0f} ms: {', '.join(slow)}")
+        sys.exit(1)
+    print(f"\nall queries under {args.target_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_startup.py
+# Cold-start time of app.py until the login page can be served, plus the
+# slowest imports from a `python -X importtime` profile.
+#
+# Run from the project root:
+#   python -m benchmarks.bench_startup --repeat 5 --top 15
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Import the app and serve everything the browser needs for the login page
+READY_SCRIPT = """
+import app
+client = app.server.test_client()
+for path in ("/", "/_dash-layout", "/_dash-dependencies"):
+    assert client.get(path).status_code == 200, path
+"""
+
+# Modules that should only load once a dashboard is opened
+DEFERRED_MODULES = ("numpy", "pandas", "plotly.express", "joblib", "sklearn", "xgboost", "requests", "IPython")
+
+
+def cold_start_seconds():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", READY_SCRIPT], check=True)
+    return time.perf_counter() - start
+
+
+def eager_modules():
+    """DEFERRED_MODULES loaded once app.py is imported."""
+    script = f"import sys, app; print(' '.join(m for m in {DEFERRED_MODULES!r} if sys.modules.get(m)))"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def import_profile():
+    """Return [(cumulative_us, module)] from -X importtime, slowest first."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), module))
+    return sorted(rows, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app.py cold start and import costs")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    samples = [cold_start_seconds() for _ in range(args.repeat)]
+    print(f"login page ready: median {statistics.median(samples):.2f}s, max {max(samples):.2f}s")
+
+    # Checked in sys.modules: the profile also lists imports that were tried and failed
+    eager = eager_modules()
+    print(f"deferred modules imported at startup: {', '.join(eager) or 'none'}")
+
+    print(f"\n{'cumulative ms':>14}  module")
+    for cumulative, module in import_profile()[:args.top]:
+        print(f"{cumulative / 1000:14.1f}  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_write_behind.py
+# Throughput and latency of /save_risk with direct commits versus the
+# write-behind queue (ack=committed and ack=accepted).
+#
+# Requests go through the FastAPI app in-process (httpx ASGI transport) from
+# --clients concurrent clients, against a scratch copy of healthcare.db in a
+# directory on the same filesystem (so commits pay the real fsync cost).
+#
+# Run from the project root:
+#   python -m benchmarks.bench_write_behind --requests 2000 --clients 32
+
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import httpx
+
+
+async def run_mode(backend, queue, ack, n_requests, n_clients, patient_ids):
+    backend.write_queue = queue
+    if queue is not None:
+        queue.start()
+    latencies = []
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(offset):
+            for i in range(offset, n_requests, n_clients):
+                body = {"patient_id": patient_ids[i % len(patient_ids)],
+                        "heart_disease_risk": 0.5, "diabetes_risk": 0.5}
+                start = time.perf_counter()
+                response = await client.post("/save_risk", params={"ack": ack}, json=body)
+                latencies.append(time.perf_counter() - start)
+                assert response.json()["status"] == "success", response.json()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(c) for c in range(n_clients)))
+        acked = time.perf_counter() - start
+        if queue is not None:
+            await queue.close()
+        durable = time.perf_counter() - start
+    backend.write_queue = None
+    latencies.sort()
+    return {
+        "acked/s": n_requests / acked,
+        "durable/s": n_requests / durable,
+        "p50 ms": latencies[len(latencies) // 2] * 1000,
+        "p99 ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "avg batch": queue.committed / queue.batches if queue is not None and queue.batches else 1.0,
+    }
+
+
+async def main_async(args):
+    import backend
+    from write_behind import WriteBehindQueue
+
+    patient_ids = [row["patient_id"] for row in backend.query_db("SELECT patient_id FROM Patients LIMIT 1000")]
+    before = backend.query_db("SELECT COUNT(*) AS n FROM RiskScores")[0]["n"]
+    modes = {
+        "direct commit": (None, "committed"),
+        "write-behind committed": (WriteBehindQueue(max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000),
+                                   "committed"),
+        "write-behind accepted": (WriteBehindQueue(max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000),
+                                  "accepted"),
+    }
+    columns = ["acked/s", "durable/s", "p50 ms", "p99 ms", "avg batch"]
+    print(f"{args.requests} requests, {args.clients} clients\n")
+    print(f"{'mode':24}" + "".join(f"{c:>11}" for c in columns))
+    for name, (queue, ack) in modes.items():
+        result = await run_mode(backend, queue, ack, args.requests, args.clients, patient_ids)
+        print(f"{name:24}" + "".join(f"{result[c]:11.1f}" for c in columns))
+    after = backend.query_db("SELECT COUNT(*) AS n FROM RiskScores")[0]["n"]
+    assert after - before == args.requests * len(modes), "writes were lost"
+    print(f"\nall {after - before} writes committed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark group-commit write-behind against direct commits")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-delay-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    # Scratch copy next to the real database; the backend opens healthcare.db
+    # relative to the working directory
+    scratch = tempfile.mkdtemp(prefix="bench_write_behind_", dir=".")
+    source = sqlite3.connect("healthcare.db")
+    target = sqlite3.connect(os.path.join(scratch, "healthcare.db"))
+    source.backup(target)
+    source.close()
+    target.execute("PRAGMA journal_mode=WAL")
+    target.close()
+    cwd = os.getcwd()
+    os.chdir(scratch)
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/check_query_plans.py
+# Confirm the date-window queries are index range scans (EXPLAIN QUERY PLAN)
+# and time them against the DATE(text) filters they replaced.
+#
+# Run from the project root; exits non-zero if a plan misses its index:
+#   python -m benchmarks.check_query_plans --repeat 20
+
+import argparse
+import sqlite3
+import statistics
+import sys
+import time
+
+import backend
+import database_setup
+
+# name -> (SQL, expected index, legacy SQL or None)
+PLAN_CHECKS = {
+    "appointments_today": (
+        backend.APPOINTMENTS_TODAY_SQL, "idx_appointments_day",
+        """SELECT a.*, p.first_name, p.last_name FROM Appointments a
+           JOIN Patients p ON a.patient_id = p.patient_id
+           WHERE DATE(appointment_date) = DATE('now')""",
+    ),
+    "recent_lab_reports": (
+        backend.RECENT_LAB_REPORTS_SQL, "idx_labreports_day",
+        """SELECT lr.*, p.first_name, p.last_name FROM LabReports lr
+           JOIN Patients p ON lr.patient_id = p.patient_id
+           WHERE DATE(report_date) >= DATE('now', '-7 days')
+           ORDER BY report_date DESC LIMIT 50""",
+    ),
+    "vitals_last_30_days": (
+        f"SELECT COUNT(*) FROM Vitals WHERE record_day >= {backend.TODAY_SQL} - 30", "idx_vitals_day",
+        "SELECT COUNT(*) FROM Vitals WHERE DATE(record_date) >= DATE('now', '-30 days')",
+    ),
+    "risk_scores_last_30_days": (
+        f"SELECT COUNT(*) FROM RiskScores WHERE score_day >= {backend.TODAY_SQL} - 30", "idx_riskscores_day",
+        "SELECT COUNT(*) FROM RiskScores WHERE DATE(score_date) >= DATE('now', '-30 days')",
+    ),
+    "age_band_range": (
+        f"SELECT COUNT(*) FROM Patients WHERE dob_day BETWEEN {backend.TODAY_SQL} - 6940 AND {backend.TODAY_SQL}",
+        "idx_patients_dob_day", None,
+    ),
+}
+
+
+def query_plan(conn, sql):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+def time_query(conn, sql, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check date-window query plans use their indexes")
+    parser.add_argument("--db", default="healthcare.db")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    database_setup.migrate(args.db)
+    conn = sqlite3.connect(args.db)
+    failures = 0
+    print(f"{'query':26} {'index':6} {'ms':>8} {'legacy ms':>10}")
+    for name, (sql, index, legacy) in PLAN_CHECKS.items():
+        plan = query_plan(conn, sql)
+        uses_index = any(index in step for step in plan)
+        failures += not uses_index
+        legacy_ms = f"{time_query(conn, legacy, args.repeat):10.2f}" if legacy else f"{'-':>10}"
+        print(f"{name:26} {'ok' if uses_index else 'MISS':6} {time_query(conn, sql, args.repeat):8.2f} {legacy_ms}")
+        if not uses_index:
+            print("    plan: " + " | ".join(plan))
+    conn.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
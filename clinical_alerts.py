@@ -0,0 +1,174 @@
+# clinical_alerts.py
+# Threshold alerts on Vitals and RiskScores, precomputed into the Alerts table.
+#
+# ALERT_RULES declares each alert as a column compared against a threshold.
+# refresh() evaluates all rules of a table as NumPy comparisons over batches
+# of rows: on the first run over every row, afterwards only over the rows the
+# ChangeLog reports as written since the last run (AlertState.seq). Changing
+# the rules, or the ChangeLog being compacted past the watermark, triggers a
+# full rebuild. Alerts on a patient's latest row of each table are marked
+# active; those are the flags the dashboards show.
+
+import hashlib
+import json
+import sqlite3
+
+import numpy as np
+
+DB_PATH = "healthcare.db"
+BATCH_ROWS = 50_000
+
+# name -> (table, column, op, threshold, severity, message). Same thresholds
+# the risk trend page used to check while rendering.
+ALERT_RULES = {
+    "high_heart_risk": ("RiskScores", "heart_disease_risk", ">", 0.7, "high", "⚠️ High Heart Risk"),
+    "high_diabetes_risk": ("RiskScores", "diabetes_risk", ">", 0.7, "high", "⚠️ High Diabetes Risk"),
+    "high_glucose": ("Vitals", "glucose_level", ">", 140, "warning", "🩸 High Glucose"),
+    "high_cholesterol": ("Vitals", "cholesterol", ">", 240, "warning", "🧬 High Cholesterol"),
+    "elevated_heart_rate": ("Vitals", "heart_rate", ">", 100, "warning", "💓 Elevated Heart Rate"),
+    "high_bmi": ("Vitals", "bmi", ">", 30, "warning", "⚖️ High BMI"),
+    "low_hemoglobin": ("Vitals", "hemoglobin", "<", 12, "warning", "🧪 Low Hemoglobin"),
+}
+OPS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+SEVERITIES = ("high", "warning")
+
+# Source table -> (primary key, date column, SQL giving a patient's latest
+# row id). Latest is by date, newest id first on ties, as the timeline and
+# /patient_history pick it; rows are not inserted in date order.
+ALERT_SOURCES = {
+    "RiskScores": ("risk_id", "score_date",
+                   "SELECT risk_id FROM RiskScores s WHERE s.patient_id = Alerts.patient_id "
+                   "ORDER BY s.score_date DESC, s.risk_id DESC LIMIT 1"),
+    "Vitals": ("vital_id", "record_date",
+               "SELECT vital_id FROM Vitals s WHERE s.patient_id = Alerts.patient_id "
+               "ORDER BY s.record_date DESC, s.vital_id DESC LIMIT 1"),
+}
+
+# Stored in AlertState; a different rule set, or a different choice of
+# latest row, rebuilds every alert
+RULES_VERSION = hashlib.sha1(json.dumps([ALERT_RULES, ALERT_SOURCES], sort_keys=True).encode()).hexdigest()
+
+
+def evaluate(table, rows):
+    """Alert rows for source rows of ``table``.
+
+    ``rows`` are (id, patient_id, date, *rule columns) tuples in the order of
+    rule_columns(table). Returns INSERT tuples (patient_id, rule, severity,
+    message, source_table, source_id, value, observed_at).
+    """
+    if not rows:
+        return []
+    columns = list(zip(*rows))
+    ids, patients, dates = columns[0], columns[1], columns[2]
+    # None (not recorded) becomes NaN, which no comparison matches
+    values = {col: np.array(columns[3 + i], dtype=np.float64) for i, col in enumerate(rule_columns(table))}
+    alerts = []
+    for name, (source, col, op, threshold, severity, message) in ALERT_RULES.items():
+        if source != table:
+            continue
+        for i in np.flatnonzero(OPS[op](values[col], threshold)):
+            alerts.append((patients[i], name, severity, message, table, ids[i], float(values[col][i]), dates[i]))
+    return alerts
+
+
+def rule_columns(table):
+    return sorted({col for source, col, *_ in ALERT_RULES.values() if source == table})
+
+
+def _select(table):
+    pk, date_column, _ = ALERT_SOURCES[table]
+    return f"SELECT {pk}, patient_id, {date_column}, {', '.join(rule_columns(table))} FROM {table}"
+
+
+def _insert(conn, alerts):
+    conn.executemany("""
+        INSERT INTO Alerts (patient_id, rule, severity, message, source_table, source_id, value, observed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, alerts)
+
+
+def _mark_active(conn, table, patient_ids=None):
+    # active = the alert's source row is the patient's latest row of its table
+    sql = f"UPDATE Alerts SET active = (source_id IS ({ALERT_SOURCES[table][2]})) WHERE source_table = ?"
+    if patient_ids is None:
+        conn.execute(sql, (table,))
+    else:
+        conn.execute(sql + " AND patient_id IN (SELECT value FROM json_each(?))", (table, json.dumps(patient_ids)))
+
+
+def _rebuild(conn):
+    conn.execute("DELETE FROM Alerts")
+    evaluated = 0
+    for table in ALERT_SOURCES:
+        cursor = conn.execute(_select(table))
+        while True:
+            rows = cursor.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            _insert(conn, evaluate(table, rows))
+            evaluated += len(rows)
+        _mark_active(conn, table)
+    return evaluated
+
+
+def _apply_changes(conn, since, head):
+    # Re-evaluate rows written in (since, head]; deleted rows just lose their alerts
+    evaluated = 0
+    for table in ALERT_SOURCES:
+        changes = conn.execute("""
+            SELECT row_id, patient_id FROM ChangeLog
+            WHERE seq > ? AND seq <= ? AND table_name = ?
+        """, (since, head, table)).fetchall()
+        if not changes:
+            continue
+        ids = json.dumps(sorted({row_id for row_id, _ in changes}))
+        patients = {patient_id for _, patient_id in changes if patient_id is not None}
+        # Patients whose alerts go away (an update may move a row to another patient)
+        patients.update(p for p, in conn.execute(
+            "SELECT DISTINCT patient_id FROM Alerts WHERE source_table = ? "
+            "AND source_id IN (SELECT value FROM json_each(?))", (table, ids)))
+        conn.execute("DELETE FROM Alerts WHERE source_table = ? AND source_id IN (SELECT value FROM json_each(?))",
+                     (table, ids))
+        rows = conn.execute(f"{_select(table)} WHERE {ALERT_SOURCES[table][0]} IN (SELECT value FROM json_each(?))",
+                            (ids,)).fetchall()
+        _insert(conn, evaluate(table, rows))
+        _mark_active(conn, table, sorted(patients))
+        evaluated += len(rows)
+    return evaluated
+
+
+def _state(conn):
+    seq, rules = conn.execute("SELECT seq, rules FROM AlertState").fetchone()
+    head = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'").fetchone()
+    return seq, rules, head[0] if head else 0
+
+
+def refresh(db_path=DB_PATH):
+    """Bring Alerts up to date with the ChangeLog; returns the number of source rows evaluated.
+
+    Cheap when nothing changed. Concurrent callers (other workers) wait for
+    the one holding the write lock, then find the alerts already current.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        seq, rules, head = _state(conn)
+        if seq == head and rules == RULES_VERSION:
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq, rules, head = _state(conn)
+            compacted, = conn.execute("SELECT compacted_through FROM ChangeLogState").fetchone()
+            if rules != RULES_VERSION or seq < compacted:
+                evaluated = _rebuild(conn)
+            elif seq < head:
+                evaluated = _apply_changes(conn, seq, head)
+            else:
+                evaluated = 0
+            conn.execute("UPDATE AlertState SET seq = ?, rules = ?", (head, RULES_VERSION))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return evaluated
+    finally:
+        conn.close()
@@ -0,0 +1,186 @@
+# cohort_export.py
+# Streamed CSV/Parquet exports of a patient cohort, behind /export/cohort.
+#
+# A cohort is the set of patients matching gender and latest-risk filters
+# (the same risk_type/min_risk rules as the Top Risky Patients page), or a
+# single patient. One table is exported per request: the cohort roster
+# itself (Patients, with each patient's latest scores) or the cohort's rows
+# of a history table, optionally limited to a date range. Rows go from the
+# SQLite cursor to the response in chunks of CHUNK_ROWS, so memory stays
+# constant whatever the cohort size. Parquet output needs pyarrow.
+
+import csv
+import io
+import sqlite3
+
+DB_PATH = "healthcare.db"
+CHUNK_ROWS = 5000
+RISK_TYPES = ("heart", "diabetes", "both")
+
+# Export table -> (date column or None, [(SQL expression, output name, type)]).
+# Types ("int", "float", "str") give the Parquet schema. "c" is the cohort
+# row (Patients plus latest scores), "t" the exported table's row.
+PATIENT_COLUMNS = [("c.patient_id", "patient_id", "int"), ("c.first_name", "first_name", "str"),
+                   ("c.last_name", "last_name", "str"), ("c.gender", "gender", "str")]
+EXPORT_TABLES = {
+    "Patients": (None, PATIENT_COLUMNS + [
+        ("c.date_of_birth", "date_of_birth", "str"), ("c.check_in_status", "check_in_status", "str"),
+        ("c.latest_score_date", "latest_score_date", "str"),
+        ("c.latest_heart_disease_risk", "latest_heart_disease_risk", "float"),
+        ("c.latest_diabetes_risk", "latest_diabetes_risk", "float"),
+    ]),
+    "RiskScores": ("score_date", PATIENT_COLUMNS + [
+        ("t.risk_id", "risk_id", "int"), ("t.score_date", "score_date", "str"),
+        ("t.heart_disease_risk", "heart_disease_risk", "float"), ("t.diabetes_risk", "diabetes_risk", "float"),
+    ]),
+    "Vitals": ("record_date", PATIENT_COLUMNS + [
+        ("t.vital_id", "vital_id", "int"), ("t.record_date", "record_date", "str"),
+        ("t.blood_pressure", "blood_pressure", "str"), ("t.heart_rate", "heart_rate", "int"),
+        ("t.glucose_level", "glucose_level", "int"), ("t.bmi", "bmi", "float"),
+        ("t.hemoglobin", "hemoglobin", "float"), ("t.cholesterol", "cholesterol", "int"),
+    ]),
+    "LabReports": ("report_date", PATIENT_COLUMNS + [
+        ("t.report_id", "report_id", "int"), ("t.report_date", "report_date", "str"),
+        ("t.report_type", "report_type", "str"), ("t.result", "result", "str"),
+    ]),
+    "Appointments": ("appointment_date", PATIENT_COLUMNS + [
+        ("t.appointment_id", "appointment_id", "int"), ("t.appointment_date", "appointment_date", "str"),
+        ("t.doctor_name", "doctor_name", "str"), ("t.status", "status", "str"),
+    ]),
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_query(table="Patients", patient_id=None, gender=None, risk_type="both", min_risk=None,
+                 start=None, end=None):
+    """Return (SQL, args, columns) for one export; raises ValueError on bad filters.
+
+    ``columns`` is the [(name, type)] list of the result. start/end bound the
+    history table's date column; a bare end date includes the whole day.
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export table: {table}. Expected one of {', '.join(EXPORT_TABLES)}")
+    if risk_type not in RISK_TYPES:
+        raise ValueError(f"Unknown risk_type: {risk_type}. Expected one of {', '.join(RISK_TYPES)}")
+    date_column, columns = EXPORT_TABLES[table]
+    if date_column is None and (start or end):
+        raise ValueError("start/end apply to history tables, not Patients")
+
+    # Cohort: patients with their latest score (newest score_date, then
+    # risk_id, as LATEST_RISK_SQL picks it), filtered
+    where, args = [], []
+    if patient_id is not None:
+        where.append("p.patient_id = ?")
+        args.append(patient_id)
+    if gender:
+        where.append("p.gender = ?")
+        args.append(gender)
+    if min_risk is not None:
+        checks = {"heart": ["l.heart_disease_risk >= ?"], "diabetes": ["l.diabetes_risk >= ?"],
+                  "both": ["l.heart_disease_risk >= ?", "l.diabetes_risk >= ?"]}[risk_type]
+        where.append(f"({' OR '.join(checks)})")
+        args += [min_risk] * len(checks)
+    sql = f"""
+        WITH cohort AS (
+            SELECT p.*, l.score_date AS latest_score_date,
+                   l.heart_disease_risk AS latest_heart_disease_risk, l.diabetes_risk AS latest_diabetes_risk
+            FROM Patients p
+            LEFT JOIN RiskScores l ON l.risk_id = (
+                SELECT risk_id FROM RiskScores WHERE patient_id = p.patient_id
+                ORDER BY score_date DESC, risk_id DESC LIMIT 1
+            )
+            {"WHERE " + " AND ".join(where) if where else ""}
+        )
+        SELECT {", ".join(expr for expr, _, _ in columns)}
+        FROM cohort c
+    """
+    if date_column is None:
+        sql += " ORDER BY c.patient_id"
+    else:
+        # Rows come off the (patient_id, date) index per cohort patient
+        sql += f" JOIN {table} t ON t.patient_id = c.patient_id"
+        bounds = []
+        if start:
+            bounds.append(f"t.{date_column} >= ?")
+            args.append(start)
+        if end:
+            bounds.append(f"t.{date_column} <= ?" if len(end) > 10 else f"t.{date_column} < DATE(?, '+1 day')")
+            args.append(end)
+        if bounds:
+            sql += " WHERE " + " AND ".join(bounds)
+        sql += f" ORDER BY t.patient_id, t.{date_column}"
+    return sql, args, [(name, kind) for _, name, kind in columns]
+
+
+def _rows(sql, args, db_path):
+    # Yields lists of up to CHUNK_ROWS rows; the connection closes when the
+    # response finishes or the client disconnects
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(sql, args)
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.close()
+
+
+def stream_csv(sql, args, columns, db_path=DB_PATH):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in _rows(sql, args, db_path):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that hands written bytes back in chunks. tell() keeps
+    # counting across drains, as the Parquet footer records absolute offsets.
+    def __init__(self):
+        self.chunks, self.position = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_parquet(sql, args, columns, db_path=DB_PATH):
+    # One row group per chunk; the footer is written when the writer closes
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in _rows(sql, args, db_path):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
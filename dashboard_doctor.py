@@ -3,17 +3,10 @@
 import dash
 from dash import html, dcc, Input, Output, State
 import dash_bootstrap_components as dbc
-import pandas as pd
-import requests
-import plotly.express as px
-import joblib
+from data_access import ApiError, fetch, search_patient_options
 
-# Load models
-heart_model = joblib.load("heart_risk_model.pkl")
-diabetes_model = joblib.load("diabetes_risk_model.pkl")
-
-# API Endpoint
-API = "http://localhost:8000"
+# pandas and plotly are imported on first use so that importing this module
+# keeps app.py's login page fast; the models are scored by the backend
 
 # ========== Sidebar ==========
 sidebar = html.Div(
@@ -79,7 +72,7 @@ layout_content = html.Div([
     html.H3("Patient Risk Assessment", className="mb-4 fw-bold"),
 
     dbc.Row([
-        dbc.Col(dcc.Dropdown(id="patient-selector", placeholder="Select Patient", style={"width": "100%"}), width=4)
+        dbc.Col(dcc.Dropdown(id="patient-selector", placeholder="Type to search patients", style={"width": "100%"}), width=4)
     ], className="mb-4"),
 
     html.Div(id="risk-assessment-body")
@@ -92,19 +85,43 @@ doctor_dashboard_layout = html.Div([
     layout_content
 ])
 
+def flagged_patients_card():
+    # Every patient's current alerts, newest first, precomputed by the backend
+    try:
+        alerts = fetch("/alerts", {"limit": 100})
+    except ApiError as e:
+        return dbc.Alert(f"❌ Could not load alerts: {e}", color="danger")
+    if not alerts:
+        return dbc.Alert("✅ No patients are currently flagged.", color="success")
+    return dbc.Card([
+        dbc.CardHeader("🚩 Flagged Patients"),
+        dbc.CardBody(dbc.Table(
+            [html.Thead(html.Tr([html.Th("Patient"), html.Th("Alert"), html.Th("Value"), html.Th("Recorded")]))] +
+            [html.Tbody([html.Tr([
+                html.Td(f"{a['first_name']} {a['last_name']} (#{a['patient_id']})"),
+                html.Td(a["message"], className="text-danger" if a["severity"] == "high" else ""),
+                html.Td(a["value"]),
+                html.Td((a["observed_at"] or "")[:10]),
+            ]) for a in alerts])],
+            striped=True, hover=True, size="sm", className="mb-0"
+        ))
+    ], className="shadow-sm")
+
 # ========== Callbacks ==========
 def register_doctor_callbacks(app):
 
     @app.callback(
         Output("patient-selector", "options"),
-        Input("patient-selector", "id")
+        Input("patient-selector", "search_value"),
+        State("patient-selector", "value"),
+        State("patient-selector", "options")
     )
-    def load_patients(_):
+    def load_patients(search_value, selected, options):
+        # Server-side type-ahead keeps the option list small
         try:
-            patients = requests.get(f"{API}/active_patients").json()
-            return [{"label": f"{p['first_name']} {p['last_name']}", "value": p["patient_id"]} for p in patients]
-        except:
-            return []
+            return search_patient_options(search_value, selected, options, active_only=True)
+        except ApiError:
+            return dash.no_update
 
     @app.callback(
         Output("risk-assessment-body", "children"),
@@ -112,12 +129,17 @@ def register_doctor_callbacks(app):
     )
     def display_patient_risk(patient_id):
         if not patient_id:
-            return ""
+            return flagged_patients_card()
+
+        import pandas as pd
+        import plotly.express as px
 
         try:
-            # Get risk scores
-            risk_data = requests.get(f"{API}/risk_scores").json()
-            risk = next((r for r in risk_data if r["patient_id"] == patient_id), None)
+            # Demographics, latest risk, monthly trend, current alerts and the
+            # model estimate from the latest vitals in one round-trip
+            timeline = fetch(f"/patient_timeline/{patient_id}",
+                             {"fields": "demographics,latest_risk,trend,alerts,prediction"})
+            risk = timeline["latest_risk"]
             if not risk:
                 return dbc.Alert("❌ No risk score found for this patient.", color="danger")
 
@@ -128,29 +150,29 @@ def register_doctor_callbacks(app):
             heart_bar_color = "danger" if heart_risk > 0.7 else "warning" if heart_risk > 0.4 else "success"
             diabetes_bar_color = "danger" if diabetes_risk > 0.7 else "warning" if diabetes_risk > 0.4 else "success"
 
-            # Get patient demographics
-            info_response = requests.get(f"{API}/patient_details/{patient_id}").json()
-            if not info_response:
+            # Patient demographics
+            info = timeline["demographics"]
+            if not info:
                 return dbc.Alert("❌ No patient details found.", color="danger")
 
-            info = info_response[0]
             full_name = f"{info.get('first_name', 'N/A')} {info.get('last_name', 'N/A')}"
             gender = info.get('gender', 'N/A')
 
             try:
                 dob = pd.to_datetime(info['date_of_birth'])
                 age = int((pd.Timestamp.now() - dob).days / 365.25)
-            except:
+            except (KeyError, TypeError, ValueError):
                 age = "N/A"
 
             try:
                 last_visit = pd.to_datetime(info['last_visit']).strftime("%Y-%m-%d") if info['last_visit'] else "N/A"
-            except:
+            except (KeyError, TypeError, ValueError):
                 last_visit = "N/A"
 
+            estimate = timeline["prediction"]
+
             # Risk trend
-            trend_data = requests.get(f"{API}/patient_risk_trend/{patient_id}").json()
-            df_trend = pd.DataFrame(trend_data)
+            df_trend = pd.DataFrame(timeline["trend"])
             fig = px.line(df_trend, x='month', y=['avg_heart_risk', 'avg_diabetes_risk'],
                           markers=True, title='Risk Score History')
 
@@ -179,7 +201,9 @@ def register_doctor_callbacks(app):
                             dbc.CardBody([
                                 dbc.Progress(value=heart_risk * 100, color=heart_bar_color, striped=True, animated=True),
                                 html.P(f"Risk Score: {int(heart_risk * 100)}% ({heart_label})", className="mt-2"),
-                                html.Small("Factors: High BP, Cholesterol", className="text-muted")
+                                html.Small("Factors: High BP, Cholesterol", className="text-muted"),
+                                html.P(f"Regression model estimate from latest vitals: {int(estimate['heart_disease_risk'] * 100)}%",
+                                       className="small text-muted mb-0") if estimate else None
                             ])
                         ], className="shadow-sm")
                     ], width=6),
@@ -189,12 +213,22 @@ def register_doctor_callbacks(app):
                             dbc.CardBody([
                                 dbc.Progress(value=diabetes_risk * 100, color=diabetes_bar_color, striped=True, animated=True),
                                 html.P(f"Risk Score: {int(diabetes_risk * 100)}% ({diabetes_label})", className="mt-2"),
-                                html.Small("Factors: Glucose, BMI", className="text-muted")
+                                html.Small("Factors: Glucose, BMI", className="text-muted"),
+                                html.P(f"Regression model estimate from latest vitals: {int(estimate['diabetes_risk'] * 100)}%",
+                                       className="small text-muted mb-0") if estimate else None
                             ])
                         ], className="shadow-sm")
                     ], width=6)
                 ], className="mb-4"),
 
+                dbc.Card([
+                    dbc.CardHeader("🚩 Active Alerts"),
+                    dbc.CardBody(
+                        html.Ul([html.Li(f"{a['message']} ({a['value']:g})") for a in timeline["alerts"]], className="mb-0")
+                        if timeline["alerts"] else html.P("✅ No active alerts.", className="mb-0")
+                    )
+                ], className="mb-4 shadow-sm"),
+
                 dbc.Card([
                     dbc.CardHeader("Risk Score History"),
                     dbc.CardBody([
@@ -1,15 +1,16 @@
 # dashboard_frontdesk.py
 
+from datetime import datetime, timezone
+
 import dash
 from dash import html, dcc, Input, Output, State
 import dash_bootstrap_components as dbc
-import pandas as pd
-import requests
-import plotly.express as px
+from data_access import ApiError, fetch, fetch_frame
+from figure_cache import cached_figure
+from live_updates import FALLBACK_INTERVAL_MS, changed_ttl, live_updates
 
 # No need to run Dash app separately here
 # This file only provides layouts + callbacks
-API = "http://localhost:8000"
 
 # ===== Sidebar =====
 sidebar = html.Div(
@@ -112,7 +113,9 @@ def get_dashboard_content():
             dbc.Col(dbc.Card([
                 dbc.CardBody([
                     html.H6("Recent Lab Reports", className="text-muted"),
-                    dcc.Interval(id="refresh-interval", interval=10*1000, n_intervals=0),
+                    # Cards refresh on backend change events; the interval is a fallback
+                    live_updates(),
+                    dcc.Interval(id="refresh-interval", interval=FALLBACK_INTERVAL_MS, n_intervals=0),
                     html.Div(id="recent-activity-wrapper")
                 ])
             ], className="shadow-sm p-3 bg-light"), width=6)
@@ -125,85 +128,129 @@ def get_placeholder_layout(title):
         html.P("This page is under development. Please check back soon.")
     ])
 
+# ===== Shared Figures =====
+# Built once per data change and shared by every open tab and worker through
+# figure_cache. Builds always read fresh data, since a new version means any
+# cached API response is stale.
+
+# /monthly_risk_trends is served from the analytics snapshot, which can trail
+# a RiskScores write by up to 30s, so the figure is also rebuilt once it is
+# older than this
+TREND_MAX_AGE = 60
+
+def build_age_group_chart():
+    import plotly.express as px
+
+    df = fetch_frame("/age_demographics", ttl=0)
+    fig = px.pie(df, names='age_group', values='count', title='Age Group Distribution', hole=0.3)
+    fig.update_traces(textinfo='percent+label', pull=[0.05]*len(df), hoverinfo='label+percent+value')
+    fig.update_layout(clickmode='event+select')
+    return fig
+
+def build_trend_chart():
+    import pandas as pd
+    import plotly.express as px
+
+    df = fetch_frame("/monthly_risk_trends", ttl=0)
+    df['month'] = pd.to_datetime(df['month']).dt.strftime('%b')
+    fig = px.bar(df, x='month', y='avg_heart_risk', title='Avg Heart Risk (Monthly)', labels={'avg_heart_risk': 'Avg Heart Risk'}, color='avg_heart_risk')
+    fig.update_traces(marker_line_width=0, hovertemplate='Month: %{x}<br>Avg Risk: %{y:.2f}')
+    fig.update_layout(clickmode='event+select')
+    return fig
+
 # ===== Frontdesk Router =====
 def register_frontdesk_callbacks(app):
-    # Routing
+    # Routing for the sub-pages without their own module; /patient_record and
+    # /reports are full pages routed by app.py
     @app.callback(Output("frontdesk-page-content", "children"), Input("frontdesk-url", "pathname"))
     def display_page_frontdesk(pathname):
         if pathname == "/frontdesk_dashboard":
             return get_dashboard_content()
-        elif pathname == "/patient_record":
-            return get_placeholder_layout("Patient Profiles")
         elif pathname == "/visits":
             return get_placeholder_layout("Visit Records")
         elif pathname == "/medications":
             return get_placeholder_layout("Medications")
-        elif pathname == "/reports":
-            return get_placeholder_layout("Reports")
         elif pathname == "/settings":
             return get_placeholder_layout("Settings")
         else:
             return get_placeholder_layout("Page Not Found")
 
     # Active Patients
-    @app.callback(Output("active-patient-count", "children"), Input("refresh-interval", "n_intervals"))
-    def update_patient_count(_):
+    @app.callback(
+        Output("active-patient-count", "children"),
+        Input("refresh-interval", "n_intervals"),
+        Input("live-changes", "data")
+    )
+    def update_patient_count(_, event):
+        ttl = changed_ttl(event, ["Patients"])
         try:
-            data = requests.get(f"{API}/active_patients").json()
+            data = fetch("/active_patients", ttl=ttl)
             return f"{len(data):,}"
-        except:
+        except ApiError:
             return "0"
 
     # Appointments
     @app.callback(
         Output("appointment-count", "children"),
         Output("appointment-remaining", "children"),
-        Input("refresh-interval", "n_intervals")
+        Input("refresh-interval", "n_intervals"),
+        Input("live-changes", "data")
     )
-    def update_appointments(_):
+    def update_appointments(_, event):
+        ttl = changed_ttl(event, ["Appointments"])
         try:
-            data = requests.get(f"{API}/appointments_today").json()
+            data = fetch("/appointments_today", ttl=ttl)
             remaining = max(0, 30 - len(data))
             return str(len(data)), f"{remaining} remaining"
-        except:
+        except ApiError:
             return "0", "--"
 
     # Age Group Chart
-    @app.callback(Output("age-group-pie", "figure"), Input("refresh-interval", "n_intervals"))
-    def update_age_group_chart(_):
+    @app.callback(
+        Output("age-group-pie", "figure"),
+        Input("refresh-interval", "n_intervals"),
+        Input("live-changes", "data")
+    )
+    def update_age_group_chart(_, event):
+        ttl = changed_ttl(event, ["Patients"])
         try:
-            data = requests.get(f"{API}/age_demographics").json()
-            df = pd.DataFrame(data)
-            fig = px.pie(df, names='age_group', values='count', title='Age Group Distribution', hole=0.3)
-            fig.update_traces(textinfo='percent+label', pull=[0.05]*len(df), hoverinfo='label+percent+value')
-            fig.update_layout(clickmode='event+select')
-            return fig
-        except:
+            version = fetch("/table_versions", {"tables": "Patients"}, ttl=ttl)
+            # Ages move on at UTC midnight without any write
+            return cached_figure("age_group_pie", version, build_age_group_chart,
+                                 day=datetime.now(timezone.utc).date().isoformat())
+        except (ApiError, KeyError, ValueError):
+            import plotly.express as px
             return px.pie(title="No data available")
 
     # Health Trend
-    @app.callback(Output("health-trend-chart", "figure"), Input("refresh-interval", "n_intervals"))
-    def update_trend_chart(_):
+    @app.callback(
+        Output("health-trend-chart", "figure"),
+        Input("refresh-interval", "n_intervals"),
+        Input("live-changes", "data")
+    )
+    def update_trend_chart(_, event):
+        ttl = changed_ttl(event, ["RiskScores"])
         try:
-            data = requests.get(f"{API}/monthly_risk_trends").json()
-            df = pd.DataFrame(data)
-            df['month'] = pd.to_datetime(df['month']).dt.strftime('%b')
-            fig = px.bar(df, x='month', y='avg_heart_risk', title='Avg Heart Risk (Monthly)', labels={'avg_heart_risk': 'Avg Heart Risk'}, color='avg_heart_risk')
-            fig.update_traces(marker_line_width=0, hovertemplate='Month: %{x}<br>Avg Risk: %{y:.2f}')
-            fig.update_layout(clickmode='event+select')
-            return fig
-        except:
+            version = fetch("/table_versions", {"tables": "RiskScores"}, ttl=ttl)
+            return cached_figure("monthly_heart_risk", version, build_trend_chart, max_age=TREND_MAX_AGE)
+        except (ApiError, KeyError, ValueError):
+            import plotly.express as px
             return px.bar(title="No data available")
 
     # Recent Activity
-    @app.callback(Output("recent-activity-wrapper", "children"), Input("refresh-interval", "n_intervals"))
-    def update_activity_list(_):
+    @app.callback(
+        Output("recent-activity-wrapper", "children"),
+        Input("refresh-interval", "n_intervals"),
+        Input("live-changes", "data")
+    )
+    def update_activity_list(_, event):
+        ttl = changed_ttl(event, ["LabReports"])
         try:
-            data = requests.get(f"{API}/recent_lab_reports").json()
+            data = fetch("/recent_lab_reports", ttl=ttl)
             items = [html.Li([
                 html.Strong(f"{r['first_name']} {r['last_name']}"),
                 f" - {r['report_type']} on {r['report_date']}"
             ]) for r in data[:5]]
             return html.Ul(items, className="list-unstyled")
-        except:
+        except (ApiError, KeyError):
             return html.Div("No recent activity available")
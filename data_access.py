@@ -0,0 +1,130 @@
+# data_access.py
+# Data-access layer used by the dashboards instead of hard-coded API URLs.
+#
+# HEALTHCARE_DATA_MODE selects how reads are served:
+#   http   - JSON over HTTP to the FastAPI backend (default)
+#   local  - call backend's GET handlers in-process when the dashboards and the
+#            backend are co-hosted; no JSON encode, HTTP round-trip or decode.
+
+import inspect
+import os
+import typing
+from urllib.parse import urlencode
+
+from api_client import API_URL, DEFAULT_TTL, ApiError, get_json
+
+DATA_MODE = os.environ.get("HEALTHCARE_DATA_MODE", "http").lower()
+
+
+# ===== Data Sources =====
+class HttpDataSource:
+    mode = "http"
+
+    def records(self, path, params=None, ttl=DEFAULT_TTL):
+        return get_json(path, params=params, ttl=ttl)
+
+
+class LocalDataSource:
+    mode = "local"
+
+    def __init__(self):
+        # Imported lazily so HTTP-mode dashboards never load the backend
+        from fastapi import HTTPException
+        from fastapi.routing import APIRoute
+        from starlette.routing import Match
+        import backend
+
+        backend.init_db()
+        self._http_exception = HTTPException
+        self._match_full = Match.FULL
+        self._routes = [
+            r for r in backend.app.routes
+            if isinstance(r, APIRoute) and "GET" in r.methods
+        ]
+
+    def _resolve(self, path):
+        scope = {"type": "http", "path": path, "method": "GET", "root_path": ""}
+        for route in self._routes:
+            match, child_scope = route.matches(scope)
+            if match == self._match_full:
+                return route.endpoint, child_scope.get("path_params", {})
+        raise ApiError(f"No GET handler for {path}")
+
+    @staticmethod
+    def _coerce(endpoint, kwargs):
+        # Mirror FastAPI's conversion of path/query strings to annotated types
+        signature = inspect.signature(endpoint)
+        converted = {}
+        for name, value in kwargs.items():
+            param = signature.parameters.get(name)
+            if param is None:
+                continue
+            annotation = param.annotation
+            # Optional[int] -> int
+            args = [a for a in typing.get_args(annotation) if a is not type(None)]
+            if len(args) == 1:
+                annotation = args[0]
+            if isinstance(value, str) and annotation in (int, float, bool):
+                value = value.lower() in ("1", "true", "yes") if annotation is bool else annotation(value)
+            converted[name] = value
+        return converted
+
+    def records(self, path, params=None, ttl=None):
+        endpoint, path_params = self._resolve(path)
+        if inspect.iscoroutinefunction(endpoint):
+            raise ApiError(f"{path} is not a synchronous read handler")
+        kwargs = self._coerce(endpoint, {**(params or {}), **path_params})
+        try:
+            return endpoint(**kwargs)
+        except self._http_exception as e:
+            raise ApiError(f"GET {path} failed: {e.detail}") from e
+        except ValueError as e:
+            raise ApiError(f"GET {path} failed: {e}") from e
+
+
+# ===== Module Interface =====
+_source = None
+
+
+def get_source():
+    global _source
+    if _source is None:
+        _source = LocalDataSource() if DATA_MODE == "local" else HttpDataSource()
+    return _source
+
+
+def fetch(path, params=None, ttl=DEFAULT_TTL):
+    """Return the rows (list of dicts) or object served at ``path``."""
+    return get_source().records(path, params=params, ttl=ttl)
+
+
+def fetch_frame(path, params=None, ttl=DEFAULT_TTL):
+    """Return the rows served at ``path`` as a pandas DataFrame."""
+    import pandas as pd
+
+    return pd.DataFrame(fetch(path, params=params, ttl=ttl))
+
+
+def export_url(table, fmt="csv", **filters):
+    """Browser link to the backend's streamed /export/cohort download.
+
+    Exports never pass through the Dash server (or the local data source);
+    the browser downloads them from the backend directly. None-valued filters
+    are left out.
+    """
+    params = {"table": table, "format": fmt, **{k: v for k, v in filters.items() if v is not None}}
+    return f"{API_URL}/export/cohort?{urlencode(params)}"
+
+
+def search_patient_options(search_value, selected=None, current_options=None, **filters):
+    """Dropdown options for a server-side patient type-ahead.
+
+    Keeps the currently selected patient in the list so its label survives
+    a new search.
+    """
+    params = {"q": search_value or "", "limit": 20, **filters}
+    patients = fetch("/patients/search", params)
+    options = [{"label": f"{p['first_name']} {p['last_name']}", "value": p["patient_id"]} for p in patients]
+    if selected is not None and all(o["value"] != selected for o in options):
+        options = [o for o in current_options or [] if o["value"] == selected] + options
+    return options
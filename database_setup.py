@@ -1,7 +1,48 @@
 # database_setup.py
 
+import math
 import sqlite3
 
+# Tables whose writes are recorded in ChangeLog, with their primary keys
+CHANGE_TRACKED_TABLES = {
+    "Patients": "patient_id",
+    "Appointments": "appointment_id",
+    "LabReports": "report_id",
+    "Vitals": "vital_id",
+    "RiskScores": "risk_id",
+}
+CHANGELOG_RETENTION_DAYS = 7
+CHANGELOG_MAX_ROWS = 500_000
+
+# Stored columns of each table, in schema order. Queries that return whole
+# rows list these instead of SELECT *, which would also return the generated
+# day columns below.
+TABLE_COLUMNS = {
+    "Patients": ("patient_id", "first_name", "last_name", "gender", "date_of_birth", "check_in_status"),
+    "Appointments": ("appointment_id", "patient_id", "appointment_date", "doctor_name", "status"),
+    "LabReports": ("report_id", "patient_id", "report_type", "report_date", "result"),
+    "Vitals": ("vital_id", "patient_id", "record_date", "blood_pressure", "heart_rate", "glucose_level",
+               "bmi", "hemoglobin", "cholesterol"),
+    "RiskScores": ("risk_id", "patient_id", "score_date", "heart_disease_risk", "diabetes_risk"),
+}
+
+# Integer day-number columns (days since 1970-01-01) derived from date text,
+# as table -> (day column, source column)
+DAY_COLUMNS = {
+    "Appointments": ("appointment_day", "appointment_date"),
+    "LabReports": ("report_day", "report_date"),
+    "Vitals": ("record_day", "record_date"),
+    "RiskScores": ("score_day", "score_date"),
+}
+
+# Age bands shown by /age_demographics as (label, min age, max age); anyone
+# outside them (incl. unknown birth dates) counts as OVERFLOW_AGE_BAND
+AGE_BANDS = [("0-18", 0, 18), ("19-35", 19, 35), ("36-55", 36, 55)]
+OVERFLOW_AGE_BAND = "55+"
+# Roll forward incrementally for gaps up to this many days, else recount
+MAX_AGE_ROLL_DAYS = 366
+DAYS_PER_YEAR = 365.25
+
 def create_tables():
     conn = sqlite3.connect('healthcare.db')
     cursor = conn.cursor()
@@ -82,9 +123,351 @@ def create_tables():
         )
     ''')
 
+    create_indexes(cursor)
+    create_search_index(cursor)
+    create_change_log(cursor)
+    create_age_bands(cursor)
+    create_day_columns(cursor)
+    create_rollups(cursor)
+    create_alerts(cursor)
+
     conn.commit()
     conn.close()
     print("✅ All tables created successfully.")
 
+def create_indexes(cursor):
+    # Per-patient history lookups (trend graphs, timelines, exports, visit joins)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_riskscores_patient_date ON RiskScores(patient_id, score_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vitals_patient_date ON Vitals(patient_id, record_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_labreports_patient_date ON LabReports(patient_id, report_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_appointments_patient_date ON Appointments(patient_id, appointment_date)')
+
+def create_search_index(cursor):
+    # FTS5 name index over Patients (external content, kept in sync by
+    # triggers) for type-ahead search. Skipped if SQLite lacks FTS5; the
+    # search endpoint then falls back to LIKE prefix matching.
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'PatientSearch'"
+    ).fetchone()
+    if exists:
+        return
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE PatientSearch USING fts5(
+                first_name, last_name,
+                content='Patients', content_rowid='patient_id',
+                prefix='1 2 3'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS patients_search_insert AFTER INSERT ON Patients BEGIN
+            INSERT INTO PatientSearch(rowid, first_name, last_name)
+            VALUES (new.patient_id, new.first_name, new.last_name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS patients_search_delete AFTER DELETE ON Patients BEGIN
+            INSERT INTO PatientSearch(PatientSearch, rowid, first_name, last_name)
+            VALUES ('delete', old.patient_id, old.first_name, old.last_name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS patients_search_update AFTER UPDATE OF first_name, last_name ON Patients BEGIN
+            INSERT INTO PatientSearch(PatientSearch, rowid, first_name, last_name)
+            VALUES ('delete', old.patient_id, old.first_name, old.last_name);
+            INSERT INTO PatientSearch(rowid, first_name, last_name)
+            VALUES (new.patient_id, new.first_name, new.last_name);
+        END
+    ''')
+    # Index any patients that existed before the search table
+    cursor.execute("INSERT INTO PatientSearch(PatientSearch) VALUES ('rebuild')")
+
+def create_change_log(cursor):
+    # Append-only change-data-capture log filled by triggers. Entries carry
+    # keys only; consumers re-read the current row, so I/U act as upserts.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ChangeLog (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            patient_id INTEGER,
+            op TEXT NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_changelog_row ON ChangeLog(table_name, row_id, seq)')
+    # Newest entry per table, for /table_versions
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_changelog_table_seq ON ChangeLog(table_name, seq)')
+    # Highest seq removed by retention; cursors below it must resync.
+    # archiving is set by retention.py inside its delete transaction, so rows
+    # moved to the archive are not logged as deletions; archive_generation
+    # counts those deletes instead, for copies (the analytics snapshot) that
+    # must drop archived rows too.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ChangeLogState (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            compacted_through INTEGER NOT NULL,
+            archiving INTEGER NOT NULL DEFAULT 0,
+            archive_generation INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO ChangeLogState (id, compacted_through) VALUES (1, 0)')
+    state_columns = [row[1] for row in cursor.execute("PRAGMA table_info(ChangeLogState)")]
+    for column in ("archiving", "archive_generation"):
+        if column not in state_columns:
+            cursor.execute(f'ALTER TABLE ChangeLogState ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+
+    for table, pk in CHANGE_TRACKED_TABLES.items():
+        for event, op, ref in (("INSERT", "I", "new"), ("UPDATE", "U", "new"), ("DELETE", "D", "old")):
+            name = f"{table.lower()}_changelog_{event.lower()}"
+            when = ""
+            if event == "DELETE":
+                when = "WHEN NOT (SELECT archiving FROM ChangeLogState WHERE id = 1)"
+                # Older databases have the delete triggers without the WHEN
+                sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                                     (name,)).fetchone()
+                if sql and "archiving" not in sql[0]:
+                    cursor.execute(f'DROP TRIGGER {name}')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {name}
+                AFTER {event} ON {table} {when} BEGIN
+                    INSERT INTO ChangeLog (table_name, row_id, patient_id, op)
+                    VALUES ('{table}', {ref}.{pk}, {ref}.patient_id, '{op}');
+                END
+            ''')
+
+def compact_change_log(db_path='healthcare.db', retention_days=CHANGELOG_RETENTION_DAYS,
+                       max_rows=CHANGELOG_MAX_ROWS):
+    """Bound the change log: coalesce per-row history, then drop old entries."""
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            # Only the newest entry per row matters to a consumer behind it
+            conn.execute('''
+                DELETE FROM ChangeLog WHERE EXISTS (
+                    SELECT 1 FROM ChangeLog newer
+                    WHERE newer.table_name = ChangeLog.table_name
+                      AND newer.row_id = ChangeLog.row_id
+                      AND newer.seq > ChangeLog.seq
+                )
+            ''')
+            by_age = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM ChangeLog WHERE changed_at < strftime('%Y-%m-%dT%H:%M:%f', 'now', ?)",
+                (f"-{retention_days} days",)).fetchone()[0]
+            by_size = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM (SELECT seq FROM ChangeLog ORDER BY seq DESC LIMIT -1 OFFSET ?)",
+                (max_rows,)).fetchone()[0]
+            cutoff = max(by_age, by_size)
+            if cutoff:
+                conn.execute("DELETE FROM ChangeLog WHERE seq <= ?", (cutoff,))
+                conn.execute("UPDATE ChangeLogState SET compacted_through = MAX(compacted_through, ?)", (cutoff,))
+    finally:
+        conn.close()
+
+def column_list(table, alias=None):
+    # "a.col1, a.col2, ..." over TABLE_COLUMNS, for SELECT lists
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + col for col in TABLE_COLUMNS[table])
+
+def day_number_sql(expr):
+    # Days since 1970-01-01 for an ISO date/datetime expression (or 'now')
+    return f"CAST(julianday({expr}) - 2440587.5 AS INTEGER)"
+
+def add_day_column(cursor, table, day_column, source_column):
+    # Virtual generated column: computed by SQLite on every write path, and
+    # backfilled for existing rows when an index over it is built
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_xinfo({table})")]
+    if day_column not in columns:
+        cursor.execute(f'''
+            ALTER TABLE {table} ADD COLUMN {day_column} INTEGER
+            GENERATED ALWAYS AS ({day_number_sql(source_column)}) VIRTUAL
+        ''')
+
+def create_day_columns(cursor):
+    for table, (day_column, source_column) in DAY_COLUMNS.items():
+        add_day_column(cursor, table, day_column, source_column)
+    # Date-window endpoints (today's appointments, last week's lab reports)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_appointments_day ON Appointments(appointment_day)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_labreports_day ON LabReports(report_day, report_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vitals_day ON Vitals(record_day)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_riskscores_day ON RiskScores(score_day)')
+
+def create_rollups(cursor):
+    # Monthly risk sums/counts of rows moved out by retention.py, so trend
+    # endpoints can merge them with the live table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS MonthlyRiskRollup (
+            month TEXT PRIMARY KEY,
+            heart_sum REAL NOT NULL DEFAULT 0,
+            heart_n INTEGER NOT NULL DEFAULT 0,
+            diabetes_sum REAL NOT NULL DEFAULT 0,
+            diabetes_n INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # The same per patient, for /patient_risk_trend and the timeline trend
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PatientMonthlyRiskRollup (
+            patient_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            heart_sum REAL NOT NULL DEFAULT 0,
+            heart_n INTEGER NOT NULL DEFAULT 0,
+            diabetes_sum REAL NOT NULL DEFAULT 0,
+            diabetes_n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (patient_id, month)
+        )
+    ''')
+
+def create_alerts(cursor):
+    # Threshold alerts precomputed by clinical_alerts.refresh(), one per
+    # (source row, rule). active marks alerts on the patient's latest row of
+    # the source table: their current flags.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Alerts (
+            alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL,
+            rule TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            message TEXT NOT NULL,
+            source_table TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            value REAL,
+            observed_at TEXT,
+            active INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_source ON Alerts(source_table, source_id, rule)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_patient ON Alerts(patient_id, active)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_active ON Alerts(active, observed_at)')
+    # ChangeLog seq the alerts are current to, and the rule set they were built with
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS AlertState (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL,
+            rules TEXT NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO AlertState (id, seq, rules) VALUES (1, 0, '')")
+
+def create_age_bands(cursor):
+    # Birth date as an indexable day number
+    add_day_column(cursor, "Patients", "dob_day", "date_of_birth")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_patients_dob_day ON Patients(dob_day)')
+
+    # Patient count per age band as of as_of_day. Each band also stores the
+    # dob_day range that falls in it on that day, so triggers can file a
+    # patient without computing an age.
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'AgeBandCounts'"
+    ).fetchone()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS AgeBandCounts (
+            age_group TEXT PRIMARY KEY,
+            min_dob_day INTEGER,
+            max_dob_day INTEGER,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS AgeBandState (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            as_of_day INTEGER NOT NULL
+        )
+    ''')
+
+    band_of = '''COALESCE((SELECT age_group FROM AgeBandCounts
+                           WHERE {ref}.dob_day BETWEEN min_dob_day AND max_dob_day), '{overflow}')'''
+    new_band = band_of.format(ref="new", overflow=OVERFLOW_AGE_BAND)
+    old_band = band_of.format(ref="old", overflow=OVERFLOW_AGE_BAND)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS patients_age_band_insert AFTER INSERT ON Patients BEGIN
+            UPDATE AgeBandCounts SET count = count + 1 WHERE age_group = {new_band};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS patients_age_band_delete AFTER DELETE ON Patients BEGIN
+            UPDATE AgeBandCounts SET count = count - 1 WHERE age_group = {old_band};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS patients_age_band_update AFTER UPDATE OF date_of_birth ON Patients BEGIN
+            UPDATE AgeBandCounts SET count = count - 1 WHERE age_group = {old_band};
+            UPDATE AgeBandCounts SET count = count + 1 WHERE age_group = {new_band};
+        END
+    ''')
+
+    if not exists:
+        roll_age_bands(cursor, full=True)
+
+def age_band_ranges(as_of_day):
+    # dob_day range of each band on as_of_day, matching
+    # CAST((as_of - dob) / 365.25 AS INT) BETWEEN lo AND hi
+    return {
+        label: (math.floor(as_of_day - (hi + 1) * DAYS_PER_YEAR) + 1, math.floor(as_of_day - lo * DAYS_PER_YEAR))
+        for label, lo, hi in AGE_BANDS
+    }
+
+def roll_age_bands(cursor, full=False):
+    """Move AgeBandCounts forward to today (UTC), returning True if it changed.
+
+    Only patients whose dob_day lies between a band's old and new boundaries
+    change band, so the update is a handful of narrow index range counts.
+    Run it inside a write transaction.
+    """
+    today = cursor.execute("SELECT " + day_number_sql("'now'")).fetchone()[0]
+    state = cursor.execute("SELECT as_of_day FROM AgeBandState").fetchone()
+    if state and state[0] == today and not full:
+        return False
+
+    def count(lo, hi):
+        if lo > hi:
+            return 0
+        return cursor.execute("SELECT COUNT(*) FROM Patients WHERE dob_day BETWEEN ? AND ?", (lo, hi)).fetchone()[0]
+
+    new_ranges = age_band_ranges(today)
+    if full or not state or not 0 <= today - state[0] <= MAX_AGE_ROLL_DAYS:
+        total = cursor.execute("SELECT COUNT(*) FROM Patients").fetchone()[0]
+        counts = {label: count(*new_ranges[label]) for label in new_ranges}
+        counts[OVERFLOW_AGE_BAND] = total - sum(counts.values())
+    else:
+        old_ranges = age_band_ranges(state[0])
+        current = dict(cursor.execute("SELECT age_group, count FROM AgeBandCounts").fetchall())
+        counts = {}
+        for label, (new_lo, new_hi) in new_ranges.items():
+            old_lo, old_hi = old_ranges[label]
+            # Newly old enough for this band, minus those who aged out of it
+            counts[label] = current.get(label, 0) + count(old_hi + 1, new_hi) - count(old_lo, new_lo - 1)
+        counts[OVERFLOW_AGE_BAND] = current.get(OVERFLOW_AGE_BAND, 0) - sum(
+            counts[label] - current.get(label, 0) for label in new_ranges
+        )
+
+    cursor.execute("DELETE FROM AgeBandCounts")
+    cursor.executemany(
+        "INSERT INTO AgeBandCounts (age_group, min_dob_day, max_dob_day, count) VALUES (?, ?, ?, ?)",
+        [(label, *new_ranges[label], counts[label]) for label in new_ranges]
+        + [(OVERFLOW_AGE_BAND, None, None, counts[OVERFLOW_AGE_BAND])],
+    )
+    cursor.execute("INSERT OR REPLACE INTO AgeBandState (id, as_of_day) VALUES (1, ?)", (today,))
+    return True
+
+def migrate(db_path='healthcare.db'):
+    # Idempotent upgrades for databases created by an older create_tables()
+    conn = sqlite3.connect(db_path)
+    # Readers no longer block the writer (and vice versa); checkpointed by retention.py
+    conn.execute("PRAGMA journal_mode=WAL")
+    cursor = conn.cursor()
+    create_indexes(cursor)
+    create_search_index(cursor)
+    create_change_log(cursor)
+    create_age_bands(cursor)
+    create_day_columns(cursor)
+    create_rollups(cursor)
+    create_alerts(cursor)
+    conn.commit()
+    conn.close()
+
 if __name__ == "__main__":
     create_tables()
@@ -0,0 +1,103 @@
+# downsample.py
+# Reduce long time series to what a chart can actually show.
+#
+# Rows are split into equal-width time buckets, one per pixel column of the
+# plot (or as many as a point budget allows). Each bucket keeps the rows
+# holding the minimum and maximum of every series (min/max, "M4"-style
+# bucketing), so peaks survive at any resolution. Rows where a series crosses
+# a risk threshold are kept too, so a line never appears to cross 0.4 or 0.7
+# later or earlier than it did. The first and last rows are always kept.
+#
+# Used by the backend's /patient_history (width=, max_points=) and usable on
+# any list of row dicts ordered by time. numpy is imported on first use so
+# the dashboards can read PLOT_WIDTH without loading it.
+
+from datetime import datetime, timezone
+
+RISK_SERIES = ("heart_disease_risk", "diabetes_risk")
+# Same bands as the dashboards: > 0.4 moderate, > 0.7 high
+RISK_THRESHOLDS = (0.4, 0.7)
+# Pixel width dashboards request for a full-width trend graph
+PLOT_WIDTH = 1200
+
+
+def bucket_count(n_series, width=None, max_points=None):
+    """Buckets for a plot ``width`` pixels wide and/or a ``max_points`` budget.
+
+    One bucket per pixel column; a budget allows two rows (min and max) per
+    series per bucket. Returns None when neither limit is given.
+    """
+    limits = []
+    if width:
+        limits.append(width)
+    if max_points:
+        limits.append(max_points // (2 * n_series))
+    return max(min(limits), 1) if limits else None
+
+
+def timestamp(value):
+    """Seconds since the epoch for an ISO date string; numbers pass through.
+
+    Naive dates are read as UTC, like SQLite's julianday() and unixepoch().
+    """
+    if isinstance(value, (int, float)):
+        return value
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def downsample_indices(times, values, buckets, thresholds=RISK_THRESHOLDS, start=None, end=None):
+    """Sorted indices of the points to keep.
+
+    ``times`` is ascending, ``values`` is one sequence per series (None or NaN
+    for missing values). ``start``/``end`` fix the time window the buckets
+    divide; by default it spans ``times``.
+    """
+    import numpy as np
+
+    times = np.asarray(times, dtype=float)
+    n = len(times)
+    if not buckets or n <= 2 * len(values) * buckets:
+        return np.arange(n)
+
+    t0 = times[0] if start is None else start
+    t1 = times[-1] if end is None else end
+    bucket = ((times - t0) / ((t1 - t0) or 1.0) * buckets).astype(np.int64).clip(0, buckets - 1)
+
+    keep = [np.array([0, n - 1])]
+    for series in values:
+        series = np.asarray(series, dtype=float)
+        idx = np.flatnonzero(~np.isnan(series))
+        if not len(idx):
+            continue
+        # Sorted by (bucket, value), each bucket's run starts at its minimum
+        # and ends at its maximum
+        order = idx[np.lexsort((series[idx], bucket[idx]))]
+        edges = np.flatnonzero(np.diff(bucket[order])) + 1
+        keep += [order[np.r_[0, edges]], order[np.r_[edges - 1, len(order) - 1]]]
+        for level in thresholds:
+            above = series[idx] > level
+            crossed = np.flatnonzero(above[1:] != above[:-1])
+            # Keep both sides of each crossing
+            keep += [idx[crossed], idx[crossed + 1]]
+    return np.unique(np.concatenate(keep))
+
+
+def downsample(rows, buckets, x="score_date", series=RISK_SERIES, thresholds=RISK_THRESHOLDS,
+               start=None, end=None):
+    """Return the rows to plot out of ``rows`` (ordered by ``x``), in order.
+
+    The result has at most ``2 * len(series)`` rows per bucket, plus
+    threshold crossings and the first and last row.
+    """
+    if not buckets or len(rows) <= 2 * len(series) * buckets:
+        return rows
+    keep = downsample_indices(
+        [timestamp(row[x]) for row in rows],
+        [[row[name] for row in rows] for name in series],
+        buckets, thresholds,
+        timestamp(start) if start else None, timestamp(end) if end else None,
+    )
+    return [rows[i] for i in keep]
@@ -0,0 +1,79 @@
+# figure_cache.py
+# Plotly figures shared by every session and Dash worker, keyed by data version.
+#
+# Front desk charts look the same for all staff, so each one is built once per
+# change to the tables it shows and stored as figure JSON in a small SQLite
+# file. Every tab and worker reads it from there. On a miss the build runs
+# under SQLite's write lock, so concurrent misses wait for the first build
+# instead of repeating it. A newer version overwrites the entry in place.
+
+import json
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = "figure_cache.db"
+# How long a worker waits for another worker's build before giving up
+BUILD_TIMEOUT = 30
+
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUILD_TIMEOUT, isolation_level=None)
+    with _init_lock:
+        if path not in _initialized:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS FigureCache (
+                    name TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    figure TEXT NOT NULL,
+                    built_at REAL NOT NULL,
+                    PRIMARY KEY (name, params)
+                )
+            """)
+            _initialized.add(path)
+    return conn
+
+
+def _lookup(conn, name, params, version, max_age):
+    row = conn.execute("SELECT figure, built_at FROM FigureCache WHERE name = ? AND params = ? AND version = ?",
+                       (name, params, version)).fetchone()
+    if row is None or (max_age is not None and time.time() - row[1] > max_age):
+        return None
+    return row[0]
+
+
+def cached_figure(name, version, build, max_age=None, path=CACHE_PATH, **params):
+    """Return the figure ``name`` for ``params`` at ``version`` as a dict.
+
+    ``version`` is any JSON-serializable value that changes whenever the
+    figure's data does (e.g. /table_versions for the tables it shows).
+    ``build()`` returns a plotly figure and only runs on a miss. ``max_age``
+    (seconds) also rebuilds entries older than that, for data that can lag
+    its version.
+    """
+    params = json.dumps(params, sort_keys=True)
+    version = json.dumps(version, sort_keys=True)
+    conn = _connect(path)
+    try:
+        figure = _lookup(conn, name, params, version, max_age)
+        if figure is None:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another worker may have built it while we waited for the lock
+                figure = _lookup(conn, name, params, version, max_age)
+                if figure is None:
+                    figure = build().to_json()
+                    conn.execute("INSERT OR REPLACE INTO FigureCache (name, params, version, figure, built_at) "
+                                 "VALUES (?, ?, ?, ?, ?)", (name, params, version, figure, time.time()))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return json.loads(figure)
+    finally:
+        conn.close()
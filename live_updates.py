@@ -0,0 +1,43 @@
+# live_updates.py
+# Dash side of the backend's /events change feed.
+#
+# assets/live_updates.js opens one EventSource per live_updates() block and
+# writes every change event into its dcc.Store. Callbacks take the store as an
+# Input and call changed_ttl() to skip events for tables they do not show.
+# A slow dcc.Interval stays in each layout as a fallback for when the feed is
+# unreachable (e.g. local data mode without a running backend).
+
+from dash import ctx, dcc, html
+from dash.exceptions import PreventUpdate
+
+from api_client import API_URL, DEFAULT_TTL
+
+EVENTS_URL = f"{API_URL}/events"
+FALLBACK_INTERVAL_MS = 5 * 60 * 1000
+
+
+def live_updates(store_id="live-changes"):
+    return html.Div([
+        dcc.Store(id=store_id),
+        html.Div(className="live-feed", style={"display": "none"},
+                 **{"data-url": EVENTS_URL, "data-store": store_id}),
+    ])
+
+
+def changed_ttl(event, tables, patient_id=None, store_id="live-changes"):
+    """Return the cache ttl for a refresh, or raise PreventUpdate.
+
+    Refreshes pushed by the feed bypass the client cache so they never serve
+    the data they were meant to replace; events touching none of ``tables``
+    (or another patient's rows) are ignored. "*" means the feed lost track of
+    what changed and everything should refresh.
+    """
+    if ctx.triggered_id != store_id:
+        return DEFAULT_TTL
+    changed = set(event.get("tables", [])) if event else set()
+    if "*" not in changed and not set(tables) & changed:
+        raise PreventUpdate
+    patient_ids = event.get("patient_ids")
+    if patient_id is not None and patient_ids is not None and int(patient_id) not in patient_ids:
+        raise PreventUpdate
+    return 0
@@ -1,29 +1,20 @@
 # nurse_portal.py (Nurse Specific Portal with Patient Dropdown for Vitals & Lab Reports)
+# Hosted by app.py at /nurse_dashboard. Ids carry a "nurse-" prefix so they
+# don't collide with the other pages' components.
 
 import dash
-from dash import html, dcc, Input, Output, State, ctx
+from dash import html, dcc, Input, Output, State
 import dash_bootstrap_components as dbc
-import plotly.express as px
-import pandas as pd
-import requests
-
-# Initialize Dash App
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX], suppress_callback_exceptions=True)
-server = app.server
-API = "http://localhost:8000"
+from data_access import ApiError, fetch, search_patient_options
+from downsample import PLOT_WIDTH
 
 # ===== Page Functions =====
 
-def get_patient_options():
-    try:
-        patients = requests.get(f"{API}/active_patients").json()
-        return [{'label': f"{p['first_name']} {p['last_name']}", 'value': p['patient_id']} for p in patients]
-    except:
-        return []
-
 def get_active_patients():
+    import pandas as pd
+
     try:
-        patients = requests.get(f"{API}/active_patients").json()
+        patients = fetch("/active_patients")
         if not patients:
             return html.Div("No active patients available.")
         df = pd.DataFrame(patients)
@@ -34,44 +25,73 @@ def get_active_patients():
                 table
             ])
         ], className="shadow p-4 mb-4 bg-light rounded")
-    except:
+    except (ApiError, KeyError):
         return html.Div("Error loading patients.")
 
 def get_lab_reports(patient_id=None):
+    import pandas as pd
+    import plotly.express as px
+
     try:
-        labs = requests.get(f"{API}/recent_lab_reports").json()
-        if not labs or not patient_id:
+        if not patient_id:
             return html.Div("No lab reports found.")
+        labs = fetch(f"/patient_timeline/{patient_id}", {"fields": "labs"})["labs"]
         df = pd.DataFrame(labs)
-        df = df[df['patient_id'] == patient_id]
         if df.empty:
             return html.Div("No lab reports found.")
         fig = px.scatter(df, x="report_date", y="report_type", color="result",
                          title="Lab Reports", height=400)
         fig.update_traces(marker=dict(size=14, line=dict(width=1, color="DarkSlateGrey")))
         return dcc.Graph(figure=fig)
-    except:
+    except (ApiError, KeyError, ValueError):
         return html.Div("Error loading lab reports.")
 
 def get_risk_scores(patient_id=None):
+    import pandas as pd
+    import plotly.express as px
+
     try:
-        scores = requests.get(f"{API}/risk_scores").json()
-        if not scores or not patient_id:
+        if not patient_id:
             return html.Div("No risk scores found.")
-        df = pd.DataFrame(scores)
-        df = df[df['patient_id'] == patient_id]
+        # Downsampled by the backend to one min/max pair per plot column
+        df = pd.DataFrame(fetch(f"/patient_history/{patient_id}", {"width": PLOT_WIDTH}))
         if df.empty:
             return html.Div("No risk scores found.")
         df['score_date'] = pd.to_datetime(df['score_date'])
         fig = px.line(df, x="score_date", y=["heart_disease_risk", "diabetes_risk"],
                       title="Risk Score Trends", markers=True)
         return dcc.Graph(figure=fig)
-    except:
+    except (ApiError, KeyError, ValueError):
         return html.Div("Error loading risk scores.")
 
+VITAL_LABELS = {"systolic": "Systolic BP", "diastolic": "Diastolic BP", "heart_rate": "Heart Rate",
+                "glucose_level": "Glucose", "bmi": "BMI", "hemoglobin": "Hemoglobin", "cholesterol": "Cholesterol"}
+
+def get_vitals_summary(patient_id=None):
+    # Rolling statistics kept by the backend as readings arrive; no history scan
+    try:
+        if not patient_id:
+            return html.Div("No vitals found.")
+        state = fetch(f"/vitals/rolling/{patient_id}")
+    except ApiError:
+        return html.Div("No vitals recorded for this patient.")
+    rows = []
+    for name, label in VITAL_LABELS.items():
+        stats = state["vitals"][name]
+        cells = ["—" if stats[k] is None else f"{stats[k]:g}" for k in ("latest", "ewma", "min", "max")]
+        rows.append(html.Tr([html.Td(label)] + [html.Td(c) for c in cells] + [html.Td(stats["count"])]))
+    return dbc.Card([
+        dbc.CardBody([
+            html.H5("Vitals", className="fw-bold text-primary mb-3"),
+            dbc.Table([html.Thead(html.Tr([html.Th(h) for h in ("Vital", "Latest", "Trend (EWMA)", "Min", "Max", "Readings")])),
+                       html.Tbody(rows)], striped=True, bordered=True, hover=True, size="sm"),
+            html.Small(f"Last recorded {state['last_record_date'] or 'N/A'}", className="text-muted")
+        ])
+    ], className="shadow-sm mb-4")
+
 def get_appointments():
     try:
-        appointments = requests.get(f"{API}/appointments_today").json()
+        appointments = fetch("/appointments_today")
         if not appointments:
             return html.Div("No appointments today.")
         items = [html.Li(f"\U0001F4C5 {appt['appointment_date']} for {appt.get('first_name', '')} {appt.get('last_name', '')}") for appt in appointments]
@@ -81,7 +101,7 @@ def get_appointments():
                 html.Ul(items, style={"fontSize": "18px"})
             ])
         ], className="shadow p-4 mb-4 bg-light rounded")
-    except:
+    except ApiError:
         return html.Div("Error loading appointments.")
 
 def get_settings():
@@ -93,56 +113,71 @@ def get_settings():
     ], className="shadow p-4 mb-4 bg-light rounded")
 
 # ===== Layout =====
-app.layout = dbc.Container([
-    html.H2("\U0001F691 Nurse Dashboard", className="text-center text-primary my-4 fw-bold"),
-    dbc.Tabs([
-        dbc.Tab(label="\U0001F3E5 Active Patients", tab_id="patients"),
-        dbc.Tab(label="\U0001F9EA Lab Reports", tab_id="labs"),
-        dbc.Tab(label="\U0001F489 Vitals & Risk Scores", tab_id="vitals"),
-        dbc.Tab(label="\U0001F527 Manage Appointments", tab_id="appointments"),
-        dbc.Tab(label="⚙️ Settings", tab_id="settings")
-    ], id="tabs", active_tab="patients", className="mb-4"),
-    html.Div(id="dynamic-content")
-], fluid=True, style={"padding": "20px"})
+def get_nurse_portal_layout():
+    return dbc.Container([
+        html.H2("\U0001F691 Nurse Dashboard", className="text-center text-primary my-4 fw-bold"),
+        dbc.Tabs([
+            dbc.Tab(label="\U0001F3E5 Active Patients", tab_id="patients"),
+            dbc.Tab(label="\U0001F9EA Lab Reports", tab_id="labs"),
+            dbc.Tab(label="\U0001F489 Vitals & Risk Scores", tab_id="vitals"),
+            dbc.Tab(label="\U0001F527 Manage Appointments", tab_id="appointments"),
+            dbc.Tab(label="⚙️ Settings", tab_id="settings")
+        ], id="nurse-tabs", active_tab="patients", className="mb-4"),
+        html.Div(id="nurse-content")
+    ], fluid=True, style={"padding": "20px"})
 
 # ===== Callbacks =====
-@app.callback(
-    Output("dynamic-content", "children"),
-    Input("tabs", "active_tab"),
-    State("dynamic-content", "children"),
-    prevent_initial_call=False
-)
-def update_page(tab, children):
-    if tab == "patients":
-        return get_active_patients()
-    elif tab == "labs" or tab == "vitals":
-        return html.Div([
-            dcc.Dropdown(id="patient-dropdown", options=get_patient_options(), placeholder="Select a patient", className="mb-4"),
-            html.Div(id="patient-data")
-        ])
-    elif tab == "appointments":
-        return get_appointments()
-    elif tab == "settings":
-        return get_settings()
-    else:
-        return html.Div("Tab not found.")
-
-@app.callback(
-    Output("patient-data", "children"),
-    Input("patient-dropdown", "value"),
-    State("tabs", "active_tab"),
-    prevent_initial_call=True
-)
-def update_patient_data(patient_id, tab):
-    if not patient_id:
-        return html.Div("Please select a patient.")
-    if tab == "labs":
-        return get_lab_reports(patient_id)
-    elif tab == "vitals":
-        return get_risk_scores(patient_id)
-    else:
-        return html.Div()
+def register_nurse_callbacks(app):
+    @app.callback(
+        Output("nurse-content", "children"),
+        Input("nurse-tabs", "active_tab")
+    )
+    def update_page(tab):
+        if tab == "patients":
+            return get_active_patients()
+        elif tab == "labs" or tab == "vitals":
+            return html.Div([
+                dcc.Dropdown(id="nurse-patient-dropdown", placeholder="Type to search patients", className="mb-4"),
+                html.Div(id="nurse-patient-data")
+            ])
+        elif tab == "appointments":
+            return get_appointments()
+        elif tab == "settings":
+            return get_settings()
+        else:
+            return html.Div("Tab not found.")
+
+    @app.callback(
+        Output("nurse-patient-dropdown", "options"),
+        Input("nurse-patient-dropdown", "search_value"),
+        State("nurse-patient-dropdown", "value"),
+        State("nurse-patient-dropdown", "options")
+    )
+    def search_patients(search_value, selected, options):
+        try:
+            return search_patient_options(search_value, selected, options, active_only=True)
+        except ApiError:
+            return dash.no_update
+
+    @app.callback(
+        Output("nurse-patient-data", "children"),
+        Input("nurse-patient-dropdown", "value"),
+        State("nurse-tabs", "active_tab"),
+        prevent_initial_call=True
+    )
+    def update_patient_data(patient_id, tab):
+        if not patient_id:
+            return html.Div("Please select a patient.")
+        if tab == "labs":
+            return get_lab_reports(patient_id)
+        elif tab == "vitals":
+            return html.Div([get_vitals_summary(patient_id), get_risk_scores(patient_id)])
+        else:
+            return html.Div()
 
 # ===== Run =====
 if __name__ == "__main__":
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX], suppress_callback_exceptions=True)
+    app.layout = get_nurse_portal_layout()
+    register_nurse_callbacks(app)
     app.run(debug=True, port=8057)
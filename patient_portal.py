@@ -1,58 +1,60 @@
 # patient_portal.py (Patient Specific Portal)
+# Hosted by app.py at /patient_dashboard. Ids carry a "portal-" prefix so they
+# don't collide with the other pages' components.
 
 import dash
-from dash import html, dcc, Input, Output, State
+from dash import html, dcc, Input, Output
 import dash_bootstrap_components as dbc
-import plotly.express as px
-import pandas as pd
-import requests
-
-# Initialize Dash App
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX], suppress_callback_exceptions=True)
-server = app.server
-API = "http://localhost:8000"
+from data_access import ApiError, fetch
+
 PATIENT_ID = 1  # For demo, assuming logged-in patient ID is 1
 
 # ===== Layout =====
-app.layout = dbc.Container([
-    html.H2("\U0001F3E5 Patient Health Portal", className="text-center text-primary my-4 fw-bold"),
-    dbc.Tabs([
-        dbc.Tab(label="\U0001F4CB Health Records", tab_id="records"),
-        dbc.Tab(label="\U0001F48A Medications", tab_id="meds"),
-        dbc.Tab(label="\U0001F9EA Lab Results", tab_id="labs"),
-        dbc.Tab(label="\u2764\ufe0f Risk Scores", tab_id="risks"),
-        dbc.Tab(label="\U0001F489 Vaccinations", tab_id="vaccines"),
-        dbc.Tab(label="\U0001F4DA Education", tab_id="education"),
-        dbc.Tab(label="\U0001F4E8 Messages", tab_id="messages"),
-        dbc.Tab(label="\U0001F4C5 Appointments", tab_id="appointments"),
-        dbc.Tab(label="\U0001F4D3 Symptom Journal", tab_id="journal"),
-        dbc.Tab(label="\U0001F3AF Health Goals", tab_id="goals")
-    ], id="tabs", active_tab="records", className="mb-4"),
-    dbc.Spinner(html.Div(id="tab-content"), color="primary")
-], fluid=True, style={"padding": "20px"})
+def get_patient_portal_layout():
+    return dbc.Container([
+        html.H2("\U0001F3E5 Patient Health Portal", className="text-center text-primary my-4 fw-bold"),
+        dbc.Tabs([
+            dbc.Tab(label="\U0001F4CB Health Records", tab_id="records"),
+            dbc.Tab(label="\U0001F48A Medications", tab_id="meds"),
+            dbc.Tab(label="\U0001F9EA Lab Results", tab_id="labs"),
+            dbc.Tab(label="\u2764\ufe0f Risk Scores", tab_id="risks"),
+            dbc.Tab(label="\U0001F489 Vaccinations", tab_id="vaccines"),
+            dbc.Tab(label="\U0001F4DA Education", tab_id="education"),
+            dbc.Tab(label="\U0001F4E8 Messages", tab_id="messages"),
+            dbc.Tab(label="\U0001F4C5 Appointments", tab_id="appointments"),
+            dbc.Tab(label="\U0001F4D3 Symptom Journal", tab_id="journal"),
+            dbc.Tab(label="\U0001F3AF Health Goals", tab_id="goals")
+        ], id="portal-tabs", active_tab="records", className="mb-4"),
+        dbc.Spinner(html.Div(id="portal-tab-content"), color="primary")
+    ], fluid=True, style={"padding": "20px"})
 
 # ===== Tab Content Callback =====
-@app.callback(Output("tab-content", "children"), Input("tabs", "active_tab"))
-def render_tab(tab):
-    tabs = {
-        "records": get_health_records,
-        "meds": get_medications,
-        "labs": get_lab_results,
-        "risks": get_risk_scores,
-        "vaccines": get_vaccination_records,
-        "education": get_educational_resources,
-        "messages": get_messages_section,
-        "appointments": get_appointments,
-        "journal": get_symptom_journal,
-        "goals": get_health_goals
-    }
-    return tabs.get(tab, lambda: "Tab not found")()
+def register_patient_portal_callbacks(app):
+    @app.callback(Output("portal-tab-content", "children"), Input("portal-tabs", "active_tab"))
+    def render_tab(tab):
+        tabs = {
+            "records": get_health_records,
+            "meds": get_medications,
+            "labs": get_lab_results,
+            "risks": get_risk_scores,
+            "vaccines": get_vaccination_records,
+            "education": get_educational_resources,
+            "messages": get_messages_section,
+            "appointments": get_appointments,
+            "journal": get_symptom_journal,
+            "goals": get_health_goals
+        }
+        return tabs.get(tab, lambda: "Tab not found")()
 
 # ===== Page Functions =====
 
+def get_timeline(fields):
+    # Each tab reads only its sections of the patient timeline in one request
+    return fetch(f"/patient_timeline/{PATIENT_ID}", {"fields": fields})
+
 def get_health_records():
     try:
-        patient = requests.get(f"{API}/patient_details/{PATIENT_ID}").json()[0]
+        patient = get_timeline("demographics")["demographics"]
         return dbc.Card([
             dbc.CardBody([
                 html.H3(f"{patient['first_name']} {patient['last_name']}", className="fw-bold text-primary"),
@@ -62,7 +64,7 @@ def get_health_records():
                 html.P(f"\U0001FA7A Last Visit: {patient['last_visit'] or 'No recent visit'}")
             ])
         ], className="shadow p-4 mb-4 bg-light rounded")
-    except:
+    except (ApiError, KeyError, TypeError):
         return html.Div("Error loading patient record.")
 
 def get_medications():
@@ -77,8 +79,11 @@ def get_medications():
     ], className="shadow p-4 mb-4 bg-light rounded")
 
 def get_lab_results():
+    import pandas as pd
+    import plotly.express as px
+
     try:
-        labs = requests.get(f"{API}/lab_reports_by_patient/{PATIENT_ID}").json()
+        labs = get_timeline("labs")["labs"]
         if not labs:
             return html.Div("No lab results available.")
         df = pd.DataFrame(labs)
@@ -86,12 +91,15 @@ def get_lab_results():
                          title="My Lab Results", height=400)
         fig.update_traces(marker=dict(size=14, line=dict(width=1, color="DarkSlateGrey")))
         return dcc.Graph(figure=fig)
-    except:
+    except (ApiError, KeyError, ValueError):
         return html.Div("Error loading lab results.")
 
 def get_risk_scores():
+    import pandas as pd
+    import plotly.express as px
+
     try:
-        risks = requests.get(f"{API}/patient_risk_trend/{PATIENT_ID}").json()
+        risks = get_timeline("trend")["trend"]
         if not risks:
             return html.Div("No risk scores available.")
         df = pd.DataFrame(risks)
@@ -99,7 +107,7 @@ def get_risk_scores():
         fig = px.line(df, x="month", y=["avg_heart_risk", "avg_diabetes_risk"],
                       title="Risk Score Trends", markers=True)
         return dcc.Graph(figure=fig)
-    except:
+    except (ApiError, KeyError, ValueError):
         return html.Div("Error loading risk scores.")
 
 def get_vaccination_records():
@@ -129,14 +137,14 @@ def get_messages_section():
     return dbc.Card([
         dbc.CardBody([
             html.H4("Secure Messaging", className="fw-bold text-primary mb-3"),
-            dbc.Textarea(id="message-box", placeholder="Type a message...", rows=4, className="mb-3"),
+            dbc.Textarea(id="portal-message-box", placeholder="Type a message...", rows=4, className="mb-3"),
             dbc.Button("Send", color="success")
         ])
     ], className="shadow p-4 mb-4 bg-light rounded")
 
 def get_appointments():
     try:
-        appointments = requests.get(f"{API}/appointments_by_patient/{PATIENT_ID}").json()
+        appointments = get_timeline("appointments")["appointments"]
         if not appointments:
             return html.Div("No upcoming appointments.")
         items = [html.Li(f"\U0001F4C5 {appt['appointment_date']} with Dr. {appt.get('doctor_name', 'Unknown')}") for appt in appointments]
@@ -146,7 +154,7 @@ def get_appointments():
                 html.Ul(items, style={"fontSize": "18px"})
             ])
         ], className="shadow p-4 mb-4 bg-light rounded")
-    except:
+    except ApiError:
         return html.Div("Error loading appointments.")
 
 def get_symptom_journal():
@@ -172,4 +180,7 @@ def get_health_goals():
 
 # ===== Run =====
 if __name__ == "__main__":
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX], suppress_callback_exceptions=True)
+    app.layout = get_patient_portal_layout()
+    register_patient_portal_callbacks(app)
     app.run(debug=True, port=8056)
\ No newline at end of file
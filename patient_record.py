@@ -1,132 +1,182 @@
+# patient_record.py
+# Top risky patients page, hosted by app.py at /patient_record. Ids carry a
+# "record-" prefix so they don't collide with the other pages' components.
+
 import dash
-from dash import html, dcc, Input, Output, State
+from dash import html, dcc, dash_table, Input, Output, State
+from dash.dash_table.Format import Format, Scheme
 import dash_bootstrap_components as dbc
-import pandas as pd
-import requests
-
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-server = app.server
-API = "http://localhost:8000"
-
-app.layout = dbc.Container([
-    html.H2("📋 Top Risky Patients", className="my-4 text-primary"),
-
-    # Filters
-    dbc.Row([
-        dbc.Col([
-            html.Label("🧬 Risk Type"),
-            dcc.Dropdown(
-                id="risk-type",
-                options=[
-                    {"label": "Heart Risk", "value": "heart"},
-                    {"label": "Diabetes Risk", "value": "diabetes"},
-                    {"label": "Both", "value": "both"}
-                ],
-                value="both",
-                clearable=False
-            )
-        ], md=3),
-
-        dbc.Col([
-            html.Label("⚠️ Minimum Risk Threshold"),
-            dcc.Slider(
-                id="min-risk",
-                min=0,
-                max=1,
-                step=0.05,
-                value=0.4,
-                tooltip={"placement": "bottom", "always_visible": True}
-            )
-        ], md=5),
-
-        dbc.Col([
-            html.Label("🧑 Gender (optional)"),
-            dcc.Dropdown(id="gender-filter", placeholder="All", clearable=True)
-        ], md=4)
-    ], className="mb-4"),
-
-    html.Div(id="patient-table"),
-
-    dcc.Interval(id='interval-update', interval=15 * 1000, n_intervals=0)
-], fluid=True)
-
-
-@app.callback(
-    Output("gender-filter", "options"),
-    Input("interval-update", "n_intervals")
-)
-def populate_gender_filter(_):
-    try:
-        data = requests.get(f"{API}/risk_scores").json()
-        df = pd.DataFrame(data)
-        genders = df["gender"].dropna().unique()
-        return [{"label": gender.title(), "value": gender} for gender in genders]
-    except:
-        return []
-
-
-@app.callback(
-    Output("patient-table", "children"),
-    Input("interval-update", "n_intervals"),
-    Input("risk-type", "value"),
-    Input("min-risk", "value"),
-    Input("gender-filter", "value")
-)
-def load_patient_table(_, risk_type, min_risk, gender_filter):
-    try:
-        data = requests.get(f"{API}/risk_scores").json()
-        df = pd.DataFrame(data)
-
-        # Filter by gender if selected
-        if gender_filter:
-            df = df[df["gender"] == gender_filter]
-
-        # Risk filtering
-        if risk_type == "heart":
-            df = df[df["heart_disease_risk"] >= min_risk]
-        elif risk_type == "diabetes":
-            df = df[df["diabetes_risk"] >= min_risk]
-        else:  # both
-            df = df[(df["heart_disease_risk"] >= min_risk) | (df["diabetes_risk"] >= min_risk)]
-
-        # Combine for ranking
-        df["combined_risk"] = df["heart_disease_risk"] + df["diabetes_risk"]
-        df = df.sort_values(by="combined_risk", ascending=False).head(100)
-
-        # Format risk visually
-        def format_risk(val):
-            if val > 0.7:
-                return html.Span(f"{val:.2f}", style={"color": "red", "fontWeight": "bold"})
-            elif val > 0.4:
-                return html.Span(f"{val:.2f}", style={"color": "orange", "fontWeight": "bold"})
-            return html.Span(f"{val:.2f}")
-
-        table_header = [
-            html.Thead(html.Tr([
-                html.Th("Patient Name"),
-                html.Th("Heart Risk"),
-                html.Th("Diabetes Risk"),
-                html.Th("Gender"),
-                html.Th("Last Updated")
-            ]))
-        ]
-
-        table_rows = []
-        for _, row in df.iterrows():
-            table_rows.append(html.Tr([
-                html.Td(f"{row['first_name']} {row['last_name']}"),
-                html.Td(format_risk(row['heart_disease_risk'])),
-                html.Td(format_risk(row['diabetes_risk'])),
-                html.Td(row.get("gender", "N/A")),
-                html.Td(row['score_date'])
-            ]))
-
-        return dbc.Table(table_header + [html.Tbody(table_rows)],
-                         bordered=True, hover=True, responsive=True, striped=True)
-
-    except Exception as e:
-        return html.Div(f"Error loading records: {str(e)}", className="text-danger")
+from data_access import ApiError, export_url, fetch
+from live_updates import FALLBACK_INTERVAL_MS, changed_ttl, live_updates
+
+PAGE_SIZE = 25
+CANDIDATE_TABLES = ("Patients", "RiskScores")
+LIVE_STORE = "record-live-changes"
+
+
+def risk_styles(column):
+    # Same colour rules the old per-cell spans used: > 0.7 red, > 0.4 orange
+    return [
+        {"if": {"filter_query": f"{{{column}}} > 0.7", "column_id": column},
+         "color": "red", "fontWeight": "bold"},
+        {"if": {"filter_query": f"{{{column}}} > 0.4 && {{{column}}} <= 0.7", "column_id": column},
+         "color": "orange", "fontWeight": "bold"},
+    ]
+
+
+RISK_STYLES = risk_styles("heart_disease_risk") + risk_styles("diabetes_risk")
+
+
+def get_patient_record_layout():
+    return dbc.Container([
+        html.H2("📋 Top Risky Patients", className="my-4 text-primary"),
+
+        # Filters
+        dbc.Row([
+            dbc.Col([
+                html.Label("🧬 Risk Type"),
+                dcc.Dropdown(
+                    id="record-risk-type",
+                    options=[
+                        {"label": "Heart Risk", "value": "heart"},
+                        {"label": "Diabetes Risk", "value": "diabetes"},
+                        {"label": "Both", "value": "both"}
+                    ],
+                    value="both",
+                    clearable=False
+                )
+            ], md=3),
+
+            dbc.Col([
+                html.Label("⚠️ Minimum Risk Threshold"),
+                dcc.Slider(
+                    id="record-min-risk",
+                    min=0,
+                    max=1,
+                    step=0.05,
+                    value=0.4,
+                    tooltip={"placement": "bottom", "always_visible": True}
+                )
+            ], md=5),
+
+            dbc.Col([
+                html.Label("🧑 Gender (optional)"),
+                dcc.Dropdown(id="record-gender-filter", placeholder="All", clearable=True)
+            ], md=4)
+        ], className="mb-4"),
+
+        dash_table.DataTable(
+            id="record-patient-table",
+            columns=[
+                {"name": "Patient Name", "id": "patient_name"},
+                {"name": "Heart Risk", "id": "heart_disease_risk", "type": "numeric",
+                 "format": Format(precision=2, scheme=Scheme.fixed)},
+                {"name": "Diabetes Risk", "id": "diabetes_risk", "type": "numeric",
+                 "format": Format(precision=2, scheme=Scheme.fixed)},
+                {"name": "Gender", "id": "gender"},
+                {"name": "Last Updated", "id": "score_date"}
+            ],
+            # Rows are filtered from the candidate store in the browser; paging,
+            # sorting and column filters run there too and only one page renders
+            page_action="native",
+            page_size=PAGE_SIZE,
+            sort_action="native",
+            sort_mode="single",
+            filter_action="native",
+            virtualization=True,
+            fixed_rows={"headers": True},
+            style_table={"height": "600px", "overflowY": "auto"},
+            style_cell={"textAlign": "left", "padding": "6px"},
+            style_header={"fontWeight": "bold"},
+            style_data_conditional=RISK_STYLES
+        ),
+        html.Div(id="record-table-status", className="text-danger mt-2"),
+        # The filtered cohort, streamed by the backend rather than through Dash
+        html.A("⬇️ Download cohort CSV", id="record-export-link", className="btn btn-success mt-2"),
+
+        # Latest score per patient, column-oriented, tagged with its data version
+        dcc.Store(id="record-risk-candidates"),
+        # Reloaded on backend change events; the interval is a fallback
+        live_updates(LIVE_STORE),
+        dcc.Interval(id='record-interval-update', interval=FALLBACK_INTERVAL_MS, n_intervals=0)
+    ], fluid=True)
+
+
+def register_patient_record_callbacks(app):
+    @app.callback(
+        Output("record-risk-candidates", "data"),
+        Output("record-table-status", "children"),
+        Input("record-interval-update", "n_intervals"),
+        Input(LIVE_STORE, "data"),
+        State("record-risk-candidates", "data")
+    )
+    def refresh_candidates(_, event, current):
+        if changed_ttl(event, CANDIDATE_TABLES, store_id=LIVE_STORE) == 0:
+            try:
+                return fetch("/risk_candidates", ttl=0), ""
+            except ApiError as e:
+                return dash.no_update, f"Error loading records: {e}"
+
+        # Fallback poll: check the cheap version endpoint and only re-download on a change
+        try:
+            version = fetch("/table_versions", {"tables": ",".join(CANDIDATE_TABLES)}, ttl=0)
+            if current and {t: current["version"].get(t) for t in CANDIDATE_TABLES} == \
+                    {t: version.get(t) for t in CANDIDATE_TABLES}:
+                return dash.no_update, ""
+            return fetch("/risk_candidates", ttl=0), ""
+        except ApiError as e:
+            return dash.no_update, f"Error loading records: {e}"
+
+    @app.callback(
+        Output("record-export-link", "href"),
+        Input("record-risk-type", "value"),
+        Input("record-min-risk", "value"),
+        Input("record-gender-filter", "value")
+    )
+    def update_export_link(risk_type, min_risk, gender):
+        return export_url("Patients", risk_type=risk_type, min_risk=min_risk, gender=gender)
+
+    # Threshold, risk-type and gender filtering run in the browser
+    app.clientside_callback(
+        """
+        function(store, riskType, minRisk, gender) {
+            if (!store || !store.columns) { return [[], []]; }
+            const c = store.columns;
+            const rows = [];
+            const genders = new Set();
+            for (let i = 0; i < c.patient_id.length; i++) {
+                const heart = c.heart_disease_risk[i], diabetes = c.diabetes_risk[i];
+                if (c.gender[i]) { genders.add(c.gender[i]); }
+                if (gender && c.gender[i] !== gender) { continue; }
+                const match = riskType === "heart" ? heart >= minRisk
+                    : riskType === "diabetes" ? diabetes >= minRisk
+                    : (heart >= minRisk || diabetes >= minRisk);
+                if (!match) { continue; }
+                rows.push({
+                    patient_id: c.patient_id[i], patient_name: c.patient_name[i],
+                    heart_disease_risk: heart, diabetes_risk: diabetes,
+                    gender: c.gender[i], score_date: c.score_date[i],
+                    combined_risk: heart + diabetes
+                });
+            }
+            rows.sort((a, b) => b.combined_risk - a.combined_risk);
+            // Title-case the labels; values stay as stored
+            const title = g => g.replace(/\w\S*/g, w => w.charAt(0).toUpperCase() + w.slice(1).toLowerCase());
+            const options = Array.from(genders).sort().map(g => ({label: title(g), value: g}));
+            return [rows, options];
+        }
+        """,
+        Output("record-patient-table", "data"),
+        Output("record-gender-filter", "options"),
+        Input("record-risk-candidates", "data"),
+        Input("record-risk-type", "value"),
+        Input("record-min-risk", "value"),
+        Input("record-gender-filter", "value")
+    )
 
 
 if __name__ == "__main__":
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+    app.layout = get_patient_record_layout()
+    register_patient_record_callbacks(app)
     app.run(debug=True, port=8052)
@@ -0,0 +1,131 @@
+# prediction_cache.py
+# Heart/diabetes model inference behind a bounded LRU cache of predictions.
+#
+# Dashboards re-render the same patients every few seconds, and a patient's
+# features only change with a new vitals reading, so most scoring requests
+# repeat one already answered. Each feature vector is quantized to the
+# resolution the data is recorded at (QUANTUM), and the prediction for the
+# quantized vector is cached under (model version, quantized vector). The
+# model version comes from the model files' modification time and size:
+# retraining (train_predictive_model.py) rewrites them, the next request loads
+# the new models and the cache drops every prediction of the old ones.
+
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+MODEL_PATHS = ("heart_risk_model.pkl", "diabetes_risk_model.pkl")
+# Training column order (train_predictive_model.py)
+FEATURES = ("age", "systolic", "diastolic", "heart_rate", "glucose_level", "bmi", "hemoglobin", "cholesterol")
+# Cache resolution per feature; bmi and hemoglobin are stored to one decimal
+QUANTUM = {"age": 1, "systolic": 1, "diastolic": 1, "heart_rate": 1, "glucose_level": 1,
+           "bmi": 0.1, "hemoglobin": 0.1, "cholesterol": 1}
+MAX_ENTRIES = 10_000
+
+
+def model_version():
+    """Identify the model files on disk; changes whenever they are rewritten."""
+    stats = [os.stat(path) for path in MODEL_PATHS]
+    return "-".join(f"{st.st_mtime_ns:x}.{st.st_size:x}" for st in stats)
+
+
+@lru_cache(maxsize=1)
+def _load(version):
+    # One version in memory; loading a new one releases the old models
+    import joblib
+
+    return tuple(joblib.load(path) for path in MODEL_PATHS)
+
+
+def load_models():
+    """Return (version, (heart_model, diabetes_model)), reloading changed model files."""
+    version = model_version()
+    return version, _load(version)
+
+
+def quantize(features):
+    """Cache key part for a {feature: value} mapping; ValueError if one is missing."""
+    try:
+        return tuple(int(round(float(features[name]) / QUANTUM[name])) for name in FEATURES)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"features need numeric {', '.join(FEATURES)}") from e
+
+
+class PredictionCache:
+    """Bounded LRU of (heart_disease_risk, diabetes_risk) per model version and quantized features."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def predict(self, rows):
+        """Risk predictions for a list of {feature: value} mappings, in order.
+
+        Cached vectors are answered from memory; the rest are scored by the
+        models in one batch. Returns {"heart_disease_risk", "diabetes_risk"}
+        dicts, clipped to 0-1 like stored risk scores.
+        """
+        keys = [quantize(row) for row in rows]
+        version, models = load_models()
+        results = {}
+        with self._lock:
+            if version != self.version:
+                # Predictions of the previous models can never be hit again
+                self._entries.clear()
+                self.version = version
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[key] = self._entries[key]
+            missing = list(dict.fromkeys(key for key in keys if key not in results))
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            import pandas as pd
+
+            # Score the quantized vector, so every vector sharing a key gets the same answer
+            X = pd.DataFrame(np.array(missing, dtype=np.float64) * [QUANTUM[name] for name in FEATURES],
+                             columns=FEATURES)
+            scores = np.clip(np.column_stack([model.predict(X) for model in models]), 0, 1)
+            scored = {key: (float(heart), float(diabetes)) for key, (heart, diabetes) in zip(missing, scores)}
+            results.update(scored)
+            with self._lock:
+                if version == self.version:
+                    self._entries.update(scored)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+
+        return [{"heart_disease_risk": results[key][0], "diabetes_risk": results[key][1]} for key in keys]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+cache = PredictionCache()
+
+
+def predict_risk(rows):
+    """Model risk predictions for feature rows through the shared cache."""
+    return cache.predict(rows)
@@ -0,0 +1,161 @@
+# report_data.py
+# Incrementally refreshed aggregates behind reports.py.
+#
+# Each refresh only reads rows above the highest patient_id / risk_id seen so
+# far (a rowid range scan), aggregates them in SQL and folds the result into
+# small in-memory counters, so refresh cost tracks new rows rather than table
+# size. Rows are never fanned out through a merge.
+
+import sqlite3
+import threading
+from datetime import date
+
+import numpy as np
+
+DB_PATH = "healthcare.db"
+RISK_BINS = 20
+AGE_BINS = 20
+HIGH_RISK_THRESHOLD = 0.8
+TOP_N = 10
+# Updates and deletes are not visible to an id watermark, so rebuild from
+# scratch every so many refreshes.
+FULL_RELOAD_EVERY = 60
+
+
+class ReportData:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._refreshes = 0
+        self._reset()
+
+    def _reset(self):
+        self.last_patient_id = 0
+        self.last_risk_id = 0
+        self.gender_counts = {}
+        self.birth_year_counts = {}
+        self.heart_counts = np.zeros(RISK_BINS, dtype=np.int64)
+        self.diabetes_counts = np.zeros(RISK_BINS, dtype=np.int64)
+        # Top-N high-risk scores as (max_risk, risk_id, patient_id, heart, diabetes)
+        self.top_risk = []
+
+    # ===== Refresh =====
+    def refresh(self):
+        """Bring the aggregates up to date and return a ReportView of them.
+
+        The view is copied under the lock, so a concurrent refresh (or its
+        periodic reset) cannot change what the caller renders.
+        """
+        with self._lock:
+            if self._refreshes % FULL_RELOAD_EVERY == 0:
+                self._reset()
+            self._refreshes += 1
+
+            conn = sqlite3.connect(self.db_path)
+            try:
+                # One read transaction so the watermarks and aggregates agree
+                conn.execute("BEGIN")
+                self._refresh_patients(conn)
+                self._refresh_risk(conn)
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+            return ReportView(self.db_path, dict(self.gender_counts), dict(self.birth_year_counts),
+                              self.heart_counts.copy(), self.diabetes_counts.copy(), list(self.top_risk))
+
+    def _refresh_patients(self, conn):
+        max_id = conn.execute("SELECT COALESCE(MAX(patient_id), 0) FROM Patients").fetchone()[0]
+        if max_id <= self.last_patient_id:
+            return
+        rows = conn.execute("""
+            SELECT gender, CAST(substr(date_of_birth, 1, 4) AS INTEGER) AS birth_year, COUNT(*)
+            FROM Patients
+            WHERE patient_id > ? AND patient_id <= ?
+            GROUP BY gender, birth_year
+        """, (self.last_patient_id, max_id)).fetchall()
+        for gender, birth_year, count in rows:
+            self.gender_counts[gender] = self.gender_counts.get(gender, 0) + count
+            if birth_year:
+                self.birth_year_counts[birth_year] = self.birth_year_counts.get(birth_year, 0) + count
+        self.last_patient_id = max_id
+
+    def _refresh_risk(self, conn):
+        max_id = conn.execute("SELECT COALESCE(MAX(risk_id), 0) FROM RiskScores").fetchone()[0]
+        if max_id <= self.last_risk_id:
+            return
+        window = (self.last_risk_id, max_id)
+        for column, counts in (("heart_disease_risk", self.heart_counts),
+                               ("diabetes_risk", self.diabetes_counts)):
+            rows = conn.execute(f"""
+                SELECT MAX(MIN(CAST({column} * ? AS INTEGER), ?), 0) AS bin, COUNT(*)
+                FROM RiskScores
+                WHERE risk_id > ? AND risk_id <= ? AND {column} IS NOT NULL
+                GROUP BY bin
+            """, (RISK_BINS, RISK_BINS - 1) + window).fetchall()
+            for bin_index, count in rows:
+                counts[bin_index] += count
+
+        new_top = conn.execute("""
+            SELECT MAX(heart_disease_risk, diabetes_risk) AS max_risk, risk_id, patient_id,
+                   heart_disease_risk, diabetes_risk
+            FROM RiskScores
+            WHERE risk_id > ? AND risk_id <= ?
+              AND (heart_disease_risk > ? OR diabetes_risk > ?)
+            ORDER BY max_risk DESC
+            LIMIT ?
+        """, window + (HIGH_RISK_THRESHOLD, HIGH_RISK_THRESHOLD, TOP_N)).fetchall()
+        self.top_risk = sorted(self.top_risk + new_top, reverse=True)[:TOP_N]
+        self.last_risk_id = max_id
+
+
+class ReportView:
+    """The aggregates as of one refresh, for rendering."""
+
+    def __init__(self, db_path, gender_counts, birth_year_counts, heart_counts, diabetes_counts, top_risk):
+        self.db_path = db_path
+        self.gender_counts = gender_counts
+        self.birth_year_counts = birth_year_counts
+        self.heart_counts = heart_counts
+        self.diabetes_counts = diabetes_counts
+        self.top_risk = top_risk
+
+    # ===== Chart Data =====
+    def risk_histogram(self, column):
+        counts = self.heart_counts if column == "heart_disease_risk" else self.diabetes_counts
+        return np.linspace(0, 1, RISK_BINS + 1), counts.copy()
+
+    def age_histogram(self, bins=AGE_BINS):
+        if not self.birth_year_counts:
+            return np.linspace(0, 1, bins + 1), np.zeros(bins, dtype=np.int64)
+        years = np.fromiter(self.birth_year_counts.keys(), dtype=np.int64)
+        weights = np.fromiter(self.birth_year_counts.values(), dtype=np.int64)
+        ages = date.today().year - years
+        counts, edges = np.histogram(ages, bins=bins, weights=weights)
+        return edges, counts.astype(np.int64)
+
+    def high_risk_patients(self):
+        """Return the top-N high-risk score rows joined with patient names."""
+        if not self.top_risk:
+            return []
+        patient_ids = sorted({row[2] for row in self.top_risk})
+        conn = sqlite3.connect(self.db_path)
+        try:
+            placeholders = ",".join("?" * len(patient_ids))
+            names = {
+                pid: (first, last) for pid, first, last in conn.execute(
+                    f"SELECT patient_id, first_name, last_name FROM Patients WHERE patient_id IN ({placeholders})",
+                    patient_ids,
+                )
+            }
+        finally:
+            conn.close()
+        return [
+            {
+                "patient_id": pid,
+                "first_name": names.get(pid, ("", ""))[0],
+                "last_name": names.get(pid, ("", ""))[1],
+                "heart_disease_risk": heart,
+                "diabetes_risk": diabetes,
+            }
+            for _, _, pid, heart, diabetes in self.top_risk
+        ]
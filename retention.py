@@ -0,0 +1,210 @@
+# retention.py
+# Archival and housekeeping for the history tables.
+#
+# Rows older than the retention horizon move from RiskScores, Vitals and
+# LabReports into per-month archive databases (archive/healthcare_YYYY_MM.db),
+# attached only while rows are copied. RiskScores months are folded into
+# MonthlyRiskRollup and PatientMonthlyRiskRollup first, so the population and
+# per-patient trend endpoints keep their full history. The deletes run with
+# ChangeLogState.archiving set, so the change log (and /changes, /events and
+# alerts behind it) does not report archived rows as deleted. They bump
+# ChangeLogState.archive_generation instead, which makes the backend rebuild
+# the analytics snapshot without the archived rows.
+# Maintenance then refreshes planner statistics, returns freed pages to the
+# filesystem (incremental vacuum) and checkpoints the WAL.
+#
+# Run daily by the backend, or by hand: python retention.py [--days N]
+
+import argparse
+import os
+import sqlite3
+
+from database_setup import day_number_sql
+
+DB_PATH = "healthcare.db"
+ARCHIVE_DIR = "archive"
+RETENTION_DAYS = int(os.environ.get("HEALTHCARE_RETENTION_DAYS", "730"))
+# Rows examined by ANALYZE per index; keeps it cheap on large tables
+ANALYSIS_LIMIT = 1000
+
+# RiskScores rows (``moved`` filter) summed per month, optionally per patient
+ROLLUP_SQL = """
+    INSERT INTO {rollup} ({keys}, heart_sum, heart_n, diabetes_sum, diabetes_n)
+    SELECT {key_exprs}, SUM(heart_disease_risk), COUNT(heart_disease_risk),
+           SUM(diabetes_risk), COUNT(diabetes_risk)
+    FROM {source} WHERE {where}
+    GROUP BY {key_exprs}
+    ON CONFLICT({keys}) DO UPDATE SET
+        heart_sum = heart_sum + excluded.heart_sum, heart_n = heart_n + excluded.heart_n,
+        diabetes_sum = diabetes_sum + excluded.diabetes_sum, diabetes_n = diabetes_n + excluded.diabetes_n
+"""
+MONTH_SQL = "strftime('%Y-%m', score_date)"
+
+
+def roll_up(conn, source, where, args=(), per_patient=False):
+    if per_patient:
+        rollup, keys, key_exprs = "PatientMonthlyRiskRollup", "patient_id, month", f"patient_id, {MONTH_SQL}"
+        where = f"({where}) AND patient_id IS NOT NULL"
+    else:
+        rollup, keys, key_exprs = "MonthlyRiskRollup", "month", MONTH_SQL
+    conn.execute(ROLLUP_SQL.format(rollup=rollup, keys=keys, key_exprs=key_exprs, source=source, where=where), args)
+
+# Archived table -> (primary key, day column, date column)
+ARCHIVED_TABLES = {
+    "RiskScores": ("risk_id", "score_day", "score_date"),
+    "Vitals": ("vital_id", "record_day", "record_date"),
+    "LabReports": ("report_id", "report_day", "report_date"),
+}
+
+
+def archive_path(month, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, f"healthcare_{month.replace('-', '_')}.db")
+
+
+def stored_columns(conn, table):
+    # Declared columns only; generated *_day columns are recomputed, not archived
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_xinfo({table})") if row[6] == 0]
+
+
+def archive_month(conn, table, month, cutoff_day, archive_dir=ARCHIVE_DIR):
+    """Move one month of rows older than cutoff_day; returns rows moved."""
+    pk, day_col, date_col = ARCHIVED_TABLES[table]
+    columns = stored_columns(conn, table)
+    names = ", ".join(name for name, _ in columns)
+    start_day, end_day = conn.execute(
+        f"SELECT {day_number_sql('?')}, {day_number_sql('date(?, ?)')}", (f"{month}-01", f"{month}-01", "+1 month")
+    ).fetchone()
+    window = f"{day_col} >= ? AND {day_col} < ?"
+    args = (start_day, min(end_day, cutoff_day))
+
+    os.makedirs(archive_dir, exist_ok=True)
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path(month, archive_dir),))
+    try:
+        # 1) Copy. Idempotent, so a crash before step 2 only repeats work.
+        conn.execute("BEGIN")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS archive.{table} (
+                {", ".join(f"{name} {kind}" + (" PRIMARY KEY" if name == pk else "") for name, kind in columns)}
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_{table.lower()}_patient_date "
+                     f"ON {table}(patient_id, {date_col})")
+        conn.execute(f"INSERT OR IGNORE INTO archive.{table} ({names}) SELECT {names} FROM main.{table} WHERE {window}",
+                     args)
+        conn.execute("COMMIT")
+
+        # 2) Roll up and delete only what the archive now holds, atomically in main
+        conn.execute("BEGIN IMMEDIATE")
+        moved = f"{window} AND {pk} IN (SELECT {pk} FROM archive.{table})"
+        if table == "RiskScores":
+            roll_up(conn, "main.RiskScores", moved, args)
+            roll_up(conn, "main.RiskScores", moved, args, per_patient=True)
+        # Not a deletion as far as change log consumers are concerned; the flag
+        # is only ever seen set inside this transaction
+        conn.execute("UPDATE main.ChangeLogState SET archiving = 1")
+        count = conn.execute(f"DELETE FROM main.{table} WHERE {moved}", args).rowcount
+        conn.execute("UPDATE main.ChangeLogState SET archiving = 0, archive_generation = archive_generation + ?",
+                     (1 if count else 0,))
+        conn.execute("COMMIT")
+        return count
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute("DETACH DATABASE archive")
+
+
+def backfill_patient_rollup(conn, archive_dir=ARCHIVE_DIR):
+    """Fill PatientMonthlyRiskRollup from archives written before it existed.
+
+    Runs only while it is empty and MonthlyRiskRollup is not; returns the
+    number of (patient, month) rows written.
+    """
+    if (conn.execute("SELECT 1 FROM PatientMonthlyRiskRollup LIMIT 1").fetchone()
+            or not conn.execute("SELECT 1 FROM MonthlyRiskRollup LIMIT 1").fetchone()
+            or not os.path.isdir(archive_dir)):
+        return 0
+    totals = {}
+    for name in sorted(os.listdir(archive_dir)):
+        if not (name.startswith("healthcare_") and name.endswith(".db")):
+            continue
+        archive = sqlite3.connect(os.path.join(archive_dir, name))
+        try:
+            if not archive.execute("SELECT 1 FROM sqlite_master WHERE name = 'RiskScores'").fetchone():
+                continue
+            for patient_id, month, *sums in archive.execute(f"""
+                SELECT patient_id, {MONTH_SQL}, SUM(heart_disease_risk), COUNT(heart_disease_risk),
+                       SUM(diabetes_risk), COUNT(diabetes_risk)
+                FROM RiskScores WHERE patient_id IS NOT NULL
+                GROUP BY 1, 2
+            """):
+                t = totals.setdefault((patient_id, month), [0.0, 0, 0.0, 0])
+                for i, value in enumerate(sums):
+                    t[i] += value or 0
+        finally:
+            archive.close()
+    rows = [(*key, *t) for key, t in totals.items()]
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("""
+            INSERT OR IGNORE INTO PatientMonthlyRiskRollup
+                (patient_id, month, heart_sum, heart_n, diabetes_sum, diabetes_n)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+
+def archive_old_rows(db_path=DB_PATH, retention_days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR):
+    """Archive every month with rows past the horizon; returns {table: rows moved}."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        backfill_patient_rollup(conn, archive_dir)
+        cutoff_day = conn.execute("SELECT " + day_number_sql("'now'") + " - ?", (retention_days,)).fetchone()[0]
+        moved = {}
+        for table, (_, day_col, date_col) in ARCHIVED_TABLES.items():
+            months = [row[0] for row in conn.execute(
+                f"SELECT DISTINCT strftime('%Y-%m', {date_col}) FROM {table} WHERE {day_col} < ?", (cutoff_day,))
+                if row[0]]
+            moved[table] = sum(archive_month(conn, table, month, cutoff_day, archive_dir) for month in months)
+        return moved
+    finally:
+        conn.close()
+
+
+def run_maintenance(db_path=DB_PATH, retention_days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR):
+    moved = archive_old_rows(db_path, retention_days, archive_dir)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("ANALYZE")
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # One-off: incremental mode only takes effect after a full VACUUM
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    finally:
+        conn.close()
+    checkpoint(db_path)
+    return moved
+
+
+def checkpoint(db_path=DB_PATH):
+    # Fold the WAL back into the database file and truncate it
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old history rows and run database maintenance")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="retention horizon in days")
+    args = parser.parse_args()
+    for table, count in run_maintenance(retention_days=args.days).items():
+        print(f"✅ Archived {count} {table} rows")
@@ -0,0 +1,270 @@
+# risk_stratification.py
+# Population risk stratification over the analytics snapshot's columns.
+#
+# A RiskFrame holds one row per patient, built once per snapshot: the patient's
+# gender and age group, their latest and previous score for each risk, and
+# their latest vitals. Cohorts are boolean masks over those rows (age group,
+# gender, vitals ranges), and bands, percentile ranks and score deltas are
+# whole-array NumPy operations, so answers stay sub-second at 1M patients
+# (see benchmarks/bench_risk_strata.py).
+
+import functools
+
+import numpy as np
+
+from analytics_snapshot import AGE_GROUPS, RISK_BANDS
+
+RISK_COLUMNS = ("heart_disease_risk", "diabetes_risk")
+VITAL_COLUMNS = ("systolic", "diastolic", "heart_rate", "glucose_level", "bmi", "hemoglobin", "cholesterol")
+GROUP_BY = ("gender", "age_group")
+
+
+def latest_two(group_ids, *order_keys):
+    """Per group, the positions of its last and second-to-last rows.
+
+    Rows are ordered by ``order_keys`` (last key most significant, as in
+    np.lexsort) within each group. Returns (groups, last, previous) with
+    groups ascending and previous = -1 for single-row groups.
+    """
+    if not len(group_ids):
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    order = np.lexsort((*order_keys, group_ids))
+    grouped = group_ids[order]
+    ends = np.flatnonzero(np.append(grouped[1:] != grouped[:-1], True))
+    before = np.maximum(ends - 1, 0)
+    has_previous = (ends > 0) & (grouped[before] == grouped[ends])
+    return grouped[ends], order[ends], np.where(has_previous, order[before], -1)
+
+
+def _spread(n, rows, found, values):
+    # Scatter per-group values onto patient rows; patients without one get NaN
+    out = np.full(n, np.nan)
+    out[rows[found]] = np.asarray(values, dtype=np.float64)[found]
+    return out
+
+
+class RiskFrame:
+    """Per-patient risk columns, sorted by patient_id."""
+
+    def __init__(self, patient_id, gender, gender_labels, age_group, risk_scores, vitals, version=None):
+        """Build from column arrays.
+
+        ``gender`` holds codes into ``gender_labels`` (-1 unknown) and
+        ``age_group`` codes into AGE_GROUPS. ``risk_scores`` maps patient_id,
+        score_date, risk_id and RISK_COLUMNS to arrays; ``vitals`` maps patient_id,
+        record_date, vital_id and VITAL_COLUMNS to arrays.
+        """
+        order = np.argsort(patient_id, kind="stable")
+        self.version = version
+        self.patient_id = np.asarray(patient_id)[order]
+        self.gender = np.asarray(gender)[order]
+        self.gender_labels = list(gender_labels)
+        self.age_group = np.asarray(age_group)[order]
+        n = len(self.patient_id)
+
+        groups, last, previous = latest_two(np.asarray(risk_scores["patient_id"]), risk_scores["risk_id"],
+                                            risk_scores["score_date"])
+        rows, found = self._rows(groups)
+        has_previous = found & (previous >= 0)
+        self.latest, self.previous = {}, {}
+        for col in RISK_COLUMNS:
+            values = np.asarray(risk_scores[col], dtype=np.float64)
+            self.latest[col] = _spread(n, rows, found, values[last])
+            self.previous[col] = _spread(n, rows, has_previous, values[np.maximum(previous, 0)])
+
+        groups, last, _ = latest_two(np.asarray(vitals["patient_id"]), vitals["vital_id"], vitals["record_date"])
+        rows, found = self._rows(groups)
+        self.vitals = {col: _spread(n, rows, found, np.asarray(vitals[col])[last]) for col in VITAL_COLUMNS}
+        self._sorted = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        patients = snapshot.table("Patients")
+        gender, gender_labels = patients.resolve("gender")
+        age_group, _ = patients.resolve("age_group(date_of_birth)")
+        scores = snapshot.table("RiskScores")
+        vitals = snapshot.table("Vitals")
+        return cls(
+            patients.column("patient_id"), gender, gender_labels or [], age_group,
+            {col: scores.column(col) for col in ("patient_id", "score_date", "risk_id") + RISK_COLUMNS},
+            {col: vitals.column(col) for col in ("patient_id", "vital_id", "record_date") + VITAL_COLUMNS},
+            version=snapshot.version,
+        )
+
+    def _rows(self, patient_ids):
+        """Row positions for each id (ids must be present to count as found)."""
+        if not len(self.patient_id):
+            return np.zeros(len(patient_ids), dtype=np.int64), np.zeros(len(patient_ids), dtype=bool)
+        rows = np.clip(np.searchsorted(self.patient_id, patient_ids), 0, len(self.patient_id) - 1)
+        return rows, self.patient_id[rows] == patient_ids
+
+    # ===== Cohorts =====
+    def cohort(self, age_groups=None, genders=None, vitals=None):
+        """Boolean mask of patients in every given age group/gender list and vitals range.
+
+        ``vitals`` maps a vital to (low, high), either end None for open;
+        patients without that vital recorded are excluded.
+        """
+        keep = np.ones(len(self.patient_id), dtype=bool)
+        if age_groups:
+            unknown = set(age_groups) - set(AGE_GROUPS)
+            if unknown:
+                raise ValueError(f"Unknown age group(s): {', '.join(sorted(unknown))}")
+            keep &= np.isin(self.age_group, [AGE_GROUPS.index(g) for g in age_groups])
+        if genders:
+            lookup = {label: code for code, label in enumerate(self.gender_labels)}
+            keep &= np.isin(self.gender, [lookup.get(g, -2) for g in genders])
+        for col, (low, high) in (vitals or {}).items():
+            if col not in VITAL_COLUMNS:
+                raise ValueError(f"Unknown vital '{col}'. Expected one of {', '.join(VITAL_COLUMNS)}")
+            values = self.vitals[col]
+            keep &= ~np.isnan(values)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+        return keep
+
+    # ===== Measures =====
+    def _risk(self, risk):
+        if risk not in RISK_COLUMNS:
+            raise ValueError(f"Unknown risk '{risk}'. Expected one of {', '.join(RISK_COLUMNS)}")
+        return self.latest[risk]
+
+    def bands(self, risk):
+        """Band code per patient (index into RISK_BANDS), -1 without a score."""
+        values = self._risk(risk)
+        # Same thresholds as the dashboards: > 0.4 Moderate, > 0.7 High
+        bands = (values > 0.4).astype(np.int64) + (values > 0.7)
+        bands[np.isnan(values)] = -1
+        return bands
+
+    def delta(self, risk):
+        """Latest minus previous score per patient (NaN with fewer than two)."""
+        return self._risk(risk) - self.previous[risk]
+
+    def _reference(self, risk, mask):
+        # Sorted scores to rank against; the population's is kept per risk
+        if mask is None:
+            if risk not in self._sorted:
+                values = self._risk(risk)
+                self._sorted[risk] = np.sort(values[~np.isnan(values)])
+            return self._sorted[risk]
+        values = self._risk(risk)[mask]
+        return np.sort(values[~np.isnan(values)])
+
+    def percentile_rank(self, risk, values, mask=None):
+        """Percentile rank (0-100) of ``values`` among patients' latest scores.
+
+        Ranks against ``mask`` (a cohort) or the whole population; ties count
+        half, so a score equal to everyone else's ranks at 50.
+        """
+        reference = self._reference(risk, mask)
+        values = np.asarray(values, dtype=np.float64)
+        if not len(reference):
+            return np.full(values.shape, np.nan)
+        below = np.searchsorted(reference, values, side="left")
+        at_or_below = np.searchsorted(reference, values, side="right")
+        ranks = (below + at_or_below) / 2 / len(reference) * 100
+        return np.where(np.isnan(values), np.nan, ranks)
+
+    # ===== Queries =====
+    def stratify(self, risk, mask=None, by=None):
+        """Patients per risk band (optionally per gender/age group), with delta summaries."""
+        bands = self.bands(risk)
+        delta = self.delta(risk)
+        keep = bands >= 0 if mask is None else mask & (bands >= 0)
+        if by is None:
+            keys, labels = np.zeros(len(bands), dtype=np.int64), [None]
+        elif by == "gender":
+            keys, labels = self.gender.astype(np.int64), self.gender_labels + [None]
+            keys = np.where(keys < 0, len(self.gender_labels), keys)
+        elif by == "age_group":
+            keys, labels = self.age_group.astype(np.int64), AGE_GROUPS
+        else:
+            raise ValueError(f"Unknown group '{by}'. Expected one of {', '.join(GROUP_BY)}")
+
+        index = keys[keep] * len(RISK_BANDS) + bands[keep]
+        size = len(labels) * len(RISK_BANDS)
+        counts = np.bincount(index, minlength=size)
+        changed = ~np.isnan(delta[keep])
+        delta_n = np.bincount(index[changed], minlength=size)
+        delta_sum = np.bincount(index[changed], weights=delta[keep][changed], minlength=size)
+        rising = np.bincount(index[changed & (delta[keep] > 0)], minlength=size)
+        falling = np.bincount(index[changed & (delta[keep] < 0)], minlength=size)
+        totals = counts.reshape(len(labels), len(RISK_BANDS)).sum(axis=1)
+
+        rows = []
+        for g, label in enumerate(labels):
+            for b, band in enumerate(RISK_BANDS):
+                i = g * len(RISK_BANDS) + b
+                if not totals[g]:
+                    continue
+                row = {} if by is None else {by: label}
+                row.update({
+                    "band": band,
+                    "count": int(counts[i]),
+                    "share": float(counts[i] / totals[g]),
+                    "mean_delta": float(delta_sum[i] / delta_n[i]) if delta_n[i] else None,
+                    "rising": int(rising[i]),
+                    "falling": int(falling[i]),
+                })
+                rows.append(row)
+        return rows
+
+    def patient(self, patient_id, risk, mask=None):
+        """One patient's score, band, delta and percentile ranks, or None if unknown."""
+        rows, found = self._rows(np.array([patient_id]))
+        if not found[0]:
+            return None
+        row = rows[0]
+        score = self._risk(risk)[row]
+        delta = score - self.previous[risk][row]
+        band = int(score > 0.4) + int(score > 0.7)
+        result = {
+            "patient_id": int(patient_id),
+            "score": None if np.isnan(score) else float(score),
+            "band": None if np.isnan(score) else RISK_BANDS[band],
+            "previous": None if np.isnan(self.previous[risk][row]) else float(self.previous[risk][row]),
+            "delta": None if np.isnan(delta) else float(delta),
+            "population_percentile": self._as_float(self.percentile_rank(risk, [score])[0]),
+        }
+        if mask is not None:
+            result["in_cohort"] = bool(mask[row])
+            result["cohort_percentile"] = self._as_float(self.percentile_rank(risk, [score], mask)[0])
+        return result
+
+    def movers(self, risk, mask=None, limit=20, direction="rising"):
+        """Patients with the largest score change between their last two scores."""
+        if direction not in ("rising", "falling"):
+            raise ValueError("direction must be rising or falling")
+        delta = self.delta(risk)
+        candidates = np.flatnonzero(~np.isnan(delta) if mask is None else mask & ~np.isnan(delta))
+        signed = delta[candidates] if direction == "rising" else -delta[candidates]
+        limit = min(limit, len(candidates))
+        if not limit:
+            return []
+        top = candidates[np.argpartition(-signed, limit - 1)[:limit]]
+        top = top[np.argsort(-(delta[top] if direction == "rising" else -delta[top]), kind="stable")]
+        latest = self._risk(risk)[top]
+        percentiles = self.percentile_rank(risk, latest, mask)
+        bands = (latest > 0.4).astype(np.int64) + (latest > 0.7)
+        return [{
+            "patient_id": int(self.patient_id[i]),
+            "score": float(score),
+            "previous": float(self.previous[risk][i]),
+            "delta": float(delta[i]),
+            "band": RISK_BANDS[band],
+            "percentile": self._as_float(p),
+        } for i, score, band, p in zip(top, latest, bands, percentiles)]
+
+    @staticmethod
+    def _as_float(value):
+        return None if np.isnan(value) else float(value)
+
+
+@functools.lru_cache(maxsize=1)
+def frame_for(snapshot):
+    """The RiskFrame of a snapshot, built on first use and kept until the next one."""
+    return RiskFrame.from_snapshot(snapshot)
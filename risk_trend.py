@@ -1,182 +1,190 @@
+# risk_trend.py
+# Risk trend page, hosted by app.py at /risk_trend. Ids carry a "trend-"
+# prefix so they don't collide with the other pages' components. pandas and
+# plotly are imported on first use, as in the dashboards.
+
 import dash
 from dash import html, dcc, Input, Output, State
 import dash_bootstrap_components as dbc
-import pandas as pd
-import plotly.express as px
-import requests
-
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
-server = app.server
-API = "http://localhost:8000"
-
-app.layout = dbc.Container([
-    html.H2("📊 Patient Risk Trend Dashboard", className="my-4 text-center text-primary fw-bold"),
-
-    dbc.Card([
-        dbc.CardBody([
-            dbc.Row([
-                dbc.Col([
-                    html.Label("Select Patient", className="fw-bold"),
-                    dcc.Dropdown(id="patient-selector", placeholder="Select Patient", className="mb-2")
-                ], md=6),
-
-                dbc.Col([
-                    html.Label("Filter by Gender", className="fw-bold"),
-                    dcc.Dropdown(
-                        id="gender-filter",
-                        options=[
-                            {"label": "All Genders", "value": "all"},
-                            {"label": "Male", "value": "Male"},
-                            {"label": "Female", "value": "Female"}
-                        ],
-                        value="all"
-                    )
-                ], md=3),
-
-                dbc.Col([
-                    html.Label("Export", className="fw-bold", style={"visibility": "hidden"}),
-                    html.Div(html.Button("⬇️ Download CSV", id="download-btn", className="btn btn-success w-100"))
-                ], md=3),
-            ])
-        ])
-    ], className="mb-4 shadow rounded"),
-
-    dbc.Card([
-        dbc.CardBody([
-            dcc.Graph(id="patient-trend-graph")
-        ])
-    ], className="mb-4 shadow rounded"),
-
-    dbc.Row([
-        dbc.Col(html.Div(id="risk-insight"), md=6),
-        dbc.Col(html.Div(id="risk-details-panel"), md=6),
-    ], className="gy-3"),
-
-    dcc.Download(id="download-data"),
-    dcc.Interval(id="refresh", interval=30*1000, n_intervals=0)
-], fluid=True)
-
-
-@app.callback(
-    Output("patient-selector", "options"),
-    Input("refresh", "n_intervals"),
-    Input("gender-filter", "value")
-)
-def load_patients(_, gender):
-    try:
-        data = requests.get(f"{API}/active_patients").json()
-        if gender != "all":
-            data = [p for p in data if p['gender'] == gender]
-        return [{"label": f"{p['first_name']} {p['last_name']}", "value": p['patient_id']} for p in data]
-    except:
-        return []
-
-@app.callback(
-    [Output("patient-trend-graph", "figure"),
-     Output("risk-insight", "children"),
-     Output("risk-details-panel", "children")],
-    Input("patient-selector", "value"),
-    Input("refresh", "n_intervals")
-)
-def load_trend(patient_id, _):
-    if not patient_id:
-        return px.line(title="Select a patient to view risk trend"), "", ""
-
-    try:
-        risk_data = requests.get(f"{API}/risk_scores").json()
-        history = [r for r in risk_data if r['patient_id'] == patient_id]
-        df = pd.DataFrame(history)
-
-        if df.empty:
-            return px.line(title="No historical risk data found for this patient"), "", ""
-
-        df['score_date'] = pd.to_datetime(df['score_date'])
-        df = df.sort_values('score_date')
-
-        fig = px.line(df, x='score_date', y=['heart_disease_risk', 'diabetes_risk'],
-                      markers=True, title='Risk Score History Over Time')
-        fig.update_layout(xaxis_title="Date", yaxis_title="Risk Score", legend_title="Risk Type")
-
-        latest = df.iloc[-1]
-        heart = latest['heart_disease_risk']
-        diabetes = latest['diabetes_risk']
-
-        # Suggestions box
-        suggestions = []
-        if heart > 0.7:
-            suggestions.append(html.Li("⚠️ High Heart Risk: Statins, BP medication, and lifestyle changes."))
-        elif heart > 0.4:
-            suggestions.append(html.Li("🟠 Moderate Heart Risk: Monitor BP and cholesterol."))
-
-        if diabetes > 0.7:
-            suggestions.append(html.Li("⚠️ High Diabetes Risk: Metformin, reduce sugar intake."))
-        elif diabetes > 0.4:
-            suggestions.append(html.Li("🟠 Moderate Diabetes Risk: Exercise and dietary care."))
-
-        if not suggestions:
-            suggestions.append(html.Li("✅ Risk scores are low. Keep healthy habits."))
-
-        insight_box = dbc.Card([
-            dbc.CardHeader("🩺 Suggestions", className="bg-primary text-white"),
+from data_access import ApiError, export_url, fetch, fetch_frame, search_patient_options
+from downsample import PLOT_WIDTH
+from live_updates import FALLBACK_INTERVAL_MS, changed_ttl, live_updates
+
+LIVE_STORE = "trend-live-changes"
+
+# Advice per risk: (high-risk alert rule, advice when it is active, advice for a moderate score)
+RISK_SUGGESTIONS = {
+    "heart_disease_risk": ("high_heart_risk", "⚠️ High Heart Risk: Statins, BP medication, and lifestyle changes.",
+                           "🟠 Moderate Heart Risk: Monitor BP and cholesterol."),
+    "diabetes_risk": ("high_diabetes_risk", "⚠️ High Diabetes Risk: Metformin, reduce sugar intake.",
+                      "🟠 Moderate Diabetes Risk: Exercise and dietary care."),
+}
+
+
+def get_risk_trend_layout():
+    return dbc.Container([
+        html.H2("📊 Patient Risk Trend Dashboard", className="my-4 text-center text-primary fw-bold"),
+
+        dbc.Card([
             dbc.CardBody([
-                html.Ul(suggestions, className="mb-0"),
-                html.Small("Note: Please consult a physician.", className="text-muted")
+                dbc.Row([
+                    dbc.Col([
+                        html.Label("Select Patient", className="fw-bold"),
+                        dcc.Dropdown(id="trend-patient-selector", placeholder="Type to search patients", className="mb-2")
+                    ], md=6),
+
+                    dbc.Col([
+                        html.Label("Filter by Gender", className="fw-bold"),
+                        dcc.Dropdown(
+                            id="trend-gender-filter",
+                            options=[
+                                {"label": "All Genders", "value": "all"},
+                                {"label": "Male", "value": "Male"},
+                                {"label": "Female", "value": "Female"}
+                            ],
+                            value="all"
+                        )
+                    ], md=3),
+
+                    dbc.Col([
+                        html.Label("Export", className="fw-bold", style={"visibility": "hidden"}),
+                        # Streamed by the backend; the file never passes through Dash
+                        html.A("⬇️ Download CSV", id="trend-download-link", className="btn btn-success w-100 disabled")
+                    ], md=3),
+                ])
             ])
-        ], className="shadow-sm rounded")
-
-        # Simulated vitals (replace with actual from Vitals table if available)
-        simulated_vitals = {
-            "Glucose": latest.get("glucose_level", 130),
-            "Cholesterol": latest.get("cholesterol", 220),
-            "Heart Rate": latest.get("heart_rate", 95),
-            "BMI": latest.get("bmi", 28),
-            "Hemoglobin": latest.get("hemoglobin", 13)
-        }
-
-        warnings = []
-        if simulated_vitals["Glucose"] > 140:
-            warnings.append("🩸 High Glucose")
-        if simulated_vitals["Cholesterol"] > 240:
-            warnings.append("🧬 High Cholesterol")
-        if simulated_vitals["Heart Rate"] > 100:
-            warnings.append("💓 Elevated Heart Rate")
-        if simulated_vitals["BMI"] > 30:
-            warnings.append("⚖️ High BMI")
-        if simulated_vitals["Hemoglobin"] < 12:
-            warnings.append("🧪 Low Hemoglobin")
-
-        details_panel = dbc.Card([
-            dbc.CardHeader("📘 Risk Formula & Vitals", className="bg-secondary text-white"),
+        ], className="mb-4 shadow rounded"),
+
+        dbc.Card([
             dbc.CardBody([
-                html.H6("Heart Disease Risk Factors"),
-                html.Ul([html.Li(f) for f in ["Age", "BP", "Heart Rate", "Cholesterol", "BMI"]]),
-                html.H6("Diabetes Risk Factors"),
-                html.Ul([html.Li(f) for f in ["Age", "Glucose", "BMI", "Hemoglobin"]]),
-                html.Hr(),
-                html.H6("🚩 Flagged Vitals"),
-                html.Ul([html.Li(w) for w in warnings]) if warnings else html.P("✅ All vitals normal."),
+                dcc.Graph(id="trend-graph")
             ])
-        ], className="shadow-sm rounded")
-
-        return fig, insight_box, details_panel
-
-    except Exception as e:
-        return px.line(title=f"Error loading risk data: {e}"), f"Error: {e}", ""
-
-@app.callback(
-    Output("download-data", "data"),
-    Input("download-btn", "n_clicks"),
-    State("patient-selector", "value"),
-    prevent_initial_call=True
-)
-def export_patient_history(n_clicks, patient_id):
-    try:
-        risk_data = requests.get(f"{API}/risk_scores").json()
-        history = [r for r in risk_data if r['patient_id'] == patient_id]
-        df = pd.DataFrame(history)
-        return dcc.send_data_frame(df.to_csv, filename=f"patient_{patient_id}_risk_history.csv")
-    except:
-        return None
+        ], className="mb-4 shadow rounded"),
+
+        dbc.Row([
+            dbc.Col(html.Div(id="trend-insight"), md=6),
+            dbc.Col(html.Div(id="trend-details-panel"), md=6),
+        ], className="gy-3"),
+
+        # Redrawn when the selected patient's scores or vitals change; the interval is a fallback
+        live_updates(LIVE_STORE),
+        dcc.Interval(id="trend-refresh", interval=FALLBACK_INTERVAL_MS, n_intervals=0)
+    ], fluid=True)
+
+
+def register_risk_trend_callbacks(app):
+    @app.callback(
+        Output("trend-patient-selector", "options"),
+        Input("trend-patient-selector", "search_value"),
+        Input("trend-gender-filter", "value"),
+        State("trend-patient-selector", "value"),
+        State("trend-patient-selector", "options")
+    )
+    def load_patients(search_value, gender, selected, options):
+        filters = {"active_only": True}
+        if gender != "all":
+            filters["gender"] = gender
+        try:
+            return search_patient_options(search_value, selected, options, **filters)
+        except ApiError:
+            return dash.no_update
+
+    @app.callback(
+        [Output("trend-graph", "figure"),
+         Output("trend-insight", "children"),
+         Output("trend-details-panel", "children")],
+        Input("trend-patient-selector", "value"),
+        Input("trend-refresh", "n_intervals"),
+        Input(LIVE_STORE, "data")
+    )
+    def load_trend(patient_id, _, event):
+        import pandas as pd
+        import plotly.express as px
+
+        if not patient_id:
+            return px.line(title="Select a patient to view risk trend"), "", ""
+
+        ttl = changed_ttl(event, ["RiskScores", "Vitals"], patient_id, store_id=LIVE_STORE)
+        try:
+            df = fetch_frame(f"/patient_history/{patient_id}", {"width": PLOT_WIDTH}, ttl=ttl)
+
+            if df.empty:
+                return px.line(title="No historical risk data found for this patient"), "", ""
+
+            df['score_date'] = pd.to_datetime(df['score_date'])
+
+            fig = px.line(df, x='score_date', y=['heart_disease_risk', 'diabetes_risk'],
+                          markers=True, title='Risk Score History Over Time')
+            fig.update_layout(xaxis_title="Date", yaxis_title="Risk Score", legend_title="Risk Type")
+
+            latest = df.iloc[-1]
+            # Current flags on the latest score and vitals, precomputed by the backend
+            alerts = fetch("/alerts", {"patient_id": patient_id}, ttl=ttl)
+            active_rules = {a["rule"] for a in alerts}
+
+            # Suggestions box
+            suggestions = []
+            for risk, (rule, high_advice, moderate_advice) in RISK_SUGGESTIONS.items():
+                if rule in active_rules:
+                    suggestions.append(html.Li(high_advice))
+                elif latest[risk] > 0.4:
+                    suggestions.append(html.Li(moderate_advice))
+
+            if not suggestions:
+                suggestions.append(html.Li("✅ Risk scores are low. Keep healthy habits."))
+
+            insight_box = dbc.Card([
+                dbc.CardHeader("🩺 Suggestions", className="bg-primary text-white"),
+                dbc.CardBody([
+                    html.Ul(suggestions, className="mb-0"),
+                    html.Small("Note: Please consult a physician.", className="text-muted")
+                ])
+            ], className="shadow-sm rounded")
+
+            # Vitals recorded at (or most recently before) the latest score
+            has_vitals = any(pd.notna(latest.get(col))
+                             for col in ("glucose_level", "cholesterol", "heart_rate", "bmi", "hemoglobin"))
+
+            warnings = [a["message"] for a in alerts if a["source_table"] == "Vitals"]
+
+            if not has_vitals:
+                flagged = html.P("No vitals recorded for this patient.", className="text-muted")
+            elif warnings:
+                flagged = html.Ul([html.Li(w) for w in warnings])
+            else:
+                flagged = html.P("✅ All vitals normal.")
+
+            details_panel = dbc.Card([
+                dbc.CardHeader("📘 Risk Formula & Vitals", className="bg-secondary text-white"),
+                dbc.CardBody([
+                    html.H6("Heart Disease Risk Factors"),
+                    html.Ul([html.Li(f) for f in ["Age", "BP", "Heart Rate", "Cholesterol", "BMI"]]),
+                    html.H6("Diabetes Risk Factors"),
+                    html.Ul([html.Li(f) for f in ["Age", "Glucose", "BMI", "Hemoglobin"]]),
+                    html.Hr(),
+                    html.H6("🚩 Flagged Vitals"),
+                    flagged,
+                ])
+            ], className="shadow-sm rounded")
+
+            return fig, insight_box, details_panel
+
+        except Exception as e:
+            return px.line(title=f"Error loading risk data: {e}"), f"Error: {e}", ""
+
+    @app.callback(
+        Output("trend-download-link", "href"),
+        Output("trend-download-link", "className"),
+        Input("trend-patient-selector", "value")
+    )
+    def update_download_link(patient_id):
+        if not patient_id:
+            return None, "btn btn-success w-100 disabled"
+        return export_url("RiskScores", patient_id=patient_id), "btn btn-success w-100"
+
 
 if __name__ == '__main__':
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
+    app.layout = get_risk_trend_layout()
+    register_risk_trend_callbacks(app)
     app.run(debug=True, port=8054)
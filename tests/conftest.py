@@ -0,0 +1,7 @@
+# tests/conftest.py
+# The modules under test live at the project root.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
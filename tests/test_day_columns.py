@@ -0,0 +1,48 @@
+# tests/test_day_columns.py
+# The generated *_day columns: their values, and the date-window query plans
+# that rely on their indexes (benchmarks/check_query_plans.py).
+
+import sqlite3
+
+import pytest
+
+import database_setup
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # create_tables() writes healthcare.db in the working directory
+    monkeypatch.chdir(tmp_path)
+    database_setup.create_tables()
+    database_setup.migrate()
+    conn = sqlite3.connect("healthcare.db")
+    yield conn
+    conn.close()
+
+
+def test_day_columns_count_days_since_epoch(db):
+    db.execute("INSERT INTO Patients (first_name, last_name, date_of_birth) VALUES ('A', 'B', '1970-01-01')")
+    db.execute("INSERT INTO Vitals (patient_id, record_date) VALUES (1, '1970-01-02T23:59:59')")
+    db.execute("INSERT INTO RiskScores (patient_id, score_date) VALUES (1, '2024-03-01')")
+    db.execute("INSERT INTO Appointments (patient_id, appointment_date) VALUES (1, '2024-03-01 09:30')")
+    assert db.execute("SELECT record_day FROM Vitals").fetchone() == (1,)
+    assert db.execute("SELECT score_day FROM RiskScores").fetchone() == (19783,)
+    assert db.execute("SELECT appointment_day FROM Appointments").fetchone() == (19783,)
+    assert db.execute("SELECT dob_day FROM Patients").fetchone() == (0,)
+
+
+def test_day_columns_stay_out_of_table_columns(db):
+    for table, (day_column, _) in database_setup.DAY_COLUMNS.items():
+        stored = [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+        assert day_column not in database_setup.TABLE_COLUMNS[table]
+        assert list(database_setup.TABLE_COLUMNS[table]) == stored
+
+
+@pytest.mark.parametrize("name", ["appointments_today", "recent_lab_reports", "vitals_last_30_days",
+                                  "risk_scores_last_30_days", "age_band_range"])
+def test_date_window_queries_use_day_indexes(db, name):
+    from benchmarks.check_query_plans import PLAN_CHECKS, query_plan
+
+    sql, index, _ = PLAN_CHECKS[name]
+    plan = query_plan(db, sql)
+    assert any(index in step for step in plan), plan
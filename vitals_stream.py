@@ -0,0 +1,354 @@
+# vitals_stream.py
+# Vitals ingestion rows and rolling per-patient vitals statistics.
+#
+# RollingVitals keeps one slot per patient in preallocated NumPy arrays: for
+# each vital the reading count, EWMA, min, max and latest value, plus a ring
+# buffer of the patient's last RECENT_READINGS readings with their times.
+# Applying a reading only touches its patient's slot, so the cost per reading
+# does not grow with history. Latest-state and trend queries read one slot
+# instead of scanning Vitals.
+#
+# sync() picks up Vitals rows above the last applied vital_id, whoever wrote
+# them (/ingest_vitals, data_geneator or another worker), and applies each
+# patient's readings in record_date order, so the latest value, the EWMA and
+# the recent window follow the readings' dates rather than insertion order.
+# A reading dated before its patient's latest applied one cannot be folded
+# into the EWMA in place; that patient's slot is replayed from Vitals instead.
+# Record dates are kept as the stored ISO strings. save() writes the arrays to
+# an .npz checkpoint, so after a restart load() + sync() only replays rows
+# written since. Statistics cover every reading applied since tracking began:
+# later edits or deletes of applied rows (e.g. retention archiving) are not
+# taken back out.
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+DB_PATH = "healthcare.db"
+CHECKPOINT_PATH = "vitals_rolling.npz"
+VITALS = ("systolic", "diastolic", "heart_rate", "glucose_level", "bmi", "hemoglobin", "cholesterol")
+RECENT_READINGS = 8
+EWMA_ALPHA = 0.3
+SYNC_BATCH_ROWS = 10_000
+# Bumped whenever the checkpoint layout changes; older checkpoints are replayed
+CHECKPOINT_FORMAT = 2
+# Patients replayed per query (SQLite variable limit)
+REPLAY_CHUNK = 500
+
+# Each vital as SQL over a Vitals row; blood pressure is stored as "120/80"
+VITAL_SQL = {
+    "systolic": "CAST(substr(blood_pressure, 1, instr(blood_pressure, '/') - 1) AS INTEGER)",
+    "diastolic": "CAST(substr(blood_pressure, instr(blood_pressure, '/') + 1) AS INTEGER)",
+    "heart_rate": "heart_rate",
+    "glucose_level": "glucose_level",
+    "bmi": "bmi",
+    "hemoglobin": "hemoglobin",
+    "cholesterol": "cholesterol",
+}
+# Ingested fields -> type; blood pressure may also come as systolic/diastolic
+READING_FIELDS = {"heart_rate": int, "glucose_level": int, "bmi": float, "hemoglobin": float, "cholesterol": int}
+# Rows as RollingVitals.apply takes them
+ROW_COLUMNS = ", ".join([
+    "vital_id", "patient_id", "(julianday(record_date) - 2440587.5) * 86400.0", "record_date",
+    *(VITAL_SQL[name] for name in VITALS),
+])
+INSERT_SQL = """
+    INSERT INTO Vitals (patient_id, record_date, blood_pressure, heart_rate, glucose_level, bmi, hemoglobin, cholesterol)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def reading_row(data):
+    """Validate one ingested reading and return its INSERT_SQL parameters.
+
+    ``data`` has patient_id, an optional ISO record_date (default now),
+    blood_pressure as "120/80" or systolic + diastolic, and any of
+    READING_FIELDS. Raises ValueError naming the problem.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("reading must be a JSON object")
+    try:
+        patient_id = int(data["patient_id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("patient_id is required and must be an integer")
+
+    record_date = data.get("record_date")
+    if record_date is None:
+        record_date = datetime.now().isoformat()
+    else:
+        try:
+            datetime.fromisoformat(record_date)
+        except (TypeError, ValueError):
+            raise ValueError(f"record_date is not an ISO date: {record_date!r}")
+
+    blood_pressure = data.get("blood_pressure")
+    if blood_pressure is None and data.get("systolic") is not None and data.get("diastolic") is not None:
+        blood_pressure = f"{data['systolic']}/{data['diastolic']}"
+    if blood_pressure is not None:
+        try:
+            systolic, diastolic = (int(part) for part in str(blood_pressure).split("/"))
+        except ValueError:
+            raise ValueError(f"blood_pressure must look like 120/80, got {blood_pressure!r}")
+        blood_pressure = f"{systolic}/{diastolic}"
+
+    values = []
+    for field, kind in READING_FIELDS.items():
+        value = data.get(field)
+        if value is not None:
+            try:
+                value = kind(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be a number, got {value!r}")
+        values.append(value)
+    if blood_pressure is None and all(v is None for v in values):
+        raise ValueError("reading has no vitals")
+    return (patient_id, record_date, blood_pressure, *values)
+
+
+def insert_readings(rows, db_path=DB_PATH):
+    """Insert validated rows in one transaction, skipping unknown patients.
+
+    Returns the positions (in ``rows``) of the rows skipped.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        ids = sorted({row[0] for row in rows})
+        placeholders = ",".join("?" * len(ids))
+        known = {pid for pid, in conn.execute(f"SELECT patient_id FROM Patients WHERE patient_id IN ({placeholders})", ids)}
+        conn.executemany(INSERT_SQL, [row for row in rows if row[0] in known])
+        conn.commit()
+        return [i for i, row in enumerate(rows) if row[0] not in known]
+    finally:
+        conn.close()
+
+
+def _time(seconds):
+    # Ordering key for a reading's epoch seconds; undated readings sort first
+    return -np.inf if seconds is None else seconds
+
+
+def _value(x):
+    return None if np.isnan(x) else round(float(x), 2)
+
+
+class RollingVitals:
+    """Rolling vitals statistics per patient, array-backed and updated in place."""
+
+    def __init__(self, capacity=1024, recent=RECENT_READINGS, alpha=EWMA_ALPHA):
+        self.recent = recent
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.reset(capacity)
+
+    def reset(self, capacity=1024):
+        self.slots = {}
+        self.last_vital_id = 0
+        self.arrays = self._empty(capacity)
+
+    def _empty(self, capacity):
+        # name -> array with one row per slot
+        n_vitals = len(VITALS)
+        return {
+            "patient_id": np.zeros(capacity, np.int64),
+            "readings": np.zeros(capacity, np.int64),
+            "count": np.zeros((capacity, n_vitals), np.int32),
+            "ewma": np.full((capacity, n_vitals), np.nan, np.float32),
+            "min": np.full((capacity, n_vitals), np.nan, np.float32),
+            "max": np.full((capacity, n_vitals), np.nan, np.float32),
+            "last": np.full((capacity, n_vitals), np.nan, np.float32),
+            # Epoch seconds of the latest applied reading, for ordering only
+            "last_time": np.full(capacity, -np.inf),
+            "recent_values": np.full((capacity, self.recent, n_vitals), np.nan, np.float32),
+            # Record dates as stored; "" where missing
+            "recent_dates": np.full((capacity, self.recent), "", dtype=object),
+        }
+
+    def _slot(self, patient_id):
+        slot = self.slots.get(patient_id)
+        if slot is None:
+            slot = len(self.slots)
+            capacity = len(self.arrays["patient_id"])
+            if slot == capacity:
+                # Double the capacity, so growth is amortized O(1) per patient
+                grown = self._empty(2 * capacity)
+                for name, array in self.arrays.items():
+                    grown[name][:capacity] = array
+                self.arrays = grown
+            self.arrays["patient_id"][slot] = patient_id
+            self.slots[patient_id] = slot
+        return slot
+
+    def _clear(self, slot):
+        a = self.arrays
+        patient_id = a["patient_id"][slot]
+        empty = self._empty(1)
+        for name, array in a.items():
+            array[slot] = empty[name][0]
+        a["patient_id"][slot] = patient_id
+
+    def apply(self, rows):
+        """Apply (vital_id, patient_id, epoch seconds, record_date, *VITALS) rows.
+
+        Rows must be in record_date order per patient and no older than the
+        patient's latest applied reading; sync() sees to both.
+        """
+        if not rows:
+            return
+        values = np.array([row[4:] for row in rows], dtype=np.float64)
+        for (vital_id, patient_id, seconds, record_date, *_), x in zip(rows, values):
+            if patient_id is None:
+                continue
+            slot = self._slot(patient_id)
+            a = self.arrays
+            seen = ~np.isnan(x)
+            ewma = a["ewma"][slot]
+            a["ewma"][slot] = np.where(seen, np.where(a["count"][slot] > 0, self.alpha * x + (1 - self.alpha) * ewma, x), ewma)
+            a["min"][slot] = np.fmin(a["min"][slot], x)
+            a["max"][slot] = np.fmax(a["max"][slot], x)
+            a["last"][slot] = np.where(seen, x, a["last"][slot])
+            a["count"][slot] += seen
+            a["last_time"][slot] = _time(seconds)
+            position = a["readings"][slot] % self.recent
+            a["recent_values"][slot, position] = x
+            a["recent_dates"][slot, position] = record_date or ""
+            a["readings"][slot] += 1
+
+    def _replay(self, conn, where, args):
+        # Apply every matching row in record_date order; undated rows first,
+        # matching how _time orders them
+        cursor = conn.execute(f"""
+            SELECT {ROW_COLUMNS}
+            FROM Vitals
+            WHERE {where}
+            ORDER BY julianday(record_date), vital_id
+        """, args)
+        replayed = 0
+        while True:
+            rows = cursor.fetchmany(SYNC_BATCH_ROWS)
+            if not rows:
+                return replayed
+            self.apply(rows)
+            replayed += len(rows)
+
+    def sync(self, db_path=DB_PATH):
+        """Apply Vitals rows written since the last sync; returns how many."""
+        with self._lock:
+            conn = sqlite3.connect(db_path)
+            try:
+                issued = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'Vitals'").fetchone()
+                head = issued[0] if issued else 0
+                if head < self.last_vital_id:
+                    # The database was replaced by an older copy; replay it
+                    self.reset()
+                if self.last_vital_id == 0:
+                    # Nothing applied yet: one pass over the table in date order
+                    applied = self._replay(conn, "vital_id <= ?", (head,))
+                    self.last_vital_id = head
+                    return applied
+                applied = 0
+                while True:
+                    # Primary key range scan from the last applied row
+                    rows = conn.execute(f"""
+                        SELECT {ROW_COLUMNS}
+                        FROM Vitals
+                        WHERE vital_id > ?
+                        ORDER BY vital_id
+                        LIMIT ?
+                    """, (self.last_vital_id, SYNC_BATCH_ROWS)).fetchall()
+                    if not rows:
+                        return applied
+                    self._apply_batch(conn, rows)
+                    self.last_vital_id = rows[-1][0]
+                    applied += len(rows)
+            finally:
+                conn.close()
+
+    def _apply_batch(self, conn, rows):
+        # New rows in vital_id order: apply them by date, and replay the
+        # patients that got a reading older than their latest applied one
+        through = rows[-1][0]
+        rows = sorted(rows, key=lambda row: (_time(row[2]), row[0]))
+        a = self.arrays
+        late = set()
+        for _, patient_id, seconds, *_ in rows:
+            slot = self.slots.get(patient_id)
+            if slot is not None and _time(seconds) < a["last_time"][slot]:
+                late.add(patient_id)
+        self.apply([row for row in rows if row[1] not in late])
+        late = sorted(late)
+        for start in range(0, len(late), REPLAY_CHUNK):
+            chunk = late[start:start + REPLAY_CHUNK]
+            for patient_id in chunk:
+                self._clear(self.slots[patient_id])
+            placeholders = ",".join("?" * len(chunk))
+            self._replay(conn, f"patient_id IN ({placeholders}) AND vital_id <= ?", (*chunk, through))
+
+    def patient(self, patient_id):
+        """A patient's rolling statistics and recent readings (oldest first), or None."""
+        with self._lock:
+            slot = self.slots.get(patient_id)
+            if slot is None:
+                return None
+            a = self.arrays
+            readings = int(a["readings"][slot])
+            kept = min(readings, self.recent)
+            order = (readings - kept + np.arange(kept)) % self.recent
+            dates = a["recent_dates"][slot, order]
+            values = a["recent_values"][slot, order]
+            stats = {
+                name: {
+                    "latest": _value(a["last"][slot, i]),
+                    "ewma": _value(a["ewma"][slot, i]),
+                    "min": _value(a["min"][slot, i]),
+                    "max": _value(a["max"][slot, i]),
+                    "count": int(a["count"][slot, i]),
+                }
+                for i, name in enumerate(VITALS)
+            }
+        return {
+            "patient_id": patient_id,
+            "readings": readings,
+            "last_record_date": (dates[-1] or None) if kept else None,
+            "vitals": stats,
+            "recent": [
+                {"record_date": date or None, **{name: _value(v) for name, v in zip(VITALS, row)}}
+                for date, row in zip(dates, values)
+            ],
+        }
+
+    def save(self, path=CHECKPOINT_PATH):
+        """Write the arrays to ``path`` atomically."""
+        with self._lock:
+            n = len(self.slots)
+            arrays = {name: array[:n] for name, array in self.arrays.items()}
+            # Fixed-width strings, so the checkpoint loads without pickle
+            arrays["recent_dates"] = arrays["recent_dates"].astype(str)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, format=CHECKPOINT_FORMAT, last_vital_id=self.last_vital_id, vitals=np.array(VITALS),
+                         recent=self.recent, alpha=self.alpha, **arrays)
+            os.replace(tmp, path)
+
+    def load(self, path=CHECKPOINT_PATH):
+        """Restore a checkpoint; False (state unchanged) if missing or from other settings."""
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return False
+        with data:
+            if ("format" not in data or int(data["format"]) != CHECKPOINT_FORMAT
+                    or tuple(data["vitals"]) != VITALS or int(data["recent"]) != self.recent
+                    or float(data["alpha"]) != self.alpha):
+                return False
+            patient_ids = data["patient_id"]
+            arrays = self._empty(max(len(patient_ids), 1024))
+            for name in arrays:
+                arrays[name][:len(patient_ids)] = data[name]
+            with self._lock:
+                self.arrays = arrays
+                self.slots = {int(pid): slot for slot, pid in enumerate(patient_ids)}
+                self.last_vital_id = int(data["last_vital_id"])
+        return True
@@ -0,0 +1,150 @@
+# write_behind.py
+# Optional write-behind queue with group commit for the backend's hot writes.
+#
+# Handlers validate a write, then submit() its statement here instead of
+# committing it themselves. One writer task takes queued writes in groups (up
+# to max_batch, or whatever is queued within max_delay of the first) and
+# commits each group in a single transaction, so one fsync covers many
+# requests. A write that fails inside a group is retried on its own, so it
+# cannot fail the others.
+#
+# submit() returns when the write's group has committed (ack="committed"), or
+# as soon as the write is queued (ack="accepted": lower latency, but lost if
+# the process dies before the next commit). close() stops intake and drains
+# whatever is queued; the backend calls it on shutdown.
+
+import asyncio
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+ACK_MODES = ("accepted", "committed")
+MAX_BATCH = 256
+# Extra seconds to wait for a group to fill. With 0, writes that arrive while
+# a group is committing form the next group, which adds no latency when idle.
+MAX_DELAY = 0.0
+MAX_QUEUE = 10_000
+
+
+class WriteBehindQueue:
+    def __init__(self, db_path="healthcare.db", max_batch=MAX_BATCH, max_delay=MAX_DELAY, max_queue=MAX_QUEUE,
+                 on_commit=None):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        # Called after each group commits (e.g. ChangeFeed.notify)
+        self.on_commit = on_commit
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self._queue = None
+        self._task = None
+        self._conn = None
+        self._closing = False
+
+    @property
+    def running(self):
+        return self._task is not None and not self._closing
+
+    def start(self):
+        """Start the writer task on the running event loop."""
+        self._queue = asyncio.Queue(self.max_queue)
+        # Only the writer uses it, one group at a time, from worker threads
+        self._conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, sql, args=(), ack="committed"):
+        """Queue one write; with ack="committed", wait for it to commit.
+
+        Raises the write's sqlite3 error in committed mode. Waits for room
+        when max_queue writes are already pending.
+        """
+        if ack not in ACK_MODES:
+            raise ValueError(f"ack must be one of {', '.join(ACK_MODES)}")
+        if not self.running:
+            raise RuntimeError("write-behind queue is not running")
+        future = asyncio.get_running_loop().create_future() if ack == "committed" else None
+        await self._queue.put((sql, args, future))
+        if future is not None:
+            await future
+
+    async def close(self):
+        """Stop taking writes and wait until every queued write is committed."""
+        if self._task is None:
+            return
+        self._closing = True
+        # After everything already queued
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._conn.close()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                errors = await asyncio.to_thread(self._commit, [(sql, args) for sql, args, _ in batch])
+            except Exception as e:
+                # e.g. the database is locked past the timeout: fail the whole group
+                errors = [e] * len(batch)
+            self.batches += 1
+            for (_, _, future), error in zip(batch, errors):
+                if error is None:
+                    self.committed += 1
+                else:
+                    self.failed += 1
+                if future is None:
+                    if error is not None:
+                        # Accepted writes have no one waiting to see the error
+                        logger.warning("write-behind write failed: %s", error)
+                elif future.done():
+                    # The request was cancelled (client went away); the write still counts
+                    pass
+                elif error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+            if self.on_commit is not None and None in errors:
+                self.on_commit()
+
+    def _commit(self, writes):
+        # One transaction for the group; if it fails, each write on its own.
+        # Returns one error (or None) per write.
+        conn = self._conn
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, args in writes:
+                conn.execute(sql, args)
+            conn.execute("COMMIT")
+            return [None] * len(writes)
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if len(writes) == 1:
+                return [e]
+        return [error for write in writes for error in self._commit([write])]